@@ -7,17 +7,21 @@ BFile (Binary File) - 一个用于处理二值化图像和视频的Python库
 
 __version__ = "0.1.0"
 
+import importlib
+
 from .bi import Image as Image
-from .bv import Video as Video
 from .core import (
     Error,
     EncodeError,
     DecodeError,
     FileError,
+    ConversionStats,
+    set_verbosity,
     encode_run_length,
     decode_run_length,
     compress_data,
     decompress_data,
+    estimate_compressed_size,
     file_to_base64,
     base64_to_file,
     get_file_size_info
@@ -26,15 +30,54 @@ from .core import (
 __all__ = [
     'Image',
     'Video',
+    'BVWriter',
+    'BVFile',
+    'SharedFrameProducer',
+    'SharedFrameConsumer',
+    'BVStreamSender',
+    'BVStreamReceiver',
+    'inspect',
+    'AsyncConverter',
     'Error',
     'EncodeError',
     'DecodeError',
     'FileError',
+    'ConversionStats',
+    'set_verbosity',
     'encode_run_length',
     'decode_run_length',
     'compress_data',
     'decompress_data',
+    'estimate_compressed_size',
     'file_to_base64',
     'base64_to_file',
     'get_file_size_info'
 ]
+
+
+# 视频相关的模块依赖较多，在第一次访问时才导入，只处理图像时不加载；
+# OpenCV在这些模块中也是按需导入的，读取BV文件不需要安装
+_LAZY_ATTRIBUTES = {
+    'Video': '.bv',
+    'BVWriter': '.bv',
+    'BVFile': '.bv',
+    'SharedFrameProducer': '.shm',
+    'SharedFrameConsumer': '.shm',
+    'BVStreamSender': '.stream',
+    'BVStreamReceiver': '.stream',
+    'inspect': '.info',
+    'AsyncConverter': '.aio',
+}
+
+
+def __getattr__(name):
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
@@ -0,0 +1,10 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""python -m BFile，等同于bfile命令"""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
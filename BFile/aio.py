@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+BFile (Binary File) 异步模块
+在asyncio中调用图像与视频转换，转换及其文件读写在执行器中进行，不阻塞事件循环
+"""
+
+import os
+import asyncio
+import threading
+import functools
+import contextlib
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Optional, Union, Callable, Any, List
+
+from .core import (
+    ConversionStats,
+    Error
+)
+from .bi import Image
+from .bv import Video, _BVReader
+from .info import inspect
+
+
+class _Cancelled(Error):
+    """转换已被取消，由进度回调在帧之间抛出以中止转换"""
+
+
+class AsyncConverter:
+    """
+    异步转换器
+
+    每次转换在执行器中运行，同时进行的转换数量不超过max_concurrency，超出的调用在事件循环中等待。
+    线程执行器下取消的转换会在写完当前帧后中止，并删除不完整的输出文件；
+    进程执行器下只能取消尚未开始的转换，已开始的转换在后台完成，结果被丢弃。
+
+    示例:
+        async with AsyncConverter(executor="process", max_workers=4) as converter:
+            stats = await converter.mp4_to_bv("input.mp4", "output.bv", target_fps=10)
+    """
+
+    def __init__(self, executor: Union[str, Executor] = "thread", max_workers: Optional[int] = None,
+                 max_concurrency: Optional[int] = None):
+        """
+        初始化异步转换器
+
+        参数:
+            executor: "thread"、"process"或已有的Executor。纯Python的LZ77压缩受GIL限制，
+                需要多个转换并行占用CPU时使用"process"；已有的Executor不会在close时关闭
+            max_workers: 新建执行器的工作线程或进程数，默认为CPU核心数
+            max_concurrency: 同时进行的转换数量上限，默认与max_workers相同
+        """
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        if executor == "thread":
+            self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="BFile")
+        elif executor == "process":
+            self.executor = ProcessPoolExecutor(max_workers=max_workers)
+        elif isinstance(executor, Executor):
+            self.executor = executor
+        else:
+            raise Error(f"不支持的执行器: {executor}")
+        self._owned = not isinstance(executor, Executor)
+        self._threaded = isinstance(self.executor, ThreadPoolExecutor)
+        self.max_concurrency = max_concurrency or max_workers
+        # 信号量在第一次使用时创建，绑定到当时运行的事件循环
+        self._semaphore = None
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        在执行器中调用任意函数，受并发上限约束
+
+        进程执行器下func及其参数和返回值都需要能够被pickle。取消时不会中止已开始的调用。
+        """
+        loop = asyncio.get_running_loop()
+        async with self._limit():
+            return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def _convert(self, func: Callable[..., Any], output: Union[str, List[Any], Callable[[], List[str]], None],
+                       progress: Optional[Callable[[ConversionStats], None]], *args, **kwargs) -> Any:
+        """
+        在执行器中运行支持callback参数的转换函数，处理进度回调和取消
+
+        参数:
+            func: Image或Video的转换函数
+            output: 输出路径、输出规格列表或返回输出路径列表的函数，转换被中止时删除
+            progress: 在事件循环线程中以统计信息调用的进度回调
+        """
+        if not self._threaded:
+            if progress is not None:
+                raise Error("进度回调只能在线程执行器中使用")
+            return await self.run(func, *args, **kwargs)
+
+        loop = asyncio.get_running_loop()
+        cancelled = threading.Event()
+
+        def callback(stats: ConversionStats) -> None:
+            if cancelled.is_set():
+                raise _Cancelled("转换已取消")
+            if progress is not None:
+                loop.call_soon_threadsafe(progress, stats)
+
+        async with self._limit():
+            future = loop.run_in_executor(self.executor, functools.partial(func, *args, callback=callback, **kwargs))
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                cancelled.set()
+                # 等待工作线程在帧之间停下，之后才释放并发名额
+                await asyncio.wait([future])
+                if not future.cancelled() and isinstance(future.exception(), _Cancelled):
+                    _remove_outputs(output)
+                raise
+
+    @contextlib.asynccontextmanager
+    async def _limit(self):
+        """限制同时进行的转换数量"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            yield
+
+    async def png_to_binary(self, input_path: str, output_path: str, threshold: int = 128,
+                            max_bytes: Optional[int] = None,
+                            progress: Optional[Callable[[ConversionStats], None]] = None) -> ConversionStats:
+        """异步版本的Image.png_to_binary，progress在事件循环线程中调用"""
+        return await self._convert(Image.png_to_binary, output_path, progress, input_path, output_path,
+                                   threshold=threshold, max_bytes=max_bytes)
+
+    async def binary_to_png(self, input_path: str, output_path: str,
+                            progress: Optional[Callable[[ConversionStats], None]] = None) -> ConversionStats:
+        """异步版本的Image.binary_to_png"""
+        return await self._convert(Image.binary_to_png, output_path, progress, input_path, output_path)
+
+    async def mp4_to_bv(self, input_path: str, output_path: Union[str, List[Union[str, dict]]],
+                        progress: Optional[Callable[[ConversionStats], None]] = None,
+                        **kwargs) -> Union[ConversionStats, List[ConversionStats]]:
+        """
+        异步版本的Video.mp4_to_bv，其余参数与之相同
+
+        progress在每写入一帧后于事件循环线程中调用。参数workers大于1时转换内部还会创建进程池，
+        在进程执行器中使用时需要注意总进程数。
+        """
+        return await self._convert(Video.mp4_to_bv, output_path, progress, input_path, output_path, **kwargs)
+
+    async def bv_to_mp4(self, input_path: str, output_path: str,
+                        progress: Optional[Callable[[ConversionStats], None]] = None,
+                        **kwargs) -> ConversionStats:
+        """异步版本的Video.bv_to_mp4，其余参数与之相同"""
+        return await self._convert(Video.bv_to_mp4, output_path, progress, input_path, output_path, **kwargs)
+
+    async def from_images(self, images: Union[str, List[str]], output_path: str,
+                          progress: Optional[Callable[[ConversionStats], None]] = None,
+                          **kwargs) -> ConversionStats:
+        """异步版本的Video.from_images，其余参数与之相同"""
+        return await self._convert(Video.from_images, output_path, progress, images, output_path, **kwargs)
+
+    async def to_images(self, input_path: str, pattern: str = "frame_{:05d}.png",
+                        progress: Optional[Callable[[ConversionStats], None]] = None,
+                        **kwargs) -> List[str]:
+        """
+        异步版本的Video.to_images，其余参数与之相同
+
+        progress在每保存一帧（workers大于1时为每完成一个帧范围）后于事件循环线程中调用，
+        转换被中止时删除已保存的图像文件。
+        """
+        output = functools.partial(_image_paths, input_path, pattern, kwargs.get("expand", True))
+        return await self._convert(Video.to_images, output, progress, input_path, pattern, **kwargs)
+
+    async def to_array(self, input_path: str, progress: Optional[Callable[[ConversionStats], None]] = None,
+                       **kwargs) -> Any:
+        """异步版本的Video.to_array，progress在每解码一帧（workers大于1时为每完成一个帧范围）后调用"""
+        return await self._convert(Video.to_array, None, progress, input_path, **kwargs)
+
+    async def inspect(self, path: str, deep: bool = False) -> dict:
+        """异步版本的BFile.inspect"""
+        return await self.run(inspect, path, deep=deep)
+
+    async def close(self) -> None:
+        """关闭自行创建的执行器，等待已开始的转换结束"""
+        if self._owned:
+            await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
+
+    async def __aenter__(self) -> "AsyncConverter":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.close()
+
+
+def _image_paths(input_path: str, pattern: str, expand: bool) -> List[str]:
+    """Video.to_images对给定BV文件会写出的全部图像路径"""
+    with open(input_path, "rb") as f:
+        reader = _BVReader(f)
+        total = reader.tick_count if expand else reader.frame_count
+    return [pattern.format(i) for i in range(total)]
+
+
+def _remove_outputs(output: Union[str, List[Any], Callable[[], List[str]], None]) -> None:
+    """删除被中止的转换留下的输出文件"""
+    if callable(output):
+        try:
+            output = output()
+        except (Error, OSError):
+            return
+    if output is None:
+        return
+    paths = output if isinstance(output, list) else [output]
+    for path in paths:
+        if isinstance(path, dict):
+            path = path.get("path")
+        if isinstance(path, (str, os.PathLike)) and os.path.isfile(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -7,25 +7,93 @@ BFile (Binary File) 图像模块
 """
 
 import os
+import math
 import numpy as np
 from PIL import Image as PILImage
 import struct
-from typing import Optional, Tuple
+from typing import Optional, Tuple, Callable
 
 from .core import (
     encode_run_length, 
     decode_run_length, 
-    compress_data, 
     decompress_data,
+    estimate_compressed_size,
+    _search_scale,
+    RATE_VERIFY_PASSES,
+    ConversionStats,
+    logger,
+    _encode_counted,
     Error,
     EncodeError,
     DecodeError,
     FileError
 )
 
+def _scaled(img: PILImage.Image, scale: float) -> PILImage.Image:
+    """按比例缩小灰度图像，使用区域平均，宽高至少为1"""
+    if scale >= 1.0:
+        return img
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    return img.resize(size, PILImage.BOX)
+
+
+def _binarize(img: PILImage.Image, threshold: int) -> np.ndarray:
+    """二值化灰度图像，返回展平的0/1数组"""
+    return (np.array(img) > threshold).astype(np.uint8).flatten()
+
+
+def _run_lengths(img: PILImage.Image, threshold: int) -> bytearray:
+    """二值化灰度图像并进行游程编码"""
+    return encode_run_length(_binarize(img, threshold))
+
+
+def _encode_image(img: PILImage.Image, threshold: int, stats: ConversionStats) -> bytes:
+    """二值化、游程编码并压缩图像，各步骤计入stats"""
+    with stats.stage("threshold"):
+        bits = _binarize(img, threshold)
+    compressed, counts = _encode_counted(bits)
+    stats.add_encoded(counts)
+    return compressed
+
+
+def _encode_within(img: PILImage.Image, threshold: int, max_bytes: int,
+                   stats: ConversionStats) -> Tuple[PILImage.Image, bytes]:
+    """
+    缩小图像直到编码结果不超过max_bytes
+
+    先按样本压缩率估算大小二分查找缩放比例，再实际编码验证，
+    超出时按超出比例继续缩小。stats只记录最后一次编码。
+
+    Returns:
+        (缩放后的图像, 压缩数据)
+    """
+    header_size = struct.calcsize('>II')
+    min_scale = 1.0 / min(img.width, img.height)
+    scale = _search_scale(
+        lambda scale: header_size + estimate_compressed_size(_run_lengths(_scaled(img, scale), threshold)),
+        max_bytes, min_scale)
+
+    for _ in range(RATE_VERIFY_PASSES):
+        scaled = _scaled(img, scale)
+        attempt = ConversionStats()
+        compressed = _encode_image(scaled, threshold, attempt)
+        size = header_size + len(compressed)
+        if size <= max_bytes:
+            stats.times.update((name, stats.times[name] + attempt.times[name]) for name in ("threshold", "rle", "lz77"))
+            stats.pixels, stats.runs = attempt.pixels, attempt.runs
+            stats.matches, stats.literals = attempt.matches, attempt.literals
+            return scaled, compressed
+        if scale <= min_scale:
+            break
+        scale = max(min_scale, scale * math.sqrt(max_bytes / size) * 0.95)
+    raise EncodeError(f"无法压缩到{max_bytes}字节以内，当前为{size}字节")
+
+
 class Image:
     @staticmethod
-    def png_to_binary(input_path: str, output_path: str, threshold: int = 128) -> bool:
+    def png_to_binary(input_path: str, output_path: str, threshold: int = 128,
+                      max_bytes: Optional[int] = None,
+                      callback: Optional[Callable[[ConversionStats], None]] = None) -> ConversionStats:
         """
         将PNG图像转换为二进制格式
         
@@ -33,50 +101,61 @@ class Image:
             input_path: 输入PNG图像路径
             output_path: 输出文件路径
             threshold: 二值化阈值，默认128
+            max_bytes: 输出文件大小上限（字节），超出时自动缩小图像分辨率
+            callback: 转换完成后以统计信息调用
             
         Returns:
-            bool: 转换是否成功
+            ConversionStats: 转换的统计信息，真值为True
         """
         try:
+            stats = ConversionStats(input_path, output_path)
             # 读取图像并转换为灰度图
-            img = PILImage.open(input_path).convert('L')
-            img_array = np.array(img)
-            
-            # 二值化处理
-            binary = (img_array > threshold).astype(np.uint8)
-            
-            # 编码为游程长度
-            encoded = encode_run_length(binary.flatten())
-            
-            # 压缩数据
-            compressed = compress_data(encoded)
+            with stats.stage("read"):
+                img = PILImage.open(input_path).convert('L')
+
+            if max_bytes is None:
+                # 二值化、游程编码并压缩数据
+                compressed = _encode_image(img, threshold, stats)
+            else:
+                img, compressed = _encode_within(img, threshold, max_bytes, stats)
             
             # 写入文件
-            with open(output_path, 'wb') as f:
+            with stats.stage("write"), open(output_path, 'wb') as f:
                 # 写入文件头
                 f.write(struct.pack('>II', img.width, img.height))
                 # 写入压缩数据
                 f.write(compressed)
-                
-            return True
+
+            stats.frames = 1
+            stats.finish()
+            logger.info("%s -> %s: %d字节, 压缩率%.2f%%, 用时%.3f秒", input_path, output_path,
+                        stats.bytes_out, stats.compression_ratio, stats.elapsed)
+            if callback is not None:
+                callback(stats)
+            return stats
             
+        except Error:
+            raise
         except Exception as e:
             raise EncodeError(f"PNG转失败: {str(e)}")
 
     @staticmethod
-    def binary_to_png(input_path: str, output_path: str) -> bool:
+    def binary_to_png(input_path: str, output_path: str,
+                      callback: Optional[Callable[[ConversionStats], None]] = None) -> ConversionStats:
         """
         将二进制格式转换为PNG图像
         
         Args:
             input_path: 输入文件路径
             output_path: 输出PNG图像路径
+            callback: 转换完成后以统计信息调用
             
         Returns:
-            bool: 转换是否成功
+            ConversionStats: 转换的统计信息，真值为True
         """
         try:
-            with open(input_path, 'rb') as f:
+            stats = ConversionStats(input_path, output_path)
+            with stats.stage("read"), open(input_path, 'rb') as f:
                 # 读取文件头
                 width, height = struct.unpack('>II', f.read(8))
                 
@@ -84,23 +163,35 @@ class Image:
                 compressed = f.read()
                 
             # 解压数据
-            encoded = decompress_data(compressed)
+            with stats.stage("lz77"):
+                encoded = decompress_data(compressed)
             
             # 计算总位数
             total_bits = width * height
             
             # 解码游程长度
-            binary = decode_run_length(encoded, total_bits)
+            with stats.stage("rle"):
+                binary = decode_run_length(encoded, total_bits)
             
             # 重塑为图像数组
             img_array = np.array(binary).reshape(height, width)
             
             # 转换为PIL图像并保存
-            img = PILImage.fromarray(img_array * 255)
-            img.save(output_path)
-            
-            return True
+            with stats.stage("write"):
+                img = PILImage.fromarray(img_array * 255)
+                img.save(output_path)
+
+            stats.frames = 1
+            stats.pixels = total_bits
+            stats.runs = len(encoded) - 1
+            stats.finish()
+            logger.info("%s -> %s: %dx%d, 用时%.3f秒", input_path, output_path, width, height, stats.elapsed)
+            if callback is not None:
+                callback(stats)
+            return stats
             
+        except Error:
+            raise
         except Exception as e:
             raise DecodeError(f"转PNG失败: {str(e)}")
 
@@ -7,128 +7,2046 @@ BFile (Binary File) 视频模块
 """
 
 import os
-import cv2
+import re
+import glob
+import math
+import time
 import numpy as np
 import struct
 import shutil
 import subprocess
-from typing import Optional, Tuple, List
+import tempfile
+import threading
+import queue
+import collections
+import contextlib
+import mmap
+import hashlib
+import weakref
+import bisect
+import itertools
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional, Tuple, List, Iterable, Iterator, BinaryIO, Union, Callable
 
 from .core import (
     encode_run_length, 
     decode_run_length, 
-    compress_data, 
     decompress_data,
-    get_file_size_info,
+    estimate_compressed_size,
+    _search_scale,
+    RATE_SAMPLE_CHUNKS,
+    RATE_VERIFY_PASSES,
+    ConversionStats,
+    logger,
+    _encode_counted,
+    _LazyModule,
     Error,
     EncodeError,
     DecodeError,
     FileError
 )
 
+# 读取BV文件不需要OpenCV，只在视频编解码、颜色转换和缩放时导入。
+# 未安装时的ImportError带有安装提示，各函数的异常处理中原样抛出，不转换为EncodeError/DecodeError
+cv2 = _LazyModule("cv2", "pip install b-file[video]")
+
+
+# BV文件头: 宽度, 高度, 帧率(低16位)与标志位(高16位), 帧数
+BV_HEADER_FORMAT = ">HHII"
+BV_HEADER_SIZE = struct.calcsize(BV_HEADER_FORMAT)
+
+# 标志位: 文件末尾附带帧索引(seek表)
+BV_FLAG_INDEX = 0x0001
+# 标志位: 每条帧记录在帧大小之后附带1字节帧类型
+BV_FLAG_FRAME_TYPE = 0x0002
+# 标志位: 可变帧率，每条帧记录在帧类型之后附带2字节持续时长（以1/帧率为单位）
+BV_FLAG_VFR = 0x0004
+
+# 可变帧率下单帧的最大持续时长
+BV_MAX_DURATION = 0xFFFF
+
+# 帧类型: 关键帧独立编码，差分帧存储与前一帧的异或结果，引用帧存储内容相同的更早帧的序号
+BV_FRAME_KEY = 0
+BV_FRAME_DELTA = 1
+BV_FRAME_REF = 2
+
+# 解码时缓存的被引用帧数量
+BV_REF_CACHE_SIZE = 64
+
+# 帧索引: 每帧一项(帧数据偏移量, 帧数据大小)，末尾为(索引起始偏移量, 魔数)
+BV_INDEX_ENTRY_FORMAT = ">QI"
+BV_INDEX_ENTRY_SIZE = struct.calcsize(BV_INDEX_ENTRY_FORMAT)
+BV_INDEX_TRAILER_FORMAT = ">Q4s"
+BV_INDEX_TRAILER_SIZE = struct.calcsize(BV_INDEX_TRAILER_FORMAT)
+BV_INDEX_MAGIC = b"BVIX"
+
+# 码率控制: 估算大小时抽取的样本帧数，以及降低帧率之前允许的最小缩放比例
+BV_RATE_SAMPLE_FRAMES = 8
+BV_RATE_MIN_SCALE = 0.25
+
+
+def _pack_header(width: int, height: int, fps: int, flags: int, frame_count: int) -> bytes:
+    """打包BV文件头，标志位存放在帧率字段的高16位"""
+    return struct.pack(BV_HEADER_FORMAT, width, height, (flags << 16) | (fps & 0xFFFF), frame_count)
+
+
+def _read_header(f: BinaryIO) -> Tuple[int, int, int, int, int]:
+    """
+    读取BV文件头
+
+    返回:
+        (宽度, 高度, 帧率, 标志位, 帧数)
+    """
+    header = f.read(BV_HEADER_SIZE)
+    if len(header) < BV_HEADER_SIZE:
+        raise DecodeError("BV文件头不完整")
+    width, height, fps_flags, frame_count = struct.unpack(BV_HEADER_FORMAT, header)
+    return width, height, fps_flags & 0xFFFF, fps_flags >> 16, frame_count
+
+
+def _write_index(f: BinaryIO, entries: List[Tuple[int, int]]) -> None:
+    """在文件当前位置写入帧索引及其尾部信息"""
+    index_offset = f.tell()
+    for offset, size in entries:
+        f.write(struct.pack(BV_INDEX_ENTRY_FORMAT, offset, size))
+    f.write(struct.pack(BV_INDEX_TRAILER_FORMAT, index_offset, BV_INDEX_MAGIC))
+
+
+def _read_index_offset(f: BinaryIO) -> int:
+    """从文件末尾读取帧索引的起始偏移量"""
+    f.seek(-BV_INDEX_TRAILER_SIZE, os.SEEK_END)
+    index_offset, magic = struct.unpack(BV_INDEX_TRAILER_FORMAT, f.read(BV_INDEX_TRAILER_SIZE))
+    if magic != BV_INDEX_MAGIC:
+        raise DecodeError("BV帧索引已损坏")
+    return index_offset
+
+
+def _writer_flags(index: bool, keyframe_interval: int, dedup: bool, vfr: bool) -> int:
+    """根据编码选项计算文件头中的标志位"""
+    flags = BV_FLAG_INDEX if index else 0
+    if keyframe_interval > 0 or dedup:
+        flags |= BV_FLAG_FRAME_TYPE
+    if vfr:
+        flags |= BV_FLAG_VFR
+    return flags
+
+
+def _record_extra_format(flags: int) -> str:
+    """帧记录中位于帧大小与帧数据之间的附加字段格式"""
+    fmt = ">"
+    if flags & BV_FLAG_FRAME_TYPE:
+        fmt += "B"
+    if flags & BV_FLAG_VFR:
+        fmt += "H"
+    return fmt
+
+
+def _write_record(f: BinaryIO, flags: int, payload: bytes, frame_type: int = 0, duration: int = 1) -> int:
+    """
+    写入一条帧记录
+
+    返回:
+        帧数据在文件中的偏移量
+    """
+    f.write(struct.pack(">I", len(payload)))
+    if flags & BV_FLAG_FRAME_TYPE:
+        f.write(struct.pack(">B", frame_type))
+    if flags & BV_FLAG_VFR:
+        f.write(struct.pack(">H", duration))
+    offset = f.tell()
+    f.write(payload)
+    return offset
+
+
+def _encode_prepared(data: Union[np.ndarray, bytes, Tuple[np.ndarray, np.ndarray]],
+                     frame_type: int) -> Tuple[bytes, Optional[tuple], int]:
+    """
+    编码BVWriter准备好的帧数据，引用帧的数据已是最终形式
+
+    差分帧的数据为(异或结果, 完整帧)，两者都编码，保留较小的一个：
+    画面大幅变化时异或结果反而比完整帧难压缩，此时改存为关键帧。
+
+    返回:
+        (压缩的帧数据, _encode_counted的统计, 实际的帧类型)，引用帧的统计为None
+    """
+    if frame_type == BV_FRAME_REF:
+        return data, None, frame_type
+    if frame_type != BV_FRAME_DELTA:
+        return _encode_counted(data.ravel()) + (frame_type,)
+
+    residual, binary = data
+    delta, delta_counts = _encode_counted(residual.ravel())
+    key, key_counts = _encode_counted(binary.ravel())
+    # 两次编码的耗时都计入统计，其余计数取保留的一个
+    times = (delta_counts[4] + key_counts[4], delta_counts[5] + key_counts[5])
+    if len(key) <= len(delta):
+        return key, key_counts[:4] + times, BV_FRAME_KEY
+    return delta, delta_counts[:4] + times, BV_FRAME_DELTA
+
+
+def _decode_frame(compressed_frame: Union[bytes, memoryview], width: int, height: int) -> np.ndarray:
+    """将压缩的帧数据解码为(height, width)的二值化数组"""
+    decompressed_frame = decompress_data(compressed_frame)
+    frame_data = decode_run_length(decompressed_frame, width * height)
+    return frame_data.reshape(height, width)
+
+
+class _BVReader:
+    """BV帧读取器，负责定位帧数据并还原差分帧"""
+
+    def __init__(self, f: BinaryIO, view: Optional[memoryview] = None):
+        """
+        参数:
+            f: 已打开的BV文件对象或内存映射
+            view: 整个文件的memoryview，提供时帧数据以切片形式返回，不做复制
+        """
+        self.f = f
+        self.view = view
+        f.seek(0)
+        self.width, self.height, self.fps, self.flags, self.frame_count = _read_header(f)
+        self.index_offset = _read_index_offset(f) if self.flags & BV_FLAG_INDEX else 0
+        self._extra_format = _record_extra_format(self.flags)
+        self._extra_size = struct.calcsize(self._extra_format)
+        # 可变帧率文件中每个存储帧结束时的帧时刻，即持续时长的前缀和
+        self._tick_ends = None
+        # 无索引时沿帧链扫描得到的(偏移量, 大小, 帧类型, 持续时长)
+        self._entries = []
+        self._scan_pos = BV_HEADER_SIZE
+        # 最近一次解码的(帧序号, 帧)，顺序读取差分帧时避免回溯到关键帧
+        self._last = None
+        # 被引用帧的解码结果，重复帧直接复用
+        self._ref_cache = collections.OrderedDict()
+
+    def _parse_extra(self, extra: bytes) -> Tuple[int, int]:
+        """解析帧记录的附加字段，返回(帧类型, 持续时长)"""
+        fields = struct.unpack(self._extra_format, extra)
+        frame_type = fields[0] if self.flags & BV_FLAG_FRAME_TYPE else BV_FRAME_KEY
+        duration = fields[-1] if self.flags & BV_FLAG_VFR else 1
+        return frame_type, duration
+
+    def locate(self, n: int) -> Tuple[int, int, int, int]:
+        """
+        定位第n帧
+
+        返回:
+            (帧数据偏移量, 帧数据大小, 帧类型, 持续时长)
+        """
+        f = self.f
+        if self.flags & BV_FLAG_INDEX:
+            f.seek(self.index_offset + n * BV_INDEX_ENTRY_SIZE)
+            offset, frame_size = struct.unpack(BV_INDEX_ENTRY_FORMAT, f.read(BV_INDEX_ENTRY_SIZE))
+            f.seek(offset - self._extra_size)
+            return (offset, frame_size) + self._parse_extra(f.read(self._extra_size))
+
+        # 没有索引时只能沿帧链逐个跳过，已扫描的位置会被记录下来
+        while len(self._entries) <= n:
+            f.seek(self._scan_pos)
+            frame_size = struct.unpack(">I", f.read(4))[0]
+            frame_type, duration = self._parse_extra(f.read(self._extra_size))
+            offset = f.tell()
+            self._entries.append((offset, frame_size, frame_type, duration))
+            self._scan_pos = offset + frame_size
+        return self._entries[n]
+
+    def _ends(self) -> List[int]:
+        """各存储帧结束时的帧时刻，首次调用时遍历全部帧记录"""
+        if self._tick_ends is None:
+            self._tick_ends = list(itertools.accumulate(self.locate(n)[3] for n in range(self.frame_count)))
+        return self._tick_ends
+
+    @property
+    def tick_count(self) -> int:
+        """按恒定帧率展开后的总帧数，非可变帧率文件等于存储的帧数"""
+        if not self.flags & BV_FLAG_VFR:
+            return self.frame_count
+        ends = self._ends()
+        return ends[-1] if ends else 0
+
+    def frame_at(self, tick: int) -> int:
+        """返回第tick个帧时刻所在的存储帧序号"""
+        if tick < 0 or tick >= self.tick_count:
+            raise DecodeError(f"帧时刻超出范围: {tick}/{self.tick_count}")
+        if not self.flags & BV_FLAG_VFR:
+            return tick
+        return bisect.bisect_right(self._ends(), tick)
+
+    def payload(self, offset: int, frame_size: int) -> Union[bytes, memoryview]:
+        """读取帧数据，有memoryview时直接返回切片"""
+        if self.view is not None:
+            return self.view[offset:offset + frame_size]
+        self.f.seek(offset)
+        return self.f.read(frame_size)
+
+    def _resolve_ref(self, offset: int, frame_size: int) -> np.ndarray:
+        """解码引用帧，返回被引用帧的解码结果"""
+        ref_id = struct.unpack(">I", self.payload(offset, frame_size))[0]
+        frame = self._ref_cache.get(ref_id)
+        if frame is None:
+            frame = self.frame(ref_id)
+            self._ref_cache[ref_id] = frame
+            if len(self._ref_cache) > BV_REF_CACHE_SIZE:
+                self._ref_cache.popitem(last=False)
+        else:
+            self._ref_cache.move_to_end(ref_id)
+        return frame
+
+    def frame(self, n: int) -> np.ndarray:
+        """解码第n帧，返回(height, width)的二值化数组"""
+        if n < 0 or n >= self.frame_count:
+            raise DecodeError(f"帧序号超出范围: {n}/{self.frame_count}")
+        if self._last is not None and self._last[0] == n:
+            return self._last[1]
+
+        # 向前回溯到最近的关键帧、引用帧或刚解码过的前一帧
+        chain = []
+        base = None
+        k = n
+        while True:
+            offset, frame_size, frame_type, _ = self.locate(k)
+            if frame_type == BV_FRAME_REF:
+                base = self._resolve_ref(offset, frame_size)
+                break
+            chain.append((offset, frame_size, frame_type))
+            if frame_type == BV_FRAME_KEY:
+                break
+            if self._last is not None and self._last[0] == k - 1:
+                base = self._last[1]
+                break
+            k -= 1
+            if k < 0:
+                raise DecodeError("BV文件缺少关键帧")
+
+        frame = base
+        for offset, frame_size, frame_type in reversed(chain):
+            decoded = _decode_frame(self.payload(offset, frame_size), self.width, self.height)
+            # 差分结果写回刚解码的数组，不再分配新数组
+            frame = decoded if frame_type == BV_FRAME_KEY else np.bitwise_xor(frame, decoded, out=decoded)
+
+        self._last = (n, frame)
+        return frame
+
+    def frames(self, indices: Iterable[int], workers: int = 1) -> Iterator[np.ndarray]:
+        """
+        依次解码多帧
+
+        参数:
+            indices: 帧序号序列
+            workers: 解码进程数，大于1时在进程池中提前解压后续帧，差分帧仍按顺序还原
+        """
+        if workers <= 1:
+            for n in indices:
+                yield self.frame(n)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = collections.deque()
+
+            def finish():
+                n, frame_type, future = pending.popleft()
+                if future is None:
+                    return self.frame(n)
+                decoded = future.result()
+                if frame_type == BV_FRAME_KEY:
+                    frame = decoded
+                elif self._last is not None and self._last[0] == n - 1:
+                    frame = np.bitwise_xor(self._last[1], decoded, out=decoded)
+                else:
+                    # 跳帧读取差分帧时需要回溯到关键帧
+                    return self.frame(n)
+                self._last = (n, frame)
+                return frame
+
+            for n in indices:
+                if n < 0 or n >= self.frame_count:
+                    raise DecodeError(f"帧序号超出范围: {n}/{self.frame_count}")
+                offset, frame_size, frame_type, _ = self.locate(n)
+                if frame_type == BV_FRAME_REF:
+                    # 引用帧无需解压，按顺序轮到时直接复用
+                    pending.append((n, frame_type, None))
+                    continue
+                # memoryview无法传给子进程，此处需要复制为bytes
+                payload = bytes(self.payload(offset, frame_size))
+                future = pool.submit(_decode_frame, payload, self.width, self.height)
+                pending.append((n, frame_type, future))
+                # 限制提前解码的帧数，避免占用过多内存
+                if len(pending) >= workers * 2:
+                    yield finish()
+            while pending:
+                yield finish()
+
+    def ticks(self, ticks: Iterable[int], workers: int = 1) -> Iterator[np.ndarray]:
+        """
+        按恒定帧率依次解码，可变帧率的帧按持续时长重复输出
+
+        参数:
+            ticks: 递增的输出帧序号序列，范围为[0, tick_count)
+            workers: 解码进程数
+        """
+        if not self.flags & BV_FLAG_VFR:
+            yield from self.frames(ticks, workers=workers)
+            return
+
+        # 先由持续时长算出每个输出帧对应的存储帧，只解码需要的帧
+        plan = []
+        n = 0
+        tick_end = self.locate(0)[3] if self.frame_count else 0
+        for t in ticks:
+            while t >= tick_end:
+                n += 1
+                if n >= self.frame_count:
+                    break
+                tick_end += self.locate(n)[3]
+            if n >= self.frame_count:
+                break
+            if plan and plan[-1][0] == n:
+                plan[-1][1] += 1
+            else:
+                plan.append([n, 1])
+
+        for (n, repeat), frame in zip(plan, self.frames([n for n, _ in plan], workers=workers)):
+            for _ in range(repeat):
+                yield frame
+
+
+def _frame_indices(reader: _BVReader, start: int, stop: Optional[int], step: int, expand: bool) -> range:
+    """按切片参数计算要解码的帧序号，expand为True时以展开后的帧计"""
+    count = reader.tick_count if expand else reader.frame_count
+    return range(*slice(start, stop, step).indices(count))
+
+
+def _iter_decoded(reader: _BVReader, indices: range, expand: bool, workers: int,
+                  f: Optional[BinaryIO] = None) -> Iterator[np.ndarray]:
+    """
+    依次解码indices中的帧
+
+    参数:
+        f: 生成器结束或被关闭时要关闭的文件
+    """
+    try:
+        if expand:
+            yield from reader.ticks(indices, workers=workers)
+        else:
+            yield from reader.frames(indices, workers=workers)
+    except (Error, ImportError):
+        raise
+    except Exception as e:
+        raise DecodeError(f"读取BV帧失败: {str(e)}")
+    finally:
+        if f is not None:
+            f.close()
+
+
+def _prefetch(iterable: Iterable, depth: int = 1) -> Iterator:
+    """
+    在后台线程中提前取出iterable的后续元素
+
+    参数:
+        iterable: 要预取的可迭代对象
+        depth: 最多提前取出的元素个数
+
+    返回:
+        与iterable顺序一致的迭代器，后台线程中的异常会在取到该位置时重新抛出
+    """
+    items = queue.Queue(maxsize=depth)
+    stopped = threading.Event()
+    done = object()
+
+    def worker():
+        try:
+            for item in iterable:
+                # 消费者已停止时不再继续解码
+                while not stopped.is_set():
+                    try:
+                        items.put((item, None), timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stopped.is_set():
+                    return
+            items.put((done, None))
+        except BaseException as e:
+            items.put((done, e))
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
+        # 释放可能阻塞在put上的后台线程
+        while thread.is_alive():
+            try:
+                items.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        thread.join()
+
+
+class _LatestFrame:
+    """只保留最新一帧的单槽缓冲区，用于在采集线程与编码线程之间传递实时帧"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._item = None
+        self.closed = False
+        self.error = None
+        # 未被取走就被覆盖的帧数
+        self.overwritten = 0
+
+    @property
+    def pending(self) -> bool:
+        """是否有尚未取走的帧"""
+        with self._condition:
+            return self._item is not None
+
+    def put(self, frame: np.ndarray, timestamp: float) -> None:
+        """放入一帧，尚未取走的旧帧被覆盖"""
+        with self._condition:
+            if self._item is not None:
+                self.overwritten += 1
+            self._item = (frame, timestamp)
+            self._condition.notify()
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        """标记采集结束，error为采集线程中的异常"""
+        with self._condition:
+            self.closed = True
+            self.error = error
+            self._condition.notify()
+
+    def take(self, timeout: Optional[float] = None) -> Optional[Tuple[np.ndarray, float]]:
+        """
+        取出最新一帧
+
+        返回:
+            (帧, 采集时刻)，超时或采集已结束时返回None
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._item is not None or self.closed, timeout)
+            item, self._item = self._item, None
+            return item
+
+
+def _capture_source(source: Union[int, str, "cv2.VideoCapture", Iterable[np.ndarray]],
+                    live: Optional[bool] = None) -> Tuple[Optional["cv2.VideoCapture"], Optional["cv2.VideoCapture"], bool]:
+    """
+    打开采集源并判断是否为实时来源
+
+    设备编号、URL和管道是实时来源；本地文件、能得到总帧数的来源（如图像序列）和可迭代对象
+    是有限的来源，读取速度不代表时间，需要按源时间轴读取。
+
+    参数:
+        source: 设备编号、文件路径或URL、已打开的cv2.VideoCapture，或帧的可迭代对象
+        live: 是否为实时来源，为None时自动判断
+
+    返回:
+        (VideoCapture，source为可迭代对象时为None, 需要由调用方释放的VideoCapture, 是否为实时来源)
+    """
+    if isinstance(source, int):
+        cap = cv2.VideoCapture(source)
+        owned, finite = cap, False
+    elif isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+        cap = cv2.VideoCapture(path)
+        owned, finite = cap, os.path.isfile(path)
+    elif hasattr(source, "__iter__"):
+        # VideoCapture不可迭代，按此区分，不为判断类型而导入OpenCV
+        return None, None, bool(live)
+    else:
+        cap, owned, finite = source, None, False
+
+    if not cap.isOpened():
+        if owned is not None:
+            owned.release()
+        raise EncodeError("无法打开采集源")
+    if live is None:
+        live = isinstance(source, int) or not (finite or cap.get(cv2.CAP_PROP_FRAME_COUNT) > 0)
+    return cap, owned, live
+
+
+def _read_capture(cap: "cv2.VideoCapture") -> Iterator[np.ndarray]:
+    """依次读取VideoCapture的帧，直到读取失败"""
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            return
+        yield frame
+
+
+def _capture_live(frames: Iterator[np.ndarray], writer: "BVWriter", target_fps: int,
+                  target_size: Optional[Tuple[Optional[int], Optional[int]]], max_latency: float,
+                  duration: Optional[float], max_frames: Optional[int],
+                  stop_event: Optional[threading.Event]) -> Tuple[int, int, int, int]:
+    """
+    实时来源: 采集线程持续读取并只保留最新一帧，当前线程按目标帧率取帧编码
+
+    返回:
+        (编码的帧数, 采集到的帧数, 采集到但未编码的帧数, 跳过的帧时刻数)
+    """
+    interval = 1.0 / target_fps
+    latest = _LatestFrame()
+    stopped = threading.Event()
+    captured = 0
+
+    def capture():
+        nonlocal captured
+        try:
+            for frame in frames:
+                if stopped.is_set():
+                    break
+                captured += 1
+                latest.put(frame, time.monotonic())
+            latest.close()
+        except BaseException as e:
+            latest.close(e)
+
+    thread = threading.Thread(target=capture, daemon=True)
+    stats = writer.stats
+    encoded = skipped = 0
+    size = None
+    thread.start()
+    try:
+        started = next_tick = time.monotonic()
+        while max_frames is None or encoded < max_frames:
+            if stop_event is not None and stop_event.is_set():
+                break
+            now = time.monotonic()
+            if duration is not None and now - started >= duration:
+                break
+            if next_tick > now:
+                time.sleep(next_tick - now)
+
+            with stats.stage("read"):
+                item = latest.take(timeout=max_latency)
+            if item is None:
+                if latest.closed:
+                    break
+                continue
+            frame = item[0]
+            if size is None:
+                size = _plan_transform(frame.shape[1], frame.shape[0], None, target_size)
+            with stats.stage("read"):
+                frame = _transform_frame(frame, None, size)
+            writer.write(frame)
+            encoded += 1
+
+            next_tick += interval
+            behind = time.monotonic() - next_tick
+            if behind > max_latency:
+                # 跳过已经错过的帧时刻，不追赶
+                missed = int(behind // interval) + 1
+                skipped += missed
+                next_tick += missed * interval
+                if writer.vfr:
+                    for _ in range(missed):
+                        writer.write(frame)
+    finally:
+        stopped.set()
+        thread.join()
+
+    if latest.error is not None:
+        raise EncodeError(f"读取采集源失败: {str(latest.error)}")
+    # 被覆盖的帧和停止时仍未取走的帧都没有编码
+    dropped = latest.overwritten + (1 if latest.pending else 0)
+    return encoded, captured, dropped, skipped
+
+
+def _capture_timeline(cap: Optional["cv2.VideoCapture"], frames: Optional[Iterable[np.ndarray]],
+                      target_fps: int) -> Iterator[Tuple[Optional[np.ndarray], int, bool]]:
+    """
+    有限的来源按源时间轴读取
+
+    返回:
+        依次产生(源帧, 输出次数, 是否为新读取的源帧)。VideoCapture按时间戳重采样到目标帧率，
+        用不到的源帧为(None, 0, True)，视频结尾沿用最后的帧时不是新的源帧；可迭代对象的每一项输出一次
+    """
+    if cap is None:
+        for frame in frames:
+            yield frame, 1, True
+        return
+    resampler = _Resampler(target_fps)
+    frame = None
+    for until, grabbed in _grab_timestamps(cap, target_fps):
+        count = resampler.count(until)
+        if count and grabbed:
+            ret, frame = cap.retrieve()
+            if not ret:
+                return
+        yield (frame if count else None), (count if frame is not None else 0), grabbed
+
+
+def _capture_finite(cap: Optional["cv2.VideoCapture"], frames: Optional[Iterable[np.ndarray]],
+                    writer: "BVWriter", target_fps: int,
+                    target_size: Optional[Tuple[Optional[int], Optional[int]]],
+                    duration: Optional[float], max_frames: Optional[int],
+                    stop_event: Optional[threading.Event]) -> Tuple[int, int]:
+    """
+    有限的来源: 按源时间轴逐帧编码，读取等待编码，不丢帧。duration按源时间计
+
+    返回:
+        (编码的帧数, 读取的源帧数)
+    """
+    limit = max_frames
+    if duration is not None:
+        limit = int(round(duration * target_fps)) if limit is None else min(limit, int(round(duration * target_fps)))
+    stats = writer.stats
+    encoded = captured = 0
+    size = None
+    timeline = _capture_timeline(cap, frames, target_fps)
+    while limit is None or encoded < limit:
+        if stop_event is not None and stop_event.is_set():
+            break
+        with stats.stage("read"):
+            item = next(timeline, None)
+        if item is None:
+            break
+        frame, count, grabbed = item
+        captured += grabbed
+        if not count:
+            continue
+        if size is None:
+            size = _plan_transform(frame.shape[1], frame.shape[0], None, target_size)
+        with stats.stage("read"):
+            frame = _transform_frame(frame, None, size)
+        for _ in range(count if limit is None else min(count, limit - encoded)):
+            writer.write(frame)
+            encoded += 1
+    return encoded, captured
+
+
+def _grab_timestamps(cap: "cv2.VideoCapture", fallback_fps: float,
+                     start: float = 0.0) -> Iterator[Tuple[float, bool]]:
+    """
+    依次grab源帧，产生每个源帧作为最接近帧的截止时刻
+
+    源帧覆盖其时间戳前后各半个帧间隔，调用方需要该帧时再retrieve，
+    用不到的源帧省去解码后的图像转换。start大于0时先将视频定位到起点附近。
+    视频结束后再产生一次最后一帧的结束时刻，此时已无法retrieve，
+    调用方沿用最后取得的帧填满最后半个帧间隔，否则提高帧率时会少一帧。
+
+    参数:
+        cap: 已打开的视频
+        fallback_fps: 视频没有帧率信息时使用的帧率
+        start: 起点（秒）
+
+    返回:
+        依次产生(截止时刻（秒）, 是否为新grab的源帧)
+    """
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    if fps <= 0:
+        fps = fallback_fps
+    half_frame = 0.5 / fps
+
+    source_index = 0
+    until = None
+    if start > 0:
+        # 定位不精确或后端不支持定位时，起点之前的帧由调用方按时间戳跳过
+        if cap.set(cv2.CAP_PROP_POS_MSEC, start * 1000.0):
+            source_index = max(0, int(round(cap.get(cv2.CAP_PROP_POS_FRAMES))))
+
+    while cap.grab():
+        timestamp = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        if timestamp <= 0 and source_index > 0:
+            # 部分后端不提供时间戳，按标称帧率推算
+            timestamp = source_index / fps
+        source_index += 1
+        until = timestamp + half_frame
+        yield until, True
+    if until is not None:
+        yield until + half_frame, False
+
+
+class _Resampler:
+    """按时间戳计算每个源帧在目标帧率下需要输出的次数"""
+
+    def __init__(self, target_fps: float, start: float = 0.0, end: Optional[float] = None):
+        self.target_fps = target_fps
+        self.start = start
+        self.end = end
+        self.output_index = 0
+        # 输出时刻由序号直接计算，避免累加误差
+        self.output_time = start
+
+    @property
+    def done(self) -> bool:
+        """是否已到达片段终点"""
+        return self.end is not None and self.output_time >= self.end
+
+    def count(self, until: float) -> int:
+        """
+        计算截止时刻为until的源帧需要输出的次数
+
+        源帧率低于目标帧率时同一源帧会输出多次，高于目标帧率时部分源帧输出0次。
+        """
+        count = 0
+        while self.output_time < until and not self.done:
+            count += 1
+            self.output_index += 1
+            self.output_time = self.start + self.output_index / self.target_fps
+        return count
+
+
+def _resample_frames(cap: "cv2.VideoCapture", target_fps: float, start: float = 0.0,
+                     end: Optional[float] = None) -> Iterator[np.ndarray]:
+    """
+    按时间戳将视频重采样到目标帧率
+
+    每个输出时刻取时间戳最接近的源帧，到达end后停止读取，读取量只与片段长度有关。
+
+    参数:
+        cap: 已打开的视频
+        target_fps: 目标帧率
+        start: 片段起点（秒）
+        end: 片段终点（秒），为None时读到视频结尾
+
+    返回:
+        依次产生输出帧
+    """
+    resampler = _Resampler(target_fps, start, end)
+    frame = None
+    for until, grabbed in _grab_timestamps(cap, target_fps, start):
+        count = resampler.count(until)
+        if count and grabbed:
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+        if count and frame is not None:
+            for _ in range(count):
+                yield frame
+        if resampler.done:
+            break
+
+
+def _fan_out_frames(cap: "cv2.VideoCapture", resamplers: List[_Resampler], crop: Optional[Tuple[int, int, int, int]],
+                    start: float = 0.0) -> Iterator[Tuple[np.ndarray, List[int]]]:
+    """
+    读取一次视频，按各输出的帧率计算每个源帧的输出次数
+
+    参数:
+        cap: 已打开的视频
+        resamplers: 每个输出对应的重采样器
+        crop: 裁剪区域(x, y, 宽度, 高度)
+        start: 片段起点（秒）
+
+    返回:
+        依次产生(裁剪后的灰度帧, 每个输出的输出次数)，所有输出都用不到的源帧不会retrieve
+    """
+    fallback_fps = max(resampler.target_fps for resampler in resamplers)
+    frame = None
+    for until, grabbed in _grab_timestamps(cap, fallback_fps, start):
+        counts = [resampler.count(until) for resampler in resamplers]
+        if any(counts) and grabbed:
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+            # 灰度转换和裁剪只做一次，由各输出共享
+            if crop is None and frame.ndim == 3:
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            elif crop is not None:
+                frame = _transform_frame(frame, crop, (crop[2], crop[3]))
+        if any(counts) and frame is not None:
+            yield frame, counts
+        if all(resampler.done for resampler in resamplers):
+            break
+
+
+def _content_bbox(frames: Iterable[np.ndarray], threshold: int) -> Optional[Tuple[int, int, int, int]]:
+    """
+    计算所有帧中内容区域的并集边界框
+
+    背景取第一帧二值化后边框上的多数值，与背景不同的像素视为内容。
+
+    返回:
+        (x, y, 宽度, 高度)，没有内容时返回None
+    """
+    mask = None
+    background = None
+    for frame in frames:
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        binary = frame >= threshold
+        if background is None:
+            border = np.concatenate((binary[0], binary[-1], binary[:, 0], binary[:, -1]))
+            background = border.mean() >= 0.5
+        if mask is None:
+            mask = binary != background
+        else:
+            mask |= binary != background
+
+    if mask is None or not mask.any():
+        return None
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    return int(cols[0]), int(rows[0]), int(cols[-1] - cols[0] + 1), int(rows[-1] - rows[0] + 1)
+
+
+def _plan_transform(width: int, height: int, crop: Optional[Tuple[int, int, int, int]],
+                    target_size: Optional[Tuple[Optional[int], Optional[int]]]) -> Tuple[int, int]:
+    """
+    校验裁剪区域并计算输出尺寸
+
+    参数:
+        width: 源视频宽度
+        height: 源视频高度
+        crop: 裁剪区域(x, y, 宽度, 高度)
+        target_size: 输出尺寸(宽度, 高度)，其中一项为None时按比例计算
+
+    返回:
+        (输出宽度, 输出高度)
+    """
+    if crop is not None:
+        x, y, w, h = crop
+        if x < 0 or y < 0 or w <= 0 or h <= 0 or x + w > width or y + h > height:
+            raise EncodeError(f"裁剪区域超出画面: {crop}，画面尺寸为{width}x{height}")
+        width, height = w, h
+
+    if target_size is None:
+        return width, height
+    out_width, out_height = target_size
+    if out_width is None and out_height is None:
+        return width, height
+    if out_width is None:
+        out_width = max(1, round(width * out_height / height))
+    elif out_height is None:
+        out_height = max(1, round(height * out_width / width))
+    if out_width <= 0 or out_height <= 0:
+        raise EncodeError(f"输出尺寸无效: {target_size}")
+    return out_width, out_height
+
+
+def _transform_frame(frame: np.ndarray, crop: Optional[Tuple[int, int, int, int]],
+                     size: Tuple[int, int]) -> np.ndarray:
+    """裁剪并缩放一帧，缩放在二值化之前使用区域插值，返回灰度图"""
+    if crop is not None:
+        x, y, w, h = crop
+        frame = frame[y:y + h, x:x + w]
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    if (frame.shape[1], frame.shape[0]) != size:
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    return frame
+
+
+def _rendition_specs(outputs: Union[str, List[Union[str, dict]]], threshold: int, target_fps: int,
+                     target_size: Optional[Tuple[Optional[int], Optional[int]]],
+                     max_bytes: Optional[int] = None) -> List[dict]:
+    """
+    将输出参数整理为完整的输出规格列表
+
+    返回:
+        [{"path", "target_size", "threshold", "target_fps", "max_bytes", "scale"}]，
+        未指定的项取默认值，scale为码率控制在target_size基础上的缩放比例
+    """
+    if isinstance(outputs, (str, os.PathLike)):
+        outputs = [outputs]
+    if not outputs:
+        raise EncodeError("至少需要一个输出")
+
+    keys = ("path", "target_size", "threshold", "target_fps", "max_bytes")
+    specs = []
+    for output in outputs:
+        if not isinstance(output, dict):
+            output = {"path": output}
+        unknown = set(output) - set(keys)
+        if unknown:
+            raise EncodeError(f"未知的输出参数: {', '.join(sorted(unknown))}")
+        if "path" not in output:
+            raise EncodeError("输出规格缺少path")
+        spec = {"target_size": target_size, "threshold": threshold, "target_fps": target_fps, "max_bytes": max_bytes}
+        spec.update(output)
+        spec["scale"] = 1.0
+        specs.append(spec)
+    return specs
+
+
+def _scaled_size(size: Tuple[int, int], scale: float) -> Tuple[int, int]:
+    """按比例缩放尺寸，宽高至少为1"""
+    if scale >= 1.0:
+        return size
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+def _sample_frames(cap: "cv2.VideoCapture", start: float, end: float, count: int,
+                   crop: Optional[Tuple[int, int, int, int]]) -> List[np.ndarray]:
+    """
+    在片段内均匀定位并读取若干帧，用于估算压缩后的大小
+
+    返回:
+        裁剪后的灰度帧列表
+    """
+    samples = []
+    for i in range(count):
+        cap.set(cv2.CAP_PROP_POS_MSEC, (start + (i + 0.5) * (end - start) / count) * 1000.0)
+        ret, frame = cap.read()
+        if not ret:
+            continue
+        size = (frame.shape[1], frame.shape[0]) if crop is None else (crop[2], crop[3])
+        samples.append(_transform_frame(frame, crop, size))
+    if not samples:
+        raise EncodeError("无法读取样本帧")
+    return samples
+
+
+def _estimate_frame_size(samples: List[np.ndarray], size: Tuple[int, int], threshold: int) -> float:
+    """按样本帧估算单帧压缩后的平均大小（字节），均按关键帧计算"""
+    # 每帧单独压缩，不能跨帧匹配，因此逐帧估算；样本帧较多时每帧只抽取一个样本块
+    chunks = max(1, RATE_SAMPLE_CHUNKS // len(samples))
+    total = 0
+    for sample in samples:
+        encoded = encode_run_length(_transform_frame(sample, None, size) >= threshold)
+        total += estimate_compressed_size(encoded, chunks=chunks)
+    return total / len(samples)
+
+
+def _shrink_rendition(spec: dict, ratio: float) -> bool:
+    """
+    将输出的数据量缩小到约ratio倍，先降低分辨率，达到最小缩放比例后再降低帧率
+
+    返回:
+        是否还能继续缩小
+    """
+    scale = spec["scale"] * math.sqrt(ratio)
+    if scale >= BV_RATE_MIN_SCALE:
+        spec["scale"] = scale
+        return True
+    if spec["scale"] > BV_RATE_MIN_SCALE:
+        # 分辨率降到下限后剩余的部分由帧率承担
+        ratio /= (BV_RATE_MIN_SCALE / spec["scale"]) ** 2
+        spec["scale"] = BV_RATE_MIN_SCALE
+    if spec["target_fps"] <= 1:
+        return False
+    spec["target_fps"] = max(1, min(spec["target_fps"] - 1, math.floor(spec["target_fps"] * ratio)))
+    return True
+
+
+def _fit_rendition(spec: dict, samples: List[np.ndarray], size: Tuple[int, int], duration: float, flags: int) -> None:
+    """
+    根据样本帧估算文件大小，调整输出的缩放比例和帧率使其不超过max_bytes
+
+    参数:
+        spec: 输出规格，scale和target_fps会被修改
+        samples: 裁剪后的灰度样本帧
+        size: 码率控制之前的输出尺寸
+        duration: 片段时长（秒）
+        flags: 文件头标志位，用于计算每帧记录和索引的额外开销
+    """
+    overhead = 4 + struct.calcsize(_record_extra_format(flags))
+    if flags & BV_FLAG_INDEX:
+        overhead += BV_INDEX_ENTRY_SIZE
+
+    def estimate(scale: float) -> int:
+        frame_count = math.ceil(duration * spec["target_fps"])
+        frame_size = _estimate_frame_size(samples, _scaled_size(size, scale), spec["threshold"])
+        return BV_HEADER_SIZE + BV_INDEX_TRAILER_SIZE + math.ceil(frame_count * (frame_size + overhead))
+
+    max_bytes = spec["max_bytes"]
+    spec["scale"] = _search_scale(estimate, max_bytes, BV_RATE_MIN_SCALE)
+    estimated = estimate(spec["scale"])
+    if estimated > max_bytes:
+        # 最小分辨率仍超出预算时降低帧率
+        _shrink_rendition(spec, max_bytes / estimated)
+
+
+def _open_capture(input_path: str) -> "cv2.VideoCapture":
+    """打开视频文件"""
+    cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        raise EncodeError("无法打开视频文件")
+    return cap
+
+
+def _encode_renditions(input_path: str, specs: List[dict], crop: Optional[Tuple[int, int, int, int]],
+                       start: float, end: Optional[float], source_size: Tuple[int, int], options: dict,
+                       workers: int = 1,
+                       callback: Optional[Callable[[ConversionStats], None]] = None) -> List["BVWriter"]:
+    """
+    读取一遍视频，将帧分发写入各输出
+
+    参数:
+        input_path: 输入视频路径
+        specs: 输出规格列表
+        crop: 裁剪区域(x, y, 宽度, 高度)
+        start: 片段起点（秒）
+        end: 片段终点（秒）
+        source_size: 源视频尺寸(宽度, 高度)
+        options: 传给BVWriter的编码选项
+        workers: 压缩帧数据的进程数
+        callback: 传给各BVWriter的进度回调
+
+    返回:
+        已关闭的BVWriter列表，与specs一一对应
+    """
+    cap = _open_capture(input_path)
+    try:
+        with contextlib.ExitStack() as stack:
+            writers = []
+            for spec in specs:
+                out_width, out_height = _scaled_size(_plan_transform(*source_size, crop, spec["target_size"]),
+                                                     spec["scale"])
+                writers.append(stack.enter_context(BVWriter(spec["path"], fps=spec["target_fps"],
+                                                            threshold=spec["threshold"], width=out_width,
+                                                            height=out_height, callback=callback, **options)))
+            resamplers = [_Resampler(spec["target_fps"], start, end) for spec in specs]
+            source = _fan_out_frames(cap, resamplers, crop, start)
+            if workers > 1:
+                # 在后台线程中解码视频，与压缩和写入并行
+                source = _prefetch(source, depth=workers * 2)
+            # 出错中止时先停止并等待预取线程，之后才能释放仍可能被它读取的cap
+            stack.enter_context(contextlib.closing(source))
+            _write_renditions(source, writers, workers)
+    finally:
+        cap.release()
+    return writers
+
+
+def _write_renditions(source: Iterable[Tuple[np.ndarray, List[int]]], writers: List["BVWriter"],
+                      workers: int = 1) -> None:
+    """
+    将_fan_out_frames分发的帧缩放后写入各输出
+
+    workers大于1时所有输出共用一个进程池压缩，各输出仍按原顺序写入。
+    源视频的解码耗时计入每个输出的读取阶段，缩放计入各自的读取阶段。
+    """
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    pendings = [collections.deque() for _ in writers]
+    source = iter(source)
+    try:
+        while True:
+            started = time.perf_counter()
+            item = next(source, None)
+            decoded = time.perf_counter() - started
+            if item is None:
+                break
+            frame, counts = item
+            for writer, pending, count in zip(writers, pendings, counts):
+                writer.stats.times["read"] += decoded
+                if not count:
+                    continue
+                with writer.stats.stage("read"):
+                    resized = _transform_frame(frame, None, (writer.width, writer.height))
+                for _ in range(count):
+                    if pool is None:
+                        writer.write(resized)
+                    else:
+                        writer._submit(resized, pool, pending)
+                        # 限制未写入的帧数，避免压缩结果堆积在内存中
+                        writer._drain(pending, workers * 2 - 1)
+        for writer, pending in zip(writers, pendings):
+            writer._drain(pending, 0)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+class BVWriter:
+    """
+    BV文件增量写入器
+
+    逐帧接收图像并立即写入文件，关闭时回填真实的帧数（以及可选的帧索引），
+    无需预先知道视频长度。
+
+    示例:
+        with BVWriter("output.bv", fps=10) as writer:
+            for frame in frames:
+                writer.write(frame)
+    """
+
+    def __init__(self, output_path: str, fps: int = 10, threshold: int = 128, index: bool = False,
+                 keyframe_interval: int = 0, dedup: bool = False, vfr: bool = False,
+                 width: Optional[int] = None, height: Optional[int] = None,
+                 callback: Optional[Callable[[ConversionStats], None]] = None):
+        """
+        初始化BV写入器
+
+        参数:
+            output_path: 输出BV文件路径
+            fps: 帧率，默认为10fps
+            threshold: 二值化阈值，默认为128
+            index: 是否在文件末尾附带帧索引
+            keyframe_interval: 关键帧间隔，大于0时启用帧间异或差分，差分更大的帧存为关键帧
+            dedup: 是否对重复帧去重，与更早的帧内容相同时只存储该帧的序号
+            vfr: 是否使用可变帧率，连续相同的帧合并为一帧并记录持续时长。
+                合并需要等到下一个不同的帧到来，因此最后一帧延迟一帧写入
+            width: 帧宽度，为None时取第一帧的宽度
+            height: 帧高度，为None时取第一帧的高度
+            callback: 每写入一帧后以统计信息调用，可用于显示进度
+        """
+        self.output_path = output_path
+        self.fps = fps
+        self.threshold = threshold
+        self.index = index
+        self.keyframe_interval = keyframe_interval
+        self.dedup = dedup
+        self.vfr = vfr
+        self.width = width
+        self.height = height
+        self.flags = _writer_flags(index, keyframe_interval, dedup, vfr)
+        self.frame_count = 0
+        self.callback = callback
+        # 二值化、编码和写入的累计统计，frames与frame_count相同
+        self.stats = ConversionStats(output_path=output_path)
+        self._index_entries = []
+        self._prev_binary = None
+        self._prepared_count = 0
+        # 帧内容哈希 -> 首次出现的帧序号
+        self._frame_ids = {}
+        # 可变帧率下尚未写入的[二值化帧, 持续时长]
+        self._run = None
+        # 逐帧复用的缓冲区，按帧尺寸在第一帧时分配
+        self._gray = None
+        self._residual = None
+        self._buffers = []
+
+        self._file = self._open()
+
+    def _open(self) -> BinaryIO:
+        """创建输出文件并写入占位文件头"""
+        try:
+            f = open(self.output_path, "wb")
+        except OSError as e:
+            raise FileError(f"无法创建输出文件: {str(e)}")
+        # 先写入占位文件头，关闭时回填
+        f.write(_pack_header(self.width or 0, self.height or 0, self.fps, self.flags, 0))
+        return f
+
+    def binarize(self, frame: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        将帧转换为二值化数组
+
+        参数:
+            frame: BGR彩色图像、灰度图像或布尔数组
+            out: 可选的(height, width)uint8输出数组，提供时结果直接写入其中
+
+        返回:
+            (height, width)的uint8数组，取值为0或1
+        """
+        if out is None:
+            out = np.empty(frame.shape[:2], dtype=np.uint8)
+        if frame.dtype == np.bool_:
+            np.copyto(out, frame)
+            return out
+        if frame.ndim == 3:
+            if self._gray is None or self._gray.shape != frame.shape[:2]:
+                self._gray = np.empty(frame.shape[:2], dtype=np.uint8)
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        # 比较结果直接写入输出数组，布尔值在uint8中即为0或1
+        np.greater_equal(frame, self.threshold, out=out.view(np.bool_))
+        return out
+
+    def _buffer(self) -> np.ndarray:
+        """取一个未被上一帧或待写入帧占用的二值化缓冲区"""
+        for buf in self._buffers:
+            if buf is not self._prev_binary and (self._run is None or buf is not self._run[0]):
+                return buf
+        buf = np.empty((self.height, self.width), dtype=np.uint8)
+        self._buffers.append(buf)
+        return buf
+
+    def write(self, frame: np.ndarray) -> None:
+        """
+        写入一帧
+
+        参数:
+            frame: BGR彩色图像、灰度图像或布尔数组
+        """
+        for data, frame_type, duration in self._push(frame):
+            self._commit(_encode_prepared(data, frame_type), duration)
+
+    def write_frames(self, frames: Iterable[np.ndarray], workers: int = 1) -> None:
+        """
+        依次写入多帧
+
+        参数:
+            frames: 帧的可迭代对象
+            workers: 压缩帧数据的进程数，大于1时在进程池中并行压缩，仍按原顺序写入
+        """
+        if workers <= 1:
+            for frame in frames:
+                self.write(frame)
+            return
+
+        # 二值化和差分在当前线程完成，耗时的游程编码与LZ77压缩交给进程池
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = collections.deque()
+            for frame in frames:
+                self._submit(frame, pool, pending)
+                # 限制未写入的帧数，避免压缩结果堆积在内存中
+                self._drain(pending, workers * 2 - 1)
+            self._drain(pending, 0)
+
+    def _submit(self, frame: np.ndarray, pool: ProcessPoolExecutor, pending: collections.deque) -> None:
+        """二值化一帧，将需要压缩的数据提交给进程池，按顺序放入pending"""
+        for data, frame_type, duration in self._push(frame):
+            if frame_type == BV_FRAME_REF:
+                # 引用帧无需压缩，保持顺序放入队列
+                future = Future()
+                future.set_result((data, None, frame_type))
+            else:
+                # 缓冲区会被后续帧复用，提交给子进程前需要复制
+                if frame_type == BV_FRAME_DELTA:
+                    data = (data[0].copy(), data[1].copy())
+                else:
+                    data = data.copy()
+                future = pool.submit(_encode_prepared, data, frame_type)
+            pending.append((future, duration))
+
+    def _drain(self, pending: collections.deque, limit: int) -> None:
+        """按顺序写入pending中的帧，直到剩余不超过limit帧"""
+        while len(pending) > limit:
+            future, duration = pending.popleft()
+            self._commit(future.result(), duration)
+
+    def _push(self, frame: np.ndarray) -> List[Tuple[Union[np.ndarray, bytes], int, int]]:
+        """
+        二值化一帧，返回可以编码写入的帧
+
+        返回:
+            [(待编码的数据, 帧类型, 持续时长)]，可变帧率下与上一帧相同时返回空列表
+        """
+        if self._file is None:
+            raise EncodeError("BV写入器已关闭")
+
+        if self.width is None or self.height is None:
+            self.height, self.width = frame.shape[:2]
+        elif frame.shape[:2] != (self.height, self.width):
+            raise EncodeError(f"帧尺寸不一致: {frame.shape[1]}x{frame.shape[0]}，应为{self.width}x{self.height}")
+        with self.stats.stage("threshold"):
+            binary = self.binarize(frame, out=self._buffer())
+
+        if not self.vfr:
+            return [self._prepare(binary, 1)]
+
+        # 与上一帧相同时只延长其持续时长
+        if self._run is not None and self._run[1] < BV_MAX_DURATION and np.array_equal(self._run[0], binary):
+            self._run[1] += 1
+            return []
+        ready = [] if self._run is None else [self._prepare(*self._run)]
+        self._run = [binary, 1]
+        return ready
+
+    def _prepare(self, binary: np.ndarray, duration: int) -> Tuple[Union[np.ndarray, bytes], int, int]:
+        """
+        确定帧类型
+
+        返回:
+            (待编码的数据, 帧类型, 持续时长)，差分帧返回(与前一帧的异或结果, 完整帧)，
+            编码时再决定存为差分帧还是关键帧；引用帧返回已打包的被引用帧序号
+        """
+        ref_id = None
+        if self.dedup:
+            digest = hashlib.blake2b(binary, digest_size=16).digest()
+            ref_id = self._frame_ids.setdefault(digest, self._prepared_count)
+            if ref_id == self._prepared_count:
+                ref_id = None
+
+        if ref_id is not None:
+            frame_type = BV_FRAME_REF
+            data = struct.pack(">I", ref_id)
+        elif self.keyframe_interval > 0 and self._prepared_count % self.keyframe_interval != 0:
+            # 非关键帧只编码与前一帧的差异，静止区域异或后全为0
+            frame_type = BV_FRAME_DELTA
+            if self._residual is None:
+                self._residual = np.empty_like(binary)
+            data = (np.bitwise_xor(binary, self._prev_binary, out=self._residual), binary)
+        else:
+            frame_type = BV_FRAME_KEY
+            data = binary
+        self._prev_binary = binary
+        self._prepared_count += 1
+        return data, frame_type, duration
+
+    def _commit(self, encoded: Tuple[bytes, Optional[tuple], int], duration: int) -> None:
+        """写入_encode_prepared的结果，更新统计并调用回调"""
+        compressed_frame, counts, frame_type = encoded
+        if counts is not None:
+            self.stats.add_encoded(counts)
+        with self.stats.stage("write"):
+            self._write_encoded(compressed_frame, frame_type, duration)
+        self.stats.frames = self.frame_count
+        if self.callback is not None:
+            self.callback(self.stats.finish())
+
+    def _write_encoded(self, compressed_frame: bytes, frame_type: int, duration: int = 1) -> None:
+        """写入已压缩的帧数据"""
+        if self._file is None:
+            raise EncodeError("BV写入器已关闭")
+
+        offset = _write_record(self._file, self.flags, compressed_frame, frame_type, duration)
+        self._file.flush()
+        if self.index:
+            self._index_entries.append((offset, len(compressed_frame)))
+        self.frame_count += 1
+
+    def _flush_run(self) -> None:
+        """写入可变帧率下最后一段相同的帧"""
+        if self._run is not None:
+            data, frame_type, duration = self._prepare(*self._run)
+            self._run = None
+            self._commit(_encode_prepared(data, frame_type), duration)
+
+    def close(self) -> None:
+        """写入帧索引并回填文件头，然后关闭文件"""
+        if self._file is None:
+            return
+        try:
+            self._flush_run()
+            if self.index:
+                _write_index(self._file, self._index_entries)
+            self._file.seek(0)
+            self._file.write(_pack_header(self.width or 0, self.height or 0, self.fps, self.flags, self.frame_count))
+        finally:
+            self._file.close()
+            self._file = None
+            self.stats.finish()
+
+    def __enter__(self) -> "BVWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+class BVFile:
+    """
+    以内存映射方式打开的BV文件
+
+    帧数据以memoryview切片的形式直接交给解码器，不经过额外复制；
+    映射由操作系统页缓存支撑，多个进程打开同一文件时共享物理内存。
+    通常通过Video.open创建。
+
+    示例:
+        with Video.open("input.bv") as bv:
+            for frame in bv.iter_frames():
+                ...
+    """
+
+    def __init__(self, input_path: str):
+        """
+        打开BV文件
+
+        参数:
+            input_path: 输入BV文件路径
+        """
+        if not os.path.exists(input_path):
+            raise FileError(f"输入文件不存在: {input_path}")
+
+        self.input_path = input_path
+        self._file = open(input_path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mmap)
+            self._reader = _BVReader(self._mmap, view=self._view)
+        except Error:
+            self.close()
+            raise
+        except Exception as e:
+            self.close()
+            raise DecodeError(f"打开BV文件失败: {str(e)}")
+
+        self.width = self._reader.width
+        self.height = self._reader.height
+        self.fps = self._reader.fps
+        self.frame_count = self._reader.frame_count
+
+    def __len__(self) -> int:
+        return self.frame_count
+
+    def read_frame(self, n: int, tick: bool = False) -> np.ndarray:
+        """
+        读取第n帧，参数含义与Video.read_frame相同
+
+        返回:
+            (height, width)的二值化数组，取值为0或1
+        """
+        try:
+            return self._reader.frame(self._reader.frame_at(n) if tick else n)
+        except (Error, ImportError):
+            raise
+        except Exception as e:
+            raise DecodeError(f"读取BV帧失败: {str(e)}")
+
+    def read_frames(self, frames: Iterable[int], tick: bool = False) -> List[np.ndarray]:
+        """读取多帧，返回按frames顺序排列的二值化数组列表"""
+        return [self.read_frame(n, tick=tick) for n in frames]
+
+    @property
+    def tick_count(self) -> int:
+        """按恒定帧率展开后的总帧数，非可变帧率文件等于frame_count"""
+        return self._reader.tick_count
+
+    def iter_frames(self, start: int = 0, stop: Optional[int] = None, step: int = 1,
+                    workers: int = 1, expand: bool = True) -> Iterator[np.ndarray]:
+        """
+        逐帧解码的生成器，参数含义与Video.iter_frames相同
+
+        返回的数组请勿原地修改，需要修改时先复制。
+        """
+        if step < 1:
+            raise DecodeError("帧间隔必须大于0")
+        try:
+            indices = _frame_indices(self._reader, start, stop, step, expand)
+        except (Error, ImportError):
+            raise
+        except Exception as e:
+            raise DecodeError(f"读取BV帧失败: {str(e)}")
+        return _iter_decoded(self._reader, indices, expand, workers)
+
+    def close(self) -> None:
+        """释放内存映射并关闭文件"""
+        view = getattr(self, "_view", None)
+        if view is not None:
+            view.release()
+            self._view = None
+        mapping = getattr(self, "_mmap", None)
+        if mapping is not None:
+            mapping.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "BVFile":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+def _frame_shape(width: int, height: int, packed: bool) -> Tuple[int, int]:
+    """单帧在数组中的形状，按位打包时每字节存放8个像素"""
+    return (height, (width + 7) // 8) if packed else (height, width)
+
+
+def _decode_range(reader: _BVReader, start: int, stop: int, expand: bool,
+                  stats: ConversionStats) -> Iterator[Tuple[int, np.ndarray]]:
+    """依次解码[start, stop)范围的帧，产生(帧序号, 帧)，解码耗时计入读取阶段"""
+    frames = iter(reader.ticks(range(start, stop)) if expand else reader.frames(range(start, stop)))
+    for i in range(start, stop):
+        with stats.stage("read"):
+            frame = next(frames)
+        stats.frames += 1
+        stats.pixels += frame.size
+        yield i, frame
+
+
+def _decode_range_into(input_path: str, shm_name: str, shape: Tuple[int, int, int], start: int, stop: int,
+                       packed: bool, expand: bool) -> ConversionStats:
+    """在子进程中解码[start, stop)范围的帧，直接写入共享内存中的数组，返回该范围的统计信息"""
+    from multiprocessing import shared_memory
+
+    stats = ConversionStats()
+    # 进程池的子进程与主进程共用resource_tracker，由主进程负责释放
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        with open(input_path, "rb") as f:
+            for i, frame in _decode_range(_BVReader(f), start, stop, expand, stats):
+                out[i] = np.packbits(frame, axis=-1) if packed else frame
+        del out
+    finally:
+        shm.close()
+    return stats
+
+
+def _wait_ranges(futures: List[Future], stats: ConversionStats,
+                 callback: Optional[Callable[[ConversionStats], None]]) -> None:
+    """按提交顺序等待各帧范围完成并累加统计信息，每完成一个范围调用callback，出错时取消尚未开始的范围"""
+    try:
+        for future in futures:
+            stats.add(future.result())
+            if callback is not None:
+                callback(stats.finish())
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+
+
+class _SharedArray:
+    """
+    以共享内存为缓冲区的数组，供np.asarray直接使用而不复制
+
+    返回的数组及其切片都以本对象为base，全部释放后才关闭共享内存。
+    不能直接用shm.buf构造数组：numpy只保留底层mmap的引用，共享内存关闭后数组会指向已释放的内存。
+    """
+
+    def __init__(self, shm: "shared_memory.SharedMemory", shape: Tuple[int, ...]):
+        self.__array_interface__ = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf).__array_interface__
+        weakref.finalize(self, shm.close)
+
+
+def _save_range(input_path: str, pattern: str, start: int, stop: int, expand: bool,
+                stats: Optional[ConversionStats] = None,
+                callback: Optional[Callable[[ConversionStats], None]] = None) -> ConversionStats:
+    """
+    解码[start, stop)范围的帧并保存为图像文件，多进程时在子进程中调用
+
+    参数:
+        stats: 累加到的统计信息，为None时新建
+        callback: 每保存一帧后以统计信息调用
+
+    返回:
+        统计信息，bytes_out为图像文件的总大小
+    """
+    if stats is None:
+        stats = ConversionStats()
+    with open(input_path, "rb") as f:
+        for i, frame in _decode_range(_BVReader(f), start, stop, expand, stats):
+            path = pattern.format(i)
+            with stats.stage("write"):
+                if not cv2.imwrite(path, frame * 255):
+                    raise FileError(f"无法写入图像文件: {path}")
+            stats.bytes_out += os.path.getsize(path)
+            if callback is not None:
+                callback(stats.finish())
+    return stats
+
+
+def _natural_key(path: str) -> List[Union[int, str]]:
+    """按数字大小排序文件名，frame_2排在frame_10之前"""
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", path)]
+
+
+def _load_binary(path: str, threshold: int) -> np.ndarray:
+    """在子进程中读取图像并二值化，返回布尔数组"""
+    gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise FileError(f"无法读取图像文件: {path}")
+    return gray >= threshold
+
+
+def _find_ffmpeg() -> Optional[str]:
+    """查找ffmpeg可执行文件，找不到时返回None"""
+    ffmpeg_path = os.path.join("depend", "ffmpeg.exe")
+    if os.path.exists(ffmpeg_path):
+        return ffmpeg_path
+    # 尝试在系统PATH中查找ffmpeg
+    return shutil.which("ffmpeg")
+
+
+class _FFmpegPipe:
+    """通过标准输入向ffmpeg传送原始灰度帧并编码为MP4"""
+
+    def __init__(self, ffmpeg_path: str, output_path: str, width: int, height: int, fps: int):
+        ffmpeg_cmd = [
+            ffmpeg_path,
+            "-loglevel", "error",
+            "-f", "rawvideo",
+            "-pix_fmt", "gray",
+            "-s", f"{width}x{height}",
+            "-framerate", str(fps),
+            "-i", "-",
+            "-c:v", "libx264",
+            "-pix_fmt", "yuv420p",
+            "-y",
+            output_path
+        ]
+        logger.debug("执行FFmpeg命令: %s", " ".join(ffmpeg_cmd))
+        # 错误输出写入临时文件而不是管道：管道写满后ffmpeg会阻塞，进而阻塞向标准输入写入帧
+        self.stderr = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE, stderr=self.stderr)
+
+    def write(self, frame: np.ndarray) -> None:
+        try:
+            self.process.stdin.write(memoryview(np.ascontiguousarray(frame)))
+        except BrokenPipeError:
+            # ffmpeg提前退出，之后的帧无法写入
+            code, stderr = self._finish()
+            raise EncodeError(f"FFmpeg提前退出({code}): {stderr}")
+
+    def _finish(self) -> Tuple[int, str]:
+        """关闭标准输入并等待ffmpeg退出，返回(退出码, 错误输出)"""
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        code = self.process.wait()
+        self.stderr.seek(0)
+        stderr = self.stderr.read().decode(errors="replace").strip()
+        self.stderr.close()
+        return code, stderr
+
+    def close(self) -> None:
+        if self.process.stdin.closed:
+            return
+        code, stderr = self._finish()
+        if code != 0:
+            logger.error("FFmpeg错误: %s", stderr)
+            raise EncodeError(f"FFmpeg转换失败({code}): {stderr}")
+
+
+class _CVVideoWriter:
+    """ffmpeg不可用时使用OpenCV编码MP4"""
+
+    def __init__(self, output_path: str, width: int, height: int, fps: int):
+        self.writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height), False)
+        if not self.writer.isOpened():
+            raise DecodeError("无法创建输出视频文件")
+
+    def write(self, frame: np.ndarray) -> None:
+        self.writer.write(frame)
+
+    def close(self) -> None:
+        self.writer.release()
+
 
 class Video:
     """视频处理类"""
     
     @staticmethod
-    def mp4_to_bv(input_path: str, output_path: str, threshold: int = 128, target_fps: int = 10) -> bool:
+    def mp4_to_bv(input_path: str, output_path: Union[str, List[Union[str, dict]]], threshold: int = 128, target_fps: int = 10,
+                  index: bool = False, keyframe_interval: int = 0, dedup: bool = False,
+                  vfr: bool = False, workers: int = 1,
+                  target_size: Optional[Tuple[Optional[int], Optional[int]]] = None,
+                  crop: Optional[Tuple[int, int, int, int]] = None, auto_crop: bool = False,
+                  start: float = 0, end: Optional[float] = None, by_frame: bool = False,
+                  max_bytes: Optional[int] = None,
+                  callback: Optional[Callable[[ConversionStats], None]] = None
+                  ) -> Union[ConversionStats, List[ConversionStats]]:
         """
         将MP4视频转换为高度压缩的BV格式
 
         参数:
-            input_path: 输入MP4视频路径
-            output_path: 输出BV文件路径
+            input_path: 输入视频路径，支持OpenCV能够打开的任何容器格式
+            output_path: 输出BV文件路径，也可以是多个输出的列表。列表元素为路径或字典，字典包含path
+                以及可选的target_size、threshold、target_fps、max_bytes，未指定的项取本函数的参数。
+                源视频只解码一次，帧分发给各输出的编码器
             threshold: 二值化阈值，默认为128
             target_fps: 目标帧率，默认为10fps
+            index: 是否在文件末尾附带帧索引，用于随机读取帧
+            keyframe_interval: 关键帧间隔，大于0时两个关键帧之间的帧只存储与前一帧的异或差分，
+                差分比完整帧更难压缩时（如切换镜头）该帧仍存为关键帧。默认为0即每帧独立编码。
+                差分帧的编码耗时约为两倍，间隔越大随机读取时需要回溯的帧越多
+            dedup: 是否对重复帧去重，与更早的帧内容相同时只存储该帧的序号，适合循环动画和界面录屏
+            vfr: 是否使用可变帧率，连续相同的帧合并为一帧并记录持续时长，适合录屏和幻灯片
+            workers: 压缩帧数据的进程数，默认为1。大于1时由后台线程解码视频、进程池并行压缩，
+                按原顺序写入文件。在Windows上使用时调用代码需要位于if __name__ == "__main__"之下
+            target_size: 输出尺寸(宽度, 高度)，其中一项为None时按比例计算，默认保持原尺寸。
+                缩放在二值化之前使用区域插值
+            crop: 裁剪区域(x, y, 宽度, 高度)，在缩放之前应用，多个输出共用
+            auto_crop: 是否自动裁剪到所有帧内容的边界框，需要预先读取一遍视频，不能与crop同时使用。
+                边界框按threshold参数计算，多个输出共用
+            start: 片段起点，默认为0。大于0时先定位到起点附近再开始读取
+            end: 片段终点（不含），为None时转换到视频结尾
+            by_frame: start和end是否为源视频的帧序号，默认为秒
+            max_bytes: 输出文件大小上限（字节）。先从样本帧估算大小，降低分辨率（最低为1/4），
+                仍超出时降低帧率；实际编码后仍超出则按超出比例缩小后重新编码。
+                多个输出时可在输出字典中分别指定
+            callback: 每写入一帧后以该输出的统计信息调用，可用于显示进度。
+                超出max_bytes重新编码时帧数会从0重新开始
             
         返回:
-            是否成功
+            转换的统计信息，真值为True；output_path为列表时返回与之对应的统计信息列表。
+            读取阶段包括解码源视频和缩放，多个输出时源视频的解码耗时计入每个输出
         """
         if not os.path.exists(input_path):
             raise FileError(f"输入文件不存在: {input_path}")
-            
-        if not input_path.lower().endswith(".mp4"):
-            raise EncodeError("输入文件必须是MP4格式")
 
-        try:
-            # 打开视频文件
-            cap = cv2.VideoCapture(input_path)
-            if not cap.isOpened():
-                raise EncodeError("无法打开视频文件")
+        specs = _rendition_specs(output_path, threshold, target_fps, target_size, max_bytes)
+        options = {"index": index, "keyframe_interval": keyframe_interval, "dedup": dedup, "vfr": vfr}
 
-            # 获取视频信息
+        try:
+            # 打开视频文件并获取视频信息
+            cap = _open_capture(input_path)
             width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
             height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            fps = cap.get(cv2.CAP_PROP_FPS)
             total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            source_fps = cap.get(cv2.CAP_PROP_FPS)
 
-            # 计算帧间隔以匹配目标帧率
-            frame_interval = int(fps / target_fps)
-            if frame_interval < 1:
-                frame_interval = 1
-
-            with open(output_path, "wb") as f:
-                # 写入视频信息头
-                f.write(
-                    struct.pack(
-                        ">HHII", width, height, target_fps, total_frames // frame_interval
-                    )
-                )
-
-                frame_count = 0
-                processed_frames = 0
-                
-                while True:
-                    ret, frame = cap.read()
-                    if not ret:
-                        break
+            if by_frame:
+                if source_fps <= 0:
+                    raise EncodeError("无法获取视频帧率，不能按帧序号截取片段")
+                start = start / source_fps
+                end = None if end is None else end / source_fps
+            if start < 0 or (end is not None and end <= start):
+                raise EncodeError(f"片段范围无效: {start} - {end}")
 
-                    # 按目标帧率采样
-                    if frame_count % frame_interval == 0:
-                        # 转换为灰度图
-                        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                        # 二值化处理
-                        binary = (gray >= threshold).astype(np.uint8)
-                        # 压缩帧数据
-                        compressed_frame = encode_run_length(binary.flatten())
-                        # 使用zlib进一步压缩
-                        compressed_frame = compress_data(compressed_frame)
-                        # 写入帧大小和帧数据
-                        f.write(struct.pack(">I", len(compressed_frame)))
-                        f.write(compressed_frame)
-                        processed_frames += 1
-
-                    frame_count += 1
-
-            cap.release()
-            
-            # 打印转换信息
-            input_size, output_size, compression_ratio = get_file_size_info(input_path, output_path)
-            print(f"转换成功: {input_path} -> {output_path}")
-            print(f"原始大小: {input_size} 字节")
-            print(f"压缩后大小: {output_size} 字节")
-            print(f"压缩率: {compression_ratio:.2f}%")
-            print(f"处理帧数: {processed_frames}/{total_frames}")
-            
-            return True
+            try:
+                if auto_crop:
+                    if crop is not None:
+                        raise EncodeError("crop与auto_crop不能同时使用")
+                    # 预先读取一遍采样帧计算内容边界框
+                    max_fps = max(spec["target_fps"] for spec in specs)
+                    crop = _content_bbox(_resample_frames(cap, max_fps, start, end), threshold)
 
-        except Error:
+                budgeted = [spec for spec in specs if spec["max_bytes"] is not None]
+                if budgeted:
+                    clip_end = end
+                    if clip_end is None:
+                        if total_frames <= 0 or source_fps <= 0:
+                            raise EncodeError("无法获取视频时长，不能使用max_bytes")
+                        clip_end = total_frames / source_fps
+                    # 在片段内抽取样本帧估算大小，确定各输出的缩放比例和帧率
+                    samples = _sample_frames(cap, start, clip_end, BV_RATE_SAMPLE_FRAMES, crop)
+                    for spec in budgeted:
+                        _fit_rendition(spec, samples, _plan_transform(width, height, crop, spec["target_size"]),
+                                       clip_end - start, _writer_flags(**options))
+            finally:
+                cap.release()
+
+            writers = _encode_renditions(input_path, specs, crop, start, end, (width, height), options, workers,
+                                         callback)
+
+            # 实际大小超出预算时按超出比例缩小，只重新编码超出的输出
+            for attempt in range(1, RATE_VERIFY_PASSES + 1):
+                over = [i for i, spec in enumerate(specs)
+                        if spec["max_bytes"] is not None and os.path.getsize(writers[i].output_path) > spec["max_bytes"]]
+                if not over:
+                    break
+                for i in over:
+                    size = os.path.getsize(writers[i].output_path)
+                    if attempt == RATE_VERIFY_PASSES or not _shrink_rendition(specs[i], specs[i]["max_bytes"] / size * 0.95):
+                        raise EncodeError(f"无法压缩到{specs[i]['max_bytes']}字节以内，当前为{size}字节: {writers[i].output_path}")
+                redone = _encode_renditions(input_path, [specs[i] for i in over], crop, start, end,
+                                            (width, height), options, workers, callback)
+                for i, writer in zip(over, redone):
+                    writers[i] = writer
+
+            results = []
+            for writer in writers:
+                stats = writer.stats
+                stats.input_path = input_path
+                stats.finish()
+                logger.info("转换成功: %s -> %s, 原始大小%d字节, 压缩后%d字节, 压缩率%.2f%%, 处理帧数%d/%d",
+                            input_path, writer.output_path, stats.bytes_in, stats.bytes_out,
+                            stats.compression_ratio, writer.frame_count, total_frames)
+                results.append(stats)
+
+            return results if isinstance(output_path, list) else results[0]
+
+        except (Error, ImportError):
             raise
         except Exception as e:
             raise EncodeError(f"MP4转BV失败: {str(e)}")
 
     @staticmethod
-    def bv_to_mp4(input_path: str, output_path: str, fps: Optional[int] = None) -> bool:
+    def capture_to_bv(source: Union[int, str, "cv2.VideoCapture", Iterable[np.ndarray]], output_path: str,
+                      threshold: int = 128, target_fps: int = 10, max_latency: Optional[float] = None,
+                      duration: Optional[float] = None, max_frames: Optional[int] = None,
+                      stop_event: Optional[threading.Event] = None,
+                      target_size: Optional[Tuple[Optional[int], Optional[int]]] = None,
+                      index: bool = False, keyframe_interval: int = 0, dedup: bool = False,
+                      vfr: bool = False, live: Optional[bool] = None,
+                      callback: Optional[Callable[[ConversionStats], None]] = None) -> ConversionStats:
+        """
+        实时采集视频并编码为BV格式
+
+        实时来源（设备、URL、管道等）: 采集线程持续读取采集源，只保留最新一帧；当前线程按目标帧率取帧，
+        每帧编码后立即写入文件。编码落后于帧时刻超过延迟预算时跳过落后的帧时刻，
+        vfr=True时跳过期间延长上一帧的持续时长，文件时间轴与实际时间保持一致。
+
+        有限的来源（本地文件、能得到总帧数的来源、可迭代对象）读得比实时快，不能按到达时间取帧:
+        VideoCapture按CAP_PROP_POS_MSEC时间戳重采样到目标帧率，可迭代对象的每一项编码为一帧，
+        读取等待编码完成，不丢帧。
+
+        参数:
+            source: 设备编号、文件路径或URL（以及OpenCV支持的管道、图像序列等任何来源）、
+                已打开的cv2.VideoCapture，或产生帧的可迭代对象（例如用于测试的生成器）
+            output_path: 输出BV文件路径
+            threshold: 二值化阈值，默认为128
+            target_fps: 目标帧率，默认为10fps
+            max_latency: 延迟预算（秒），默认为两个帧间隔
+            duration: 最长采集时间（秒），为None时不限制
+            max_frames: 最多编码的帧数，为None时不限制
+            stop_event: 设置后停止采集的threading.Event
+            target_size: 输出尺寸(宽度, 高度)，其中一项为None时按比例计算
+            index: 是否在文件末尾附带帧索引
+            keyframe_interval: 关键帧间隔，与mp4_to_bv相同
+            dedup: 是否对重复帧去重
+            vfr: 是否使用可变帧率
+            live: 是否按实时来源处理，为None时自动判断
+            callback: 每写入一帧后以统计信息调用
+
+        返回:
+            转换的统计信息，另有captured为采集到的帧数，dropped为采集到但被新帧覆盖、没有编码的帧数，
+            skipped为跳过的帧时刻数，live为是否按实时来源处理，fps为实际达到的帧率。
+            frames为编码的帧数（不含跳过帧时刻时重复写入的帧），elapsed为采集用时（秒），
+            读取阶段为等待采集帧和缩放的耗时。也可以用stats["fps"]的方式取值。
+            有限的来源dropped和skipped为0，duration按源时间计
+        """
+        if max_latency is None:
+            max_latency = 2.0 / target_fps
+
+        cap, owned, live = _capture_source(source, live)
+        try:
+            with BVWriter(output_path, fps=target_fps, threshold=threshold, index=index,
+                          keyframe_interval=keyframe_interval, dedup=dedup, vfr=vfr,
+                          callback=callback) as writer:
+                stats = writer.stats
+                started = time.monotonic()
+                if live:
+                    frames = iter(source) if cap is None else _read_capture(cap)
+                    encoded, captured, dropped, skipped = _capture_live(
+                        frames, writer, target_fps, target_size, max_latency, duration, max_frames, stop_event)
+                else:
+                    encoded, captured = _capture_finite(
+                        cap, source if cap is None else None, writer, target_fps, target_size,
+                        duration, max_frames, stop_event)
+                    dropped = skipped = 0
+                # 关闭时写入的剩余帧不计入采集用时
+                elapsed = time.monotonic() - started
+        except (Error, ImportError):
+            raise
+        except Exception as e:
+            raise EncodeError(f"实时编码失败: {str(e)}")
+        finally:
+            if owned is not None:
+                owned.release()
+
+        stats.finish()
+        stats.frames = encoded
+        stats.elapsed = elapsed
+        stats.captured = captured
+        stats.dropped = dropped
+        stats.skipped = skipped
+        stats.live = live
+        stats.fps = encoded / elapsed if elapsed > 0 else 0.0
+        logger.info("实时编码完成: %s, 采集%d帧, 编码%d帧, 丢弃%d帧, 跳过%d个帧时刻, %.2ffps",
+                    output_path, captured, encoded, dropped, skipped, stats.fps)
+        return stats
+
+    @staticmethod
+    def from_images(images: Union[str, List[str]], output_path: str, fps: int = 10, threshold: int = 128,
+                    index: bool = False, keyframe_interval: int = 0, dedup: bool = False, vfr: bool = False,
+                    workers: int = 1,
+                    callback: Optional[Callable[[ConversionStats], None]] = None) -> ConversionStats:
+        """
+        将图像序列转换为BV格式，不经过视频编解码
+
+        参数:
+            images: glob模式（如"frames/*.png"）或图像路径列表。glob匹配的文件按文件名中的数字大小排序，
+                列表按给定顺序
+            output_path: 输出BV文件路径
+            fps: 帧率，默认为10fps
+            threshold: 二值化阈值，默认为128
+            index: 是否在文件末尾附带帧索引
+            keyframe_interval: 关键帧间隔，与mp4_to_bv相同
+            dedup: 是否对重复帧去重
+            vfr: 是否使用可变帧率
+            workers: 进程数，大于1时在同一个进程池中并行读取、二值化和压缩，按原顺序写入文件
+            callback: 每写入一帧后以统计信息调用
+
+        返回:
+            转换的统计信息，真值为True。读取阶段包括读取图像和二值化，多进程时为等待读取结果的耗时
+        """
+        if isinstance(images, str):
+            paths = sorted(glob.glob(images), key=_natural_key)
+        else:
+            paths = list(images)
+        if not paths:
+            raise FileError(f"没有找到图像文件: {images}")
+
+        try:
+            with BVWriter(output_path, fps=fps, threshold=threshold, index=index,
+                          keyframe_interval=keyframe_interval, dedup=dedup, vfr=vfr,
+                          callback=callback) as writer:
+                stats = writer.stats
+                if workers <= 1:
+                    for path in paths:
+                        with stats.stage("read"):
+                            frame = _load_binary(path, threshold)
+                        writer.write(frame)
+                else:
+                    with ProcessPoolExecutor(max_workers=workers) as pool:
+                        loading = collections.deque()
+                        pending = collections.deque()
+                        remaining = iter(paths)
+                        while True:
+                            # 读取任务提前提交，数量有限，避免读取结果堆积在内存中
+                            for path in remaining:
+                                loading.append(pool.submit(_load_binary, path, threshold))
+                                if len(loading) >= workers * 2:
+                                    break
+                            if not loading:
+                                break
+                            with stats.stage("read"):
+                                frame = loading.popleft().result()
+                            writer._submit(frame, pool, pending)
+                            writer._drain(pending, workers * 2 - 1)
+                        writer._drain(pending, 0)
+
+            logger.info("转换成功: %d张图像 -> %s, 压缩后%d字节", len(paths), output_path, stats.bytes_out)
+            return stats
+
+        except (Error, ImportError):
+            raise
+        except Exception as e:
+            raise EncodeError(f"图像序列转BV失败: {str(e)}")
+
+    @staticmethod
+    def to_images(input_path: str, pattern: str = "frame_{:05d}.png", workers: int = 1,
+                  expand: bool = True,
+                  callback: Optional[Callable[[ConversionStats], None]] = None) -> List[str]:
+        """
+        将BV文件的每一帧保存为图像文件
+
+        参数:
+            input_path: 输入BV文件路径
+            pattern: 输出文件名模板，用帧序号格式化，扩展名决定图像格式
+            workers: 进程数，大于1时按帧范围分给进程池并行解码和保存
+            expand: 可变帧率的文件是否按持续时长展开为恒定帧率
+            callback: 以累计的统计信息调用，单进程时每保存一帧后调用，多进程时每完成一个帧范围后调用。
+                读取阶段为解码耗时，写入阶段为编码和保存图像的耗时，bytes_out为图像文件的总大小
+
+        返回:
+            按帧顺序排列的文件路径列表
+        """
+        if not os.path.exists(input_path):
+            raise FileError(f"输入文件不存在: {input_path}")
+
+        try:
+            directory = os.path.dirname(pattern.format(0))
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            with open(input_path, "rb") as f:
+                reader = _BVReader(f)
+                total = reader.tick_count if expand else reader.frame_count
+            stats = ConversionStats(input_path)
+            if workers <= 1 or total <= 1:
+                _save_range(input_path, pattern, 0, total, expand, stats, callback)
+            else:
+                # 每个进程分得连续的帧范围，差分帧只需在范围开头回溯一次关键帧
+                chunk = max(1, -(-total // (workers * 4)))
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    futures = [pool.submit(_save_range, input_path, pattern, start, min(start + chunk, total), expand)
+                               for start in range(0, total, chunk)]
+                    _wait_ranges(futures, stats, callback)
+
+            stats.finish()
+            logger.info("转换成功: %s -> %d张图像, 共%d字节, 用时%.3f秒", input_path, stats.frames,
+                        stats.bytes_out, stats.elapsed)
+            return [pattern.format(i) for i in range(total)]
+
+        except (Error, ImportError):
+            raise
+        except Exception as e:
+            raise DecodeError(f"BV转图像序列失败: {str(e)}")
+
+    @staticmethod
+    def bv_to_mp4(input_path: str, output_path: str, fps: Optional[int] = None, workers: int = 1,
+                  callback: Optional[Callable[[ConversionStats], None]] = None) -> ConversionStats:
         """
         将BV格式视频转换回MP4格式
+
+        解码后的帧直接传给编码器：系统中有ffmpeg时通过标准输入传送原始帧，
+        否则使用OpenCV的VideoWriter。
         
         参数:
             input_path: 输入BV文件路径
             output_path: 输出MP4文件路径
             fps: 输出视频的帧率，如果为None则使用原始帧率
+            workers: 解码进程数，大于1时在进程池中提前解码后续帧
+            callback: 每输出一帧后以统计信息调用
             
         返回:
-            是否成功
+            转换的统计信息，真值为True。读取阶段包括解压和游程解码，写入阶段为视频编码的耗时
         """
         if not os.path.exists(input_path):
             raise FileError(f"输入文件不存在: {input_path}")
@@ -137,76 +2055,224 @@ class Video:
             raise DecodeError("输入文件必须是BV格式")
 
         try:
+            stats = ConversionStats(input_path, output_path)
             with open(input_path, "rb") as f:
                 # 读取视频信息头
-                width, height, target_fps, total_frames = struct.unpack(">HHII", f.read(12))
+                reader = _BVReader(f)
+                target_fps = reader.fps
                 
                 # 如果未指定帧率，使用原始帧率
                 if fps is None:
                     fps = target_fps
 
-                # 创建临时目录存放帧图像
-                temp_dir = "temp_frames"
-                if not os.path.exists(temp_dir):
-                    os.makedirs(temp_dir)
-
-                # 读取并解码每一帧，保存为PNG图像
-                for i in range(total_frames):
-                    # 读取帧大小
-                    frame_size = struct.unpack(">I", f.read(4))[0]
-                    # 读取压缩的帧数据
-                    compressed_frame = f.read(frame_size)
-                    # 解压数据
-                    decompressed_frame = decompress_data(compressed_frame)
-                    # 解码帧数据
-                    frame_data = decode_run_length(decompressed_frame, width * height)
-                    # 重塑为图像
-                    frame = frame_data.reshape(height, width) * 255
-                    # 保存为PNG图像
-                    frame_path = os.path.join(temp_dir, f"frame_{i:06d}.png")
-                    cv2.imwrite(frame_path, frame)
-
-                # 使用ffmpeg将PNG图像序列转换为MP4
-                ffmpeg_path = os.path.join("depend", "ffmpeg.exe")
-                if not os.path.exists(ffmpeg_path):
-                    # 尝试在系统PATH中查找ffmpeg
-                    ffmpeg_path = "ffmpeg"
-                
-                ffmpeg_cmd = [
-                    ffmpeg_path,
-                    "-framerate", str(fps),
-                    "-i", os.path.join(temp_dir, "frame_%06d.png"),
-                    "-c:v", "libx264",
-                    "-pix_fmt", "yuv420p",
-                    "-y",
-                    output_path
-                ]
-                
-                print(f"执行FFmpeg命令: {' '.join(ffmpeg_cmd)}")
-                
-                # 使用subprocess代替os.system，提供更好的错误处理
-                result = subprocess.run(ffmpeg_cmd, capture_output=True, text=True)
-                
-                if result.returncode != 0:
-                    print(f"FFmpeg错误: {result.stderr}")
-                    raise DecodeError(f"FFmpeg转换失败: {result.stderr}")
+                # 解码后的帧直接送入编码器，不经过临时图像文件
+                ffmpeg_path = _find_ffmpeg()
+                if ffmpeg_path is not None:
+                    sink = _FFmpegPipe(ffmpeg_path, output_path, reader.width, reader.height, fps)
+                else:
+                    sink = _CVVideoWriter(output_path, reader.width, reader.height, fps)
 
-                # 清理临时文件
-                for i in range(total_frames):
-                    frame_path = os.path.join(temp_dir, f"frame_{i:06d}.png")
-                    if os.path.exists(frame_path):
-                        os.remove(frame_path)
-                if os.path.exists(temp_dir):
-                    os.rmdir(temp_dir)
+                try:
+                    # 复用同一块缓冲区将0/1缩放为0/255
+                    scaled = np.empty((reader.height, reader.width), dtype=np.uint8)
+                    # 可变帧率的帧按持续时长重复输出
+                    frames = iter(reader.ticks(range(reader.tick_count), workers=workers))
+                    while True:
+                        with stats.stage("read"):
+                            frame = next(frames, None)
+                        if frame is None:
+                            break
+                        with stats.stage("write"):
+                            sink.write(np.multiply(frame, 255, out=scaled))
+                        stats.frames += 1
+                        if callback is not None:
+                            callback(stats.finish())
+                finally:
+                    with stats.stage("write"):
+                        sink.close()
 
-            print(f"转换成功: {input_path} -> {output_path}")
-            return True
+            stats.pixels = stats.frames * reader.width * reader.height
+            stats.finish()
+            logger.info("转换成功: %s -> %s, %d帧, 用时%.3f秒", input_path, output_path, stats.frames, stats.elapsed)
+            return stats
 
-        except Error:
+        except (Error, ImportError):
             raise
         except Exception as e:
             raise DecodeError(f"BV转MP4失败: {str(e)}")
 
+    @staticmethod
+    def read_frame(input_path: str, n: int, tick: bool = False) -> np.ndarray:
+        """
+        读取BV文件中的单独一帧
+
+        带帧索引的文件可直接定位到目标帧，耗时与视频长度无关；
+        无索引的文件则沿帧链跳过前面的帧。
+
+        可变帧率的文件中一条帧记录可能持续多个帧时刻，默认n按存储的帧记录计，
+        与frame_count对应；tick为True时n按恒定帧率展开后的帧时刻计，与tick_count
+        和iter_frames的默认输出对应，首次按帧时刻读取时需遍历全部帧记录的持续时长。
+
+        参数:
+            input_path: 输入BV文件路径
+            n: 帧序号，从0开始
+            tick: n是否按展开后的帧时刻计
+
+        返回:
+            (height, width)的二值化数组，取值为0或1
+        """
+        return Video.read_frames(input_path, [n], tick=tick)[0]
+
+    @staticmethod
+    def read_frames(input_path: str, frames: Iterable[int], tick: bool = False) -> List[np.ndarray]:
+        """
+        读取BV文件中的多帧
+
+        参数:
+            input_path: 输入BV文件路径
+            frames: 帧序号序列，例如range(0, 100, 10)
+            tick: 帧序号是否按展开后的帧时刻计，见read_frame
+
+        返回:
+            按frames顺序排列的二值化数组列表
+        """
+        if not os.path.exists(input_path):
+            raise FileError(f"输入文件不存在: {input_path}")
+
+        try:
+            with open(input_path, "rb") as f:
+                reader = _BVReader(f)
+                result = [reader.frame(reader.frame_at(n) if tick else n) for n in frames]
+
+            return result
+
+        except (Error, ImportError):
+            raise
+        except Exception as e:
+            raise DecodeError(f"读取BV帧失败: {str(e)}")
+
+    @staticmethod
+    def open(input_path: str) -> BVFile:
+        """
+        以内存映射方式打开BV文件，适合反复随机读取的大文件
+
+        参数:
+            input_path: 输入BV文件路径
+
+        返回:
+            BVFile对象，用完后调用close或使用with语句
+        """
+        return BVFile(input_path)
+
+    @staticmethod
+    def to_array(input_path: str, workers: int = 1, packed: bool = False, expand: bool = True,
+                 callback: Optional[Callable[[ConversionStats], None]] = None) -> np.ndarray:
+        """
+        将整个BV文件解码为一个(T, H, W)数组
+
+        多进程解码时各进程把结果直接写入共享内存中预先分配的数组，
+        不经过pickle传回，返回的数组也直接使用这块共享内存，不再复制。
+
+        参数:
+            input_path: 输入BV文件路径
+            workers: 解码进程数，大于1时按帧范围分给进程池并行解码
+            packed: 是否按位打包，为True时返回(T, H, ceil(W/8))的数组，与np.packbits(axis=-1)一致
+            expand: 可变帧率的文件是否按持续时长展开为恒定帧率
+            callback: 以累计的统计信息调用，单进程时每解码一帧后调用，多进程时每完成一个帧范围后调用。
+                读取阶段为解码耗时，多进程时为各进程耗时之和
+
+        返回:
+            uint8数组，未打包时取值为0或1，可用.view(bool)得到布尔数组
+        """
+        if not os.path.exists(input_path):
+            raise FileError(f"输入文件不存在: {input_path}")
+
+        try:
+            with open(input_path, "rb") as f:
+                reader = _BVReader(f)
+                total = reader.tick_count if expand else reader.frame_count
+                shape = (total,) + _frame_shape(reader.width, reader.height, packed)
+                stats = ConversionStats(input_path)
+
+                if workers <= 1 or total <= 1:
+                    result = np.empty(shape, dtype=np.uint8)
+                    for i, frame in _decode_range(reader, 0, total, expand, stats):
+                        result[i] = np.packbits(frame, axis=-1) if packed else frame
+                        if callback is not None:
+                            callback(stats.finish())
+                    return result
+
+            from multiprocessing import shared_memory
+
+            shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape))))
+            try:
+                # 每个进程分得连续的帧范围，差分帧只需在范围开头回溯一次关键帧
+                chunk = max(1, -(-total // (workers * 4)))
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    futures = [
+                        pool.submit(_decode_range_into, input_path, shm.name, shape, start,
+                                    min(start + chunk, total), packed, expand)
+                        for start in range(0, total, chunk)
+                    ]
+                    _wait_ranges(futures, stats, callback)
+            except BaseException:
+                shm.close()
+                raise
+            finally:
+                # 名称用完即删除，已建立的映射在关闭前仍然有效
+                shm.unlink()
+            return np.asarray(_SharedArray(shm, shape))
+
+        except (Error, ImportError):
+            raise
+        except Exception as e:
+            raise DecodeError(f"BV转数组失败: {str(e)}")
+
+    @staticmethod
+    def iter_frames(input_path: str, start: int = 0, stop: Optional[int] = None, step: int = 1,
+                    prefetch: bool = False, workers: int = 1, expand: bool = True) -> Iterator[np.ndarray]:
+        """
+        逐帧读取BV文件的生成器
+
+        每次只解码一帧，内存占用与视频长度无关。返回的数组可能被后续
+        差分帧的解码引用，请勿原地修改，需要修改时先复制。
+
+        参数:
+            input_path: 输入BV文件路径
+            start: 起始帧序号
+            stop: 结束帧序号（不包含），为None时读到最后一帧
+            step: 帧间隔
+            prefetch: 是否在后台线程中提前解码下一帧
+            workers: 解码进程数，大于1时在进程池中提前解码后续帧
+            expand: 可变帧率的文件是否按持续时长展开为恒定帧率，
+                为True时start/stop/step均以展开后的帧计
+
+        返回:
+            依次产生(height, width)的二值化数组
+        """
+        if not os.path.exists(input_path):
+            raise FileError(f"输入文件不存在: {input_path}")
+
+        if step < 1:
+            raise DecodeError("帧间隔必须大于0")
+
+        # 在调用时打开文件并读取文件头，错误在调用处抛出，而不是推迟到第一次next()
+        try:
+            f = open(input_path, "rb")
+        except OSError as e:
+            raise FileError(f"无法打开输入文件: {str(e)}")
+        try:
+            reader = _BVReader(f)
+            indices = _frame_indices(reader, start, stop, step, expand)
+        except Exception as e:
+            f.close()
+            if isinstance(e, (Error, ImportError)):
+                raise
+            raise DecodeError(f"读取BV文件失败: {str(e)}")
+
+        frames = _iter_decoded(reader, indices, expand, workers, f)
+        return _prefetch(frames) if prefetch else frames
+
 
 def main():
     """主函数，用于测试"""
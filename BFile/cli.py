@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+BFile (Binary File) 命令行工具
+
+用法:
+    bfile inspect assets/ other.bv
+    bfile inspect --deep --json assets/ > report.jsonl
+    python -m BFile inspect assets/
+"""
+
+import sys
+import json
+import argparse
+from typing import Optional, List
+
+from .core import Error
+from .info import inspect, iter_files
+
+
+def _format_summary(info: dict) -> str:
+    """一个文件的单行摘要"""
+    text = f"{info['path']}  {info['format']} {info['width']}x{info['height']}"
+    if info["format"] == "BV":
+        flags = ",".join(info["flags"]) or "-"
+        types = " ".join(f"{name}={count}" for name, count in info["frame_types"].items() if count)
+        text += (f" {info['fps']}fps {info['frame_count']}帧 ({info['tick_count']}帧时刻) [{flags}] {types}"
+                 f" 帧大小{info['frame_size_min']}/{info['frame_size_mean']:.1f}/{info['frame_size_max']}")
+        if info["trailing_bytes"]:
+            text += f" 末尾多余{info['trailing_bytes']}字节"
+    text += f" {info['file_size']}字节"
+    if info["bits_per_pixel"] is not None:
+        text += f" {info['bits_per_pixel']:.4f}位/像素"
+    if "decode_seconds" in info:
+        text += f" 解码{info['decode_seconds'] * 1000:.1f}ms"
+    return text
+
+
+def _format_histogram(histogram: dict) -> str:
+    """游程长度分布，每个桶一行"""
+    total = sum(histogram.values()) or 1
+    return "\n".join(f"    {bucket:>13s} {count:10d} {count / total:7.2%}" for bucket, count in histogram.items())
+
+
+def _inspect_command(args: argparse.Namespace) -> int:
+    """检查文件，单个文件出错时报告后继续"""
+    failed = 0
+    for path in iter_files(args.paths):
+        try:
+            info = inspect(path, deep=args.deep)
+        except Error as e:
+            failed += 1
+            if args.json:
+                print(json.dumps({"path": path, "error": str(e)}, ensure_ascii=False))
+            else:
+                print(f"{path}  错误: {e}", file=sys.stderr)
+            continue
+
+        if args.json:
+            if not args.frames:
+                info.pop("frame_sizes", None)
+                info.pop("frame_durations", None)
+            print(json.dumps(info, ensure_ascii=False))
+            continue
+        print(_format_summary(info))
+        if args.frames and "frame_sizes" in info:
+            durations = info.get("frame_durations")
+            for n, size in enumerate(info["frame_sizes"]):
+                print(f"    #{n} {size}字节" + (f" x{durations[n]}" if durations else ""))
+        if "run_histogram" in info:
+            print(_format_histogram(info["run_histogram"]))
+    return 1 if failed else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="bfile", description="BFile命令行工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    inspect_parser = subparsers.add_parser("inspect", help="检查BI/BV文件的结构，默认只读取文件头和帧大小")
+    inspect_parser.add_argument("paths", nargs="+", help="文件或目录，目录递归查找.bi和.bv文件")
+    inspect_parser.add_argument("--deep", action="store_true", help="解码全部帧，统计解码耗时和游程长度分布")
+    inspect_parser.add_argument("--json", action="store_true", help="每个文件输出一行JSON")
+    inspect_parser.add_argument("--frames", action="store_true", help="输出每帧的帧数据大小")
+    inspect_parser.set_defaults(handler=_inspect_command)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
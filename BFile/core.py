@@ -7,10 +7,28 @@ BFile (Binary File) 核心模块
 """
 
 import os
+import math
+import time
+import logging
+import importlib
+import contextlib
 import numpy as np
 import struct
 import base64
-from typing import Tuple, List, Optional, Union, BinaryIO
+from typing import Tuple, List, Optional, Union, BinaryIO, Callable, Iterator, Any
+
+
+# 库内所有日志都通过该记录器输出，默认不显示，可用set_verbosity打开
+logger = logging.getLogger("BFile")
+logger.addHandler(logging.NullHandler())
+
+
+# 码率控制: 估算压缩率时抽取的样本块数量和每块大小（字节）
+RATE_SAMPLE_CHUNKS = 4
+RATE_SAMPLE_CHUNK_SIZE = 1024
+# 码率控制: 二分查找缩放比例的次数，以及实际编码超出预算后重新缩小的次数
+RATE_SEARCH_PASSES = 6
+RATE_VERIFY_PASSES = 3
 
 
 class Error(Exception):
@@ -33,6 +51,156 @@ class FileError(Error):
     pass
 
 
+class _LazyModule:
+    """
+    第一次访问属性时才导入的模块
+
+    用于OpenCV等只有部分功能需要的较重依赖，避免import BFile时就加载；
+    未安装时在使用到的地方抛出带有安装方式的ImportError。
+    """
+
+    def __init__(self, name: str, install: str):
+        """
+        参数:
+            name: 模块名，如"cv2"
+            install: 未安装时提示的安装命令
+        """
+        self._name = name
+        self._install = install
+        self._module = None
+
+    def __getattr__(self, attr: str) -> Any:
+        if self._module is None:
+            try:
+                self._module = importlib.import_module(self._name)
+            except ImportError as e:
+                raise ImportError(f"该功能需要{self._name}，请安装: {self._install}") from e
+        return getattr(self._module, attr)
+
+
+def set_verbosity(level: Union[int, str] = logging.INFO) -> None:
+    """
+    设置BFile日志的详细程度
+
+    记录器没有输出目标时添加一个输出到标准错误的处理器。INFO级别输出转换结果，
+    DEBUG级别另外输出ffmpeg命令等细节，WARNING级别只输出问题。
+
+    参数:
+        level: 日志级别，如logging.DEBUG或"INFO"
+    """
+    logger.setLevel(level)
+    if not any(not isinstance(handler, logging.NullHandler) for handler in logger.handlers):
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(name)s: %(message)s"))
+        logger.addHandler(handler)
+
+
+class ConversionStats:
+    """
+    一次转换的统计信息
+
+    各阶段耗时为累计值。编码时依次为读取（含解码源视频、灰度转换和缩放）、二值化、
+    游程编码、LZ77压缩和写入；解码时rle和lz77为游程解码和解压的耗时，不能单独统计时
+    （如视频逐帧解码）计入读取。多进程压缩时rle和lz77
+    为各进程耗时之和，可能大于总用时。对象的真值恒为True，兼容此前返回True的调用方式；
+    也可以像字典一样用属性名取值。
+
+    属性:
+        input_path: 输入路径
+        output_path: 输出路径
+        frames: 写入的帧数
+        bytes_in: 输入文件大小（字节）
+        bytes_out: 输出文件大小（字节）
+        pixels: 二值化的像素总数
+        runs: 游程编码产生的游程组数（每组最长15）
+        matches: LZ77匹配数
+        literals: LZ77字面量数
+        times: 各阶段累计耗时（秒）
+        elapsed: 总用时（秒）
+    """
+
+    STAGES = ("read", "threshold", "rle", "lz77", "write")
+
+    def __init__(self, input_path: Optional[str] = None, output_path: Optional[str] = None):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.frames = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.pixels = 0
+        self.runs = 0
+        self.matches = 0
+        self.literals = 0
+        self.times = dict.fromkeys(self.STAGES, 0.0)
+        self.elapsed = 0.0
+        self._started = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """统计代码块的耗时，计入name阶段"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] += time.perf_counter() - start
+
+    def add_encoded(self, counts: Tuple[int, int, int, int, float, float]) -> None:
+        """累加_encode_counted返回的一帧统计"""
+        pixels, runs, matches, literals, rle_time, lz77_time = counts
+        self.pixels += pixels
+        self.runs += runs
+        self.matches += matches
+        self.literals += literals
+        self.times["rle"] += rle_time
+        self.times["lz77"] += lz77_time
+
+    def add(self, other: "ConversionStats") -> None:
+        """累加另一个统计信息的帧数、计数和各阶段耗时，用于合并各进程的结果"""
+        self.frames += other.frames
+        self.bytes_out += other.bytes_out
+        self.pixels += other.pixels
+        self.runs += other.runs
+        self.matches += other.matches
+        self.literals += other.literals
+        for name, seconds in other.times.items():
+            self.times[name] += seconds
+
+    def finish(self) -> "ConversionStats":
+        """记录总用时和输入输出文件的大小"""
+        self.elapsed = time.perf_counter() - self._started
+        if isinstance(self.input_path, (str, os.PathLike)) and os.path.isfile(self.input_path):
+            self.bytes_in = os.path.getsize(self.input_path)
+        if isinstance(self.output_path, (str, os.PathLike)) and os.path.isfile(self.output_path):
+            self.bytes_out = os.path.getsize(self.output_path)
+        return self
+
+    @property
+    def compression_ratio(self) -> float:
+        """压缩率（%），与get_file_size_info相同"""
+        return (1 - self.bytes_out / self.bytes_in) * 100 if self.bytes_in else 0.0
+
+    def to_dict(self) -> dict:
+        """转换为可序列化为JSON的字典"""
+        result = {key: value for key, value in vars(self).items() if not key.startswith("_")}
+        result["times"] = dict(self.times)
+        result["compression_ratio"] = self.compression_ratio
+        return result
+
+    def __getitem__(self, key: str) -> Any:
+        if key.startswith("_") or not hasattr(self, key):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __bool__(self) -> bool:
+        return True
+
+    def __repr__(self) -> str:
+        times = ", ".join(f"{name}={seconds:.3f}s" for name, seconds in self.times.items())
+        return (f"ConversionStats({self.input_path!r} -> {self.output_path!r}, frames={self.frames}, "
+                f"bytes_in={self.bytes_in}, bytes_out={self.bytes_out}, runs={self.runs}, "
+                f"matches={self.matches}, elapsed={self.elapsed:.3f}s, {times})")
+
+
 def encode_run_length(data: np.ndarray) -> bytearray:
     """
     使用改进的游程编码压缩数据
@@ -48,27 +216,26 @@ def encode_run_length(data: np.ndarray) -> bytearray:
     if len(data) == 0:
         return bytearray([0])
 
-    result = bytearray()
-    # 记录起始位
-    start_bit = data[0]
-    result.append(start_bit)
+    data = np.asarray(data, dtype=np.uint8).ravel()
 
-    count = 1
-    current = data[0]
+    # 找出每段连续相同值的起点和长度
+    starts = np.flatnonzero(data[1:] != data[:-1]) + 1
+    starts = np.concatenate(([0], starts))
+    lengths = np.diff(np.append(starts, len(data)))
+    values = data[starts]
 
-    for i in range(1, len(data)):
-        if data[i] == current and count < 15:  # 使用4位存储计数，最大15
-            count += 1
-        else:
-            # 将计数和当前位值打包到一个字节中
-            packed = (count << 4) | current
-            result.append(packed)
-            current = data[i]
-            count = 1
-
-    # 添加最后一组计数
-    packed = (count << 4) | current
-    result.append(packed)
+    # 使用4位存储计数，最大15，超过的部分拆分为多组
+    full, rest = np.divmod(lengths, 15)
+    groups = full + (rest > 0)
+    counts = np.full(int(groups.sum()), 15, dtype=np.uint8)
+    last = np.cumsum(groups) - 1
+    counts[last[rest > 0]] = rest[rest > 0]
+
+    # 将计数和当前位值打包到一个字节中
+    packed = (counts << 4) | np.repeat(values, groups)
+
+    result = bytearray([data[0]])
+    result += packed.tobytes()
     return result
 
 
@@ -86,25 +253,23 @@ def decode_run_length(data: bytes, total_bits: int) -> np.ndarray:
     if len(data) == 0:
         return np.array([], dtype=np.uint8)
 
-    result = []
-    start_bit = data[0]
-    current = start_bit
-
     # 从第二个字节开始解码
-    for i in range(1, len(data)):
-        packed = data[i]
-        count = (packed >> 4) & 0xF  # 获取高4位的计数
-        current = packed & 0xF  # 获取低4位的当前位值
-        result.extend([current] * count)
+    packed = np.frombuffer(data, dtype=np.uint8)[1:]
+    counts = (packed >> 4) & 0xF  # 获取高4位的计数
+    values = packed & 0xF  # 获取低4位的当前位值
+    current = values[-1] if len(values) else data[0]
+
+    # 长度正确时np.repeat的结果即为返回值，不再复制
+    result = np.repeat(values, counts)
 
     # 确保解压后的数据长度正确
     if len(result) > total_bits:
         result = result[:total_bits]
     elif len(result) < total_bits:
         # 如果长度不够，用最后一个位填充
-        result.extend([current] * (total_bits - len(result)))
+        result = np.concatenate((result, np.full(total_bits - len(result), current, dtype=np.uint8)))
 
-    return np.array(result, dtype=np.uint8)
+    return result
 
 
 def lz77_compress(data: bytes, window_size: int = 8192, min_match: int = 4) -> bytes:
@@ -271,6 +436,53 @@ def lz77_decompress(data: bytes) -> bytes:
     return bytes(result)
 
 
+def _lz77_counts(data: bytes) -> Tuple[int, int]:
+    """
+    统计LZ77压缩数据中的匹配数和字面量数，只扫描标志位和长度字段，不还原数据
+
+    返回:
+        (匹配数, 字面量数)
+    """
+    matches = literals = 0
+    pos = 0
+    data_len = len(data)
+    flag_pos = 0
+    flag_byte = 0
+    while pos < data_len:
+        if flag_pos == 0:
+            flag_byte = data[pos]
+            pos += 1
+            if pos >= data_len:
+                break
+        is_match = (flag_byte & (1 << flag_pos)) != 0
+        flag_pos = (flag_pos + 1) % 8
+        if is_match:
+            # 偏移量和长度各占1或2个字节
+            pos += 2 if data[pos] >= 64 else 1
+            pos += 2 if data[pos] >= 16 else 1
+            matches += 1
+        else:
+            pos += 1
+            literals += 1
+    return matches, literals
+
+
+def _encode_counted(bits: np.ndarray) -> Tuple[bytes, Tuple[int, int, int, int, float, float]]:
+    """
+    游程编码并压缩，同时统计各步骤
+
+    返回:
+        (压缩后的数据, (像素数, 游程组数, 匹配数, 字面量数, 游程编码耗时, LZ77耗时))
+    """
+    start = time.perf_counter()
+    encoded = encode_run_length(bits)
+    middle = time.perf_counter()
+    compressed = compress_data(encoded)
+    end = time.perf_counter()
+    matches, literals = _lz77_counts(compressed)
+    return compressed, (int(np.size(bits)), len(encoded) - 1, matches, literals, middle - start, end - middle)
+
+
 def compress_data(data: bytes) -> bytes:
     """
     压缩数据（使用优化的LZ77算法替代zlib）
@@ -299,6 +511,59 @@ def decompress_data(data: bytes) -> bytes:
     return lz77_decompress(data)
 
 
+def estimate_compressed_size(data: bytes, chunks: int = RATE_SAMPLE_CHUNKS,
+                             chunk_size: int = RATE_SAMPLE_CHUNK_SIZE) -> int:
+    """
+    估算数据经compress_data压缩后的大小
+
+    从数据中均匀抽取若干样本块压缩，按样本的压缩率推算整体大小，
+    耗时与数据长度无关。数据不超过样本总量时直接压缩。
+
+    参数:
+        data: 要压缩的数据，通常为游程编码的结果
+        chunks: 样本块数量
+        chunk_size: 每个样本块的大小（字节）
+
+    返回:
+        估算的压缩后大小（字节）
+    """
+    if len(data) <= chunks * chunk_size:
+        return len(compress_data(bytes(data)))
+
+    step = (len(data) - chunk_size) / max(chunks - 1, 1)
+    compressed = 0
+    for i in range(chunks):
+        offset = int(i * step)
+        compressed += len(compress_data(bytes(data[offset:offset + chunk_size])))
+    return math.ceil(len(data) * compressed / (chunks * chunk_size))
+
+
+def _search_scale(estimate: Callable[[float], int], max_bytes: int, min_scale: float,
+                  passes: int = RATE_SEARCH_PASSES) -> float:
+    """
+    二分查找估算大小不超过max_bytes的最大缩放比例
+
+    参数:
+        estimate: 缩放比例 -> 估算的压缩后大小
+        max_bytes: 大小预算（字节）
+        min_scale: 允许的最小缩放比例
+        passes: 二分查找的次数
+
+    返回:
+        缩放比例，min_scale仍超出预算时返回min_scale
+    """
+    if estimate(1.0) <= max_bytes:
+        return 1.0
+    low, high = min_scale, 1.0
+    for _ in range(passes):
+        middle = (low + high) / 2
+        if estimate(middle) <= max_bytes:
+            low = middle
+        else:
+            high = middle
+    return low
+
+
 def file_to_base64(file_path: str) -> Optional[bytes]:
     """
     将文件转换为base64编码
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+BFile (Binary File) 文件检查模块
+只解析BI/BV的文件头和帧记录头，跳过帧数据，用于快速审计大量文件
+"""
+
+import os
+import time
+import struct
+import numpy as np
+from typing import List, Dict, Iterator, Union
+
+from .core import (
+    decode_run_length,
+    decompress_data,
+    Error,
+    DecodeError,
+    FileError
+)
+from .bv import (
+    _BVReader,
+    _decode_frame,
+    BV_HEADER_SIZE,
+    BV_FLAG_INDEX,
+    BV_FLAG_FRAME_TYPE,
+    BV_FLAG_VFR,
+    BV_FRAME_KEY,
+    BV_FRAME_DELTA,
+    BV_FRAME_REF,
+    BV_INDEX_ENTRY_SIZE,
+    BV_INDEX_TRAILER_SIZE
+)
+
+
+# BI文件头: 宽度, 高度
+BI_HEADER_FORMAT = ">II"
+BI_HEADER_SIZE = struct.calcsize(BI_HEADER_FORMAT)
+
+# 可检查的文件扩展名
+INSPECT_EXTENSIONS = (".bi", ".bv")
+
+_FLAG_NAMES = ((BV_FLAG_INDEX, "index"), (BV_FLAG_FRAME_TYPE, "frame_type"), (BV_FLAG_VFR, "vfr"))
+_FRAME_TYPE_NAMES = {BV_FRAME_KEY: "key", BV_FRAME_DELTA: "delta", BV_FRAME_REF: "ref"}
+
+
+class _RunHistogram:
+    """按2的幂分桶统计游程长度: 1, 2-3, 4-7, ..."""
+
+    def __init__(self):
+        self.buckets = np.zeros(64, dtype=np.int64)
+
+    def add(self, frame: np.ndarray) -> None:
+        """统计一帧按行展开后的游程，与编码时的顺序相同"""
+        data = frame.ravel()
+        if data.size == 0:
+            return
+        starts = np.flatnonzero(data[1:] != data[:-1]) + 1
+        lengths = np.diff(np.concatenate(([0], starts, [data.size])))
+        self.buckets += np.bincount(np.log2(lengths).astype(np.int64), minlength=64)[:64]
+
+    def to_dict(self) -> Dict[str, int]:
+        """转换为{"1": 数量, "2-3": 数量, ...}，省略末尾的空桶"""
+        nonzero = np.flatnonzero(self.buckets)
+        last = int(nonzero[-1]) if len(nonzero) else -1
+        result = {}
+        for k in range(last + 1):
+            low, high = 1 << k, (1 << (k + 1)) - 1
+            result[str(low) if low == high else f"{low}-{high}"] = int(self.buckets[k])
+        return result
+
+
+def _inspect_bi(path: str, file_size: int, deep: bool) -> dict:
+    """检查BI文件"""
+    with open(path, "rb") as f:
+        header = f.read(BI_HEADER_SIZE)
+        if len(header) < BI_HEADER_SIZE:
+            raise DecodeError("BI文件头不完整")
+        width, height = struct.unpack(BI_HEADER_FORMAT, header)
+        payload = f.read() if deep else None
+
+    result = {
+        "width": width,
+        "height": height,
+        "frame_count": 1,
+        "payload_bytes": file_size - BI_HEADER_SIZE,
+        "bits_per_pixel": (file_size - BI_HEADER_SIZE) * 8 / (width * height) if width * height else None,
+    }
+    if deep:
+        start = time.perf_counter()
+        encoded = decompress_data(payload)
+        frame = decode_run_length(encoded, width * height)
+        result["decode_seconds"] = time.perf_counter() - start
+        histogram = _RunHistogram()
+        histogram.add(frame)
+        result["run_histogram"] = histogram.to_dict()
+    return result
+
+
+def _inspect_bv(path: str, file_size: int, deep: bool) -> dict:
+    """检查BV文件，帧数据只在deep为True时读取"""
+    with open(path, "rb") as f:
+        reader = _BVReader(f)
+        sizes = []
+        durations = []
+        types = dict.fromkeys(_FRAME_TYPE_NAMES.values(), 0)
+        end = BV_HEADER_SIZE
+        histogram = _RunHistogram() if deep else None
+        decode_seconds = 0.0
+        for n in range(reader.frame_count):
+            offset, frame_size, frame_type, duration = reader.locate(n)
+            if offset + frame_size > file_size:
+                raise DecodeError(f"第{n}帧的数据超出文件末尾，文件可能不完整")
+            sizes.append(frame_size)
+            durations.append(duration)
+            name = _FRAME_TYPE_NAMES.get(frame_type, str(frame_type))
+            types[name] = types.get(name, 0) + 1
+            end = max(end, offset + frame_size)
+            if deep and frame_type != BV_FRAME_REF:
+                # 统计存储的内容，差分帧即异或结果，不还原为完整帧
+                start = time.perf_counter()
+                frame = _decode_frame(reader.payload(offset, frame_size), reader.width, reader.height)
+                decode_seconds += time.perf_counter() - start
+                histogram.add(frame)
+
+    index_bytes = reader.frame_count * BV_INDEX_ENTRY_SIZE + BV_INDEX_TRAILER_SIZE \
+        if reader.flags & BV_FLAG_INDEX else 0
+    tick_count = sum(durations)
+    result = {
+        "width": reader.width,
+        "height": reader.height,
+        "fps": reader.fps,
+        "flags": [name for flag, name in _FLAG_NAMES if reader.flags & flag],
+        "frame_count": reader.frame_count,
+        "tick_count": tick_count,
+        "duration_seconds": tick_count / reader.fps if reader.fps else None,
+        "frame_types": types,
+        "payload_bytes": sum(sizes),
+        "index_bytes": index_bytes,
+        # 最后一条帧记录（及帧索引）之后多出的字节，正常为0
+        "trailing_bytes": file_size - end - index_bytes,
+        "frame_size_min": min(sizes) if sizes else 0,
+        "frame_size_max": max(sizes) if sizes else 0,
+        "frame_size_mean": sum(sizes) / len(sizes) if sizes else 0.0,
+        "bits_per_pixel": sum(sizes) * 8 / (tick_count * reader.width * reader.height)
+        if tick_count and reader.width * reader.height else None,
+        "frame_sizes": sizes,
+    }
+    if reader.flags & BV_FLAG_VFR:
+        result["frame_durations"] = durations
+    if deep:
+        result["decode_seconds"] = decode_seconds
+        result["run_histogram"] = histogram.to_dict()
+    return result
+
+
+def inspect(path: Union[str, os.PathLike], deep: bool = False) -> dict:
+    """
+    检查BI/BV文件的结构
+
+    默认只读取文件头和每条帧记录的帧大小、帧类型、持续时长字段，跳过帧数据，
+    耗时与帧数成正比，与帧数据大小无关。
+
+    参数:
+        path: BI或BV文件路径，按扩展名判断格式
+        deep: 是否解码全部帧数据，额外统计解码耗时和游程长度分布
+
+    返回:
+        信息字典。共有path、format（"BI"或"BV"）、file_size、width、height、frame_count、
+        payload_bytes（帧数据总字节数）、bits_per_pixel；BV另有fps、flags（标志位名称列表）、
+        tick_count（按恒定帧率展开后的帧数）、duration_seconds、frame_types（各帧类型的数量）、
+        index_bytes、trailing_bytes、frame_size_min/max/mean、frame_sizes（每帧的帧数据大小），
+        可变帧率时另有frame_durations；deep为True时另有decode_seconds和run_histogram
+        （按2的幂分桶的游程数量，差分帧统计的是异或结果）
+    """
+    path = os.fspath(path)
+    if not os.path.isfile(path):
+        raise FileError(f"输入文件不存在: {path}")
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in INSPECT_EXTENSIONS:
+        raise FileError(f"不支持的文件类型: {path}")
+
+    try:
+        file_size = os.path.getsize(path)
+        if extension == ".bi":
+            details = _inspect_bi(path, file_size, deep)
+        else:
+            details = _inspect_bv(path, file_size, deep)
+    except Error:
+        raise
+    except Exception as e:
+        raise DecodeError(f"检查文件失败: {path}: {str(e)}")
+
+    result = {"path": path, "format": extension[1:].upper(), "file_size": file_size}
+    result.update(details)
+    return result
+
+
+def iter_files(paths: List[Union[str, os.PathLike]]) -> Iterator[str]:
+    """
+    展开路径列表中的目录，按名称顺序递归产生其中的BI/BV文件，文件路径原样产生
+
+    参数:
+        paths: 文件或目录路径列表
+    """
+    for path in paths:
+        path = os.fspath(path)
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() in INSPECT_EXTENSIONS:
+                    yield os.path.join(root, name)
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+BFile (Binary File) 共享内存模块
+提供基于共享内存环形缓冲区的跨进程帧传递功能，一个进程解码，多个进程零复制读取
+"""
+
+import sys
+import time
+import numpy as np
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional, Iterator
+
+from .core import (
+    Error,
+    EncodeError,
+    DecodeError
+)
+from .bv import _BVReader
+
+
+# 控制区由int64组成: 魔数, 宽度, 高度, 槽位数, 帧率, 消费者数, 已发布帧数, 是否结束
+SHM_MAGIC = 0x42565242  # "BVRB"
+SHM_CONTROL_WORDS = 8
+SHM_MAX_CONSUMERS = 16
+_MAGIC, _WIDTH, _HEIGHT, _SLOTS, _FPS, _CONSUMERS, _WRITE_SEQ, _CLOSED = range(SHM_CONTROL_WORDS)
+
+# 等待对方进程时的轮询间隔（秒）
+SHM_POLL_INTERVAL = 0.0005
+
+# 本进程创建的共享内存名称，连接这些共享内存时登记已由生产者完成
+_created_names = set()
+
+
+def _layout(width: int, height: int, slots: int):
+    """
+    计算共享内存布局
+
+    返回:
+        (控制区字数, 帧数据偏移量, 总大小)
+    """
+    words = SHM_CONTROL_WORDS + slots + SHM_MAX_CONSUMERS
+    # 帧数据按64字节对齐
+    data_offset = (words * 8 + 63) // 64 * 64
+    return words, data_offset, data_offset + slots * width * height
+
+
+def _attach_untracked(name: str) -> shared_memory.SharedMemory:
+    """
+    连接已有的共享内存，不登记到本进程的resource_tracker
+
+    Python 3.13之前连接方也会登记共享内存，独立启动的消费者进程退出时
+    其resource_tracker会把生产者的共享内存一并删除，因此连接后立即注销。
+    生产者在本进程中时两者共用同一个resource_tracker，注销会撤销生产者的登记，此时跳过。
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    if shm.name not in _created_names:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def _wait(condition, timeout: Optional[float], error: Error) -> None:
+    """轮询等待condition()成立，超时则抛出error"""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while not condition():
+        if deadline is not None and time.monotonic() > deadline:
+            raise error
+        time.sleep(SHM_POLL_INTERVAL)
+
+
+class SharedFrameProducer:
+    """
+    共享内存帧生产者
+
+    将帧写入共享内存中的环形缓冲区，每个槽位记录所存帧的序号。
+    consumers为0时不等待任何消费者，读取过慢的消费者会丢帧；
+    consumers大于0时，编号为0到consumers-1的消费者全部读完一帧后该槽位才会被覆盖。
+
+    示例:
+        with SharedFrameProducer(128, 64, name="bv0", consumers=2) as producer:
+            producer.publish_file("input.bv")
+    """
+
+    def __init__(self, width: int, height: int, fps: int = 10, slots: int = 8, consumers: int = 0,
+                 name: Optional[str] = None):
+        """
+        创建共享内存环形缓冲区
+
+        参数:
+            width: 帧宽度
+            height: 帧高度
+            fps: 帧率，仅供消费者参考
+            slots: 缓冲区可容纳的帧数
+            consumers: 需要等待的消费者数量，最多16个
+            name: 共享内存名称，为None时自动生成
+        """
+        if slots < 1:
+            raise EncodeError("槽位数必须大于0")
+        if not 0 <= consumers <= SHM_MAX_CONSUMERS:
+            raise EncodeError(f"消费者数量必须在0到{SHM_MAX_CONSUMERS}之间")
+
+        words, data_offset, size = _layout(width, height, slots)
+        self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _created_names.add(self._shm.name)
+        self._control = np.ndarray((words,), dtype=np.int64, buffer=self._shm.buf)
+        self._slot_seq = self._control[SHM_CONTROL_WORDS:SHM_CONTROL_WORDS + slots]
+        self._cursors = self._control[SHM_CONTROL_WORDS + slots:SHM_CONTROL_WORDS + slots + consumers]
+        self._frames = np.ndarray((slots, height, width), dtype=np.uint8, buffer=self._shm.buf, offset=data_offset)
+
+        self._control[:] = 0
+        self._slot_seq[:] = -1
+        self._control[_WIDTH] = width
+        self._control[_HEIGHT] = height
+        self._control[_SLOTS] = slots
+        self._control[_FPS] = fps
+        self._control[_CONSUMERS] = consumers
+        # 魔数最后写入，消费者据此判断初始化已完成
+        self._control[_MAGIC] = SHM_MAGIC
+
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.slots = slots
+        self.consumers = consumers
+
+    @property
+    def name(self) -> str:
+        """共享内存名称，消费者通过该名称连接"""
+        return self._shm.name
+
+    def publish(self, frame: np.ndarray, timeout: Optional[float] = None) -> int:
+        """
+        发布一帧
+
+        参数:
+            frame: (height, width)的二值化数组
+            timeout: 等待消费者释放槽位的最长时间（秒），为None时一直等待
+
+        返回:
+            该帧的序号
+        """
+        seq = int(self._control[_WRITE_SEQ])
+        if self.consumers:
+            _wait(lambda: seq - int(self._cursors.min()) < self.slots, timeout,
+                  EncodeError("等待消费者超时"))
+
+        slot = seq % self.slots
+        # 写入期间将槽位序号置为-1，消费者据此判断数据是否完整
+        self._slot_seq[slot] = -1
+        self._frames[slot] = frame
+        self._slot_seq[slot] = seq
+        self._control[_WRITE_SEQ] = seq + 1
+        return seq
+
+    def publish_file(self, input_path: str, workers: int = 1, timeout: Optional[float] = None) -> int:
+        """
+        解码BV文件并发布全部帧，可变帧率的文件按持续时长展开
+
+        参数:
+            input_path: 输入BV文件路径
+            workers: 解码进程数
+            timeout: 每帧等待消费者的最长时间（秒）
+
+        返回:
+            发布的帧数
+        """
+        count = 0
+        try:
+            with open(input_path, "rb") as f:
+                reader = _BVReader(f)
+                if (reader.width, reader.height) != (self.width, self.height):
+                    raise DecodeError(f"帧尺寸不一致: {reader.width}x{reader.height}，应为{self.width}x{self.height}")
+                for frame in reader.ticks(range(reader.tick_count), workers=workers):
+                    self.publish(frame, timeout)
+                    count += 1
+        except Error:
+            raise
+        except Exception as e:
+            raise DecodeError(f"发布BV帧失败: {str(e)}")
+        return count
+
+    def finish(self, timeout: Optional[float] = None) -> None:
+        """标记不再发布新帧，并等待需要等待的消费者读完"""
+        self._control[_CLOSED] = 1
+        if self.consumers:
+            end = int(self._control[_WRITE_SEQ])
+            _wait(lambda: int(self._cursors.min()) >= end, timeout, EncodeError("等待消费者超时"))
+
+    def close(self) -> None:
+        """释放并删除共享内存"""
+        if self._shm is None:
+            return
+        self._control[_CLOSED] = 1
+        self._control = self._slot_seq = self._cursors = self._frames = None
+        self._shm.close()
+        self._shm.unlink()
+        _created_names.discard(self._shm.name)
+        self._shm = None
+
+    def __enter__(self) -> "SharedFrameProducer":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        try:
+            if exc_type is None:
+                self.finish()
+        finally:
+            self.close()
+
+
+class SharedFrameConsumer:
+    """
+    共享内存帧消费者
+
+    读取到的帧是共享内存的只读视图，不做复制。未指定consumer_id时
+    生产者不会等待该消费者，视图可能在读取后被新帧覆盖，可用is_valid检查。
+    """
+
+    def __init__(self, name: str, consumer_id: Optional[int] = None, timeout: Optional[float] = None):
+        """
+        连接生产者创建的共享内存
+
+        参数:
+            name: 共享内存名称
+            consumer_id: 消费者编号，需小于生产者的consumers，生产者会等待该消费者读完
+            timeout: 等待生产者完成初始化的最长时间（秒）
+        """
+        self._shm = _attach_untracked(name)
+        control = np.ndarray((SHM_CONTROL_WORDS,), dtype=np.int64, buffer=self._shm.buf)
+        try:
+            _wait(lambda: int(control[_MAGIC]) == SHM_MAGIC, timeout, DecodeError("共享内存不是BFile帧缓冲区"))
+            self.width = int(control[_WIDTH])
+            self.height = int(control[_HEIGHT])
+            self.slots = int(control[_SLOTS])
+            self.fps = int(control[_FPS])
+            consumers = int(control[_CONSUMERS])
+        except Error:
+            del control
+            self._shm.close()
+            raise
+        del control
+        if consumer_id is not None and not 0 <= consumer_id < consumers:
+            self._shm.close()
+            raise DecodeError(f"消费者编号必须在0到{consumers - 1}之间")
+
+        words, data_offset, _ = _layout(self.width, self.height, self.slots)
+        self._control = np.ndarray((words,), dtype=np.int64, buffer=self._shm.buf)
+        self._slot_seq = self._control[SHM_CONTROL_WORDS:SHM_CONTROL_WORDS + self.slots]
+        self._cursors = self._control[SHM_CONTROL_WORDS + self.slots:]
+        self._frames = np.ndarray((self.slots, self.height, self.width), dtype=np.uint8,
+                                  buffer=self._shm.buf, offset=data_offset)
+        self._frames.flags.writeable = False
+        self.consumer_id = consumer_id
+
+    def read(self, seq: int, timeout: Optional[float] = None) -> np.ndarray:
+        """
+        读取指定序号的帧
+
+        参数:
+            seq: 帧序号
+            timeout: 等待该帧发布的最长时间（秒）
+
+        返回:
+            (height, width)的只读视图
+        """
+        _wait(lambda: int(self._control[_WRITE_SEQ]) > seq, timeout, DecodeError("等待帧超时"))
+        if not self.is_valid(seq):
+            raise DecodeError(f"帧已被覆盖: {seq}")
+        return self._frames[seq % self.slots]
+
+    def is_valid(self, seq: int) -> bool:
+        """检查序号为seq的帧是否仍在缓冲区中且未被覆盖"""
+        return int(self._slot_seq[seq % self.slots]) == seq
+
+    def frames(self, timeout: Optional[float] = None) -> Iterator[np.ndarray]:
+        """
+        依次读取帧，直到生产者结束
+
+        有consumer_id时，取下一帧即表示上一帧已用完，生产者才会覆盖其槽位；
+        没有consumer_id时，落后超过缓冲区容量的帧会被跳过。
+
+        参数:
+            timeout: 等待下一帧的最长时间（秒）
+        """
+        seq = 0 if self.consumer_id is None else int(self._cursors[self.consumer_id])
+        while True:
+            _wait(lambda: int(self._control[_WRITE_SEQ]) > seq or self._control[_CLOSED], timeout,
+                  DecodeError("等待帧超时"))
+            write_seq = int(self._control[_WRITE_SEQ])
+            if write_seq <= seq:
+                return
+            if self.consumer_id is None and write_seq - seq > self.slots:
+                seq = write_seq - self.slots
+            frame = self._frames[seq % self.slots]
+            if not self.is_valid(seq):
+                # 读取过程中槽位被覆盖，从最新位置继续
+                continue
+            yield frame
+            seq += 1
+            if self.consumer_id is not None:
+                self._cursors[self.consumer_id] = seq
+
+    def close(self) -> None:
+        """断开共享内存，之前返回的帧视图需先释放"""
+        if self._shm is None:
+            return
+        self._control = self._slot_seq = self._cursors = self._frames = None
+        try:
+            self._shm.close()
+        except BufferError:
+            raise DecodeError("仍有帧视图在使用，无法关闭共享内存")
+        self._shm = None
+
+    def __enter__(self) -> "SharedFrameConsumer":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+BFile (Binary File) 流传输模块
+提供基于分包格式的BV实时传输功能，可通过套接字或管道边编码边发送、边接收边解码
+"""
+
+import socket
+import struct
+import numpy as np
+from typing import Optional, Iterator, Tuple, Union, BinaryIO
+
+from .core import (
+    Error,
+    EncodeError,
+    DecodeError
+)
+from .bv import (
+    BVWriter,
+    BV_FRAME_KEY,
+    BV_FRAME_DELTA,
+    _decode_frame
+)
+
+
+# 数据包头: 魔数, 宽度, 高度, 帧率, 包类型, 保留, 持续时长, 帧序号, 帧数据大小
+# 每个数据包都携带流参数，接收方可以从任意关键帧开始解码
+BVS_PACKET_FORMAT = ">4sHHHBBHII"
+BVS_PACKET_SIZE = struct.calcsize(BVS_PACKET_FORMAT)
+BVS_MAGIC = b"BVSP"
+
+# 包类型: 关键帧与差分帧沿用BV的帧类型，另有表示流结束的包
+BVS_PACKET_END = 0xFF
+
+
+class _StreamIO:
+    """统一套接字与文件对象（包括管道）的读写接口"""
+
+    def __init__(self, stream: Union[socket.socket, BinaryIO]):
+        self.stream = stream
+        self._is_socket = isinstance(stream, socket.socket)
+
+    def write(self, data: bytes) -> None:
+        """写入全部数据，对方读取过慢时阻塞"""
+        if self._is_socket:
+            self.stream.sendall(data)
+        else:
+            self.stream.write(data)
+            if hasattr(self.stream, "flush"):
+                self.stream.flush()
+
+    def read_exact(self, size: int) -> bytes:
+        """读取size字节，只有遇到流结尾时返回的数据才会不足size字节"""
+        chunks = []
+        remaining = size
+        while remaining:
+            if self._is_socket:
+                chunk = self.stream.recv(remaining)
+            else:
+                chunk = self.stream.read(remaining)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+
+class BVStreamSender(BVWriter):
+    """
+    BV流发送器
+
+    逐帧编码并立即以数据包形式写入套接字或管道，不需要预先知道帧数。
+    写入是阻塞的，接收方读取过慢时发送方会在缓冲区满后等待，由此形成背压。
+    发送器不会关闭传入的套接字或文件对象。
+
+    示例:
+        with socket.create_connection(("display", 9000)) as sock:
+            with BVStreamSender(sock, fps=10, keyframe_interval=10) as sender:
+                for frame in frames:
+                    sender.write(frame)
+    """
+
+    def __init__(self, target: Union[socket.socket, BinaryIO], fps: int = 10, threshold: int = 128,
+                 keyframe_interval: int = 0, vfr: bool = False,
+                 width: Optional[int] = None, height: Optional[int] = None):
+        """
+        初始化BV流发送器
+
+        参数:
+            target: 已连接的套接字，或以二进制方式打开的可写文件对象（如管道、sys.stdout.buffer）
+            fps: 帧率，默认为10fps
+            threshold: 二值化阈值，默认为128
+            keyframe_interval: 关键帧间隔，大于0时启用帧间异或差分，接收方需要从关键帧开始解码
+            vfr: 是否合并连续相同的帧，合并需要等到下一个不同的帧到来，因此每帧延迟一帧发送
+            width: 帧宽度，为None时取第一帧的宽度
+            height: 帧高度，为None时取第一帧的高度
+        """
+        self.target = target
+        # 引用帧依赖接收方保存的历史帧，流传输中不使用去重和帧索引
+        super().__init__(target, fps=fps, threshold=threshold, keyframe_interval=keyframe_interval,
+                         vfr=vfr, width=width, height=height)
+
+    def _open(self) -> _StreamIO:
+        """流没有文件头，参数随每个数据包发送"""
+        return _StreamIO(self.target)
+
+    def _send_packet(self, packet_type: int, payload: bytes = b"", duration: int = 1) -> None:
+        """发送一个数据包"""
+        header = struct.pack(BVS_PACKET_FORMAT, BVS_MAGIC, self.width or 0, self.height or 0, self.fps,
+                             packet_type, 0, duration, self.frame_count, len(payload))
+        try:
+            # 包头与帧数据一次写入，避免小包
+            self._file.write(header + payload)
+        except OSError as e:
+            raise EncodeError(f"发送数据包失败: {str(e)}")
+
+    def _write_encoded(self, compressed_frame: bytes, frame_type: int, duration: int = 1) -> None:
+        """以数据包形式发送已压缩的帧数据"""
+        if self._file is None:
+            raise EncodeError("BV流发送器已关闭")
+        self._send_packet(frame_type, compressed_frame, duration)
+        self.frame_count += 1
+
+    def close(self) -> None:
+        """发送剩余的帧和流结束包，不关闭底层的套接字或文件对象"""
+        if self._file is None:
+            return
+        try:
+            self._flush_run()
+            self._send_packet(BVS_PACKET_END)
+        finally:
+            self._file = None
+
+
+class BVStreamReceiver:
+    """
+    BV流接收器
+
+    从套接字或管道中逐个读取数据包并解码，只在调用方取下一帧时才读取，
+    处理过慢时发送方会因缓冲区满而等待。从中途加入的流会跳过第一个关键帧之前的差分帧。
+
+    示例:
+        with BVStreamReceiver(conn) as receiver:
+            for frame in receiver:
+                display(frame)
+    """
+
+    def __init__(self, source: Union[socket.socket, BinaryIO], expand: bool = True):
+        """
+        初始化BV流接收器
+
+        参数:
+            source: 已连接的套接字，或以二进制方式打开的可读文件对象（如管道、sys.stdin.buffer）
+            expand: 是否按持续时长重复输出合并的帧，默认为True
+        """
+        self._io = _StreamIO(source)
+        self.expand = expand
+        self.width = None
+        self.height = None
+        self.fps = None
+        self.frame_count = 0
+        self.ended = False
+        self._prev = None
+
+    def packets(self) -> Iterator[Tuple[int, int, int, bytes]]:
+        """
+        依次读取数据包，直到流结束包或流结尾
+
+        返回:
+            依次产生(包类型, 持续时长, 帧序号, 帧数据)
+        """
+        while not self.ended:
+            header = self._io.read_exact(BVS_PACKET_SIZE)
+            if not header:
+                # 发送方未发送结束包就断开
+                return
+            if len(header) < BVS_PACKET_SIZE:
+                raise DecodeError("数据包头不完整")
+            magic, width, height, fps, packet_type, _, duration, sequence, size = struct.unpack(
+                BVS_PACKET_FORMAT, header)
+            if magic != BVS_MAGIC:
+                raise DecodeError("无效的BV流数据包")
+            if packet_type == BVS_PACKET_END:
+                self.ended = True
+                return
+            payload = self._io.read_exact(size)
+            if len(payload) < size:
+                raise DecodeError("帧数据不完整")
+
+            if (width, height) != (self.width, self.height):
+                # 流参数变化后之前的帧不能再作为差分基准
+                self._prev = None
+            self.width, self.height, self.fps = width, height, fps
+            yield packet_type, duration, sequence, payload
+
+    def frames(self) -> Iterator[np.ndarray]:
+        """
+        依次解码帧，直到流结束
+
+        返回:
+            依次产生(height, width)的二值化数组
+        """
+        try:
+            for packet_type, duration, _, payload in self.packets():
+                if packet_type not in (BV_FRAME_KEY, BV_FRAME_DELTA):
+                    raise DecodeError(f"不支持的包类型: {packet_type}")
+                if packet_type == BV_FRAME_DELTA and self._prev is None:
+                    # 尚未收到关键帧，无法还原差分帧
+                    continue
+                frame = _decode_frame(payload, self.width, self.height)
+                if packet_type == BV_FRAME_DELTA:
+                    frame ^= self._prev
+                self._prev = frame
+                self.frame_count += 1
+                for _ in range(duration if self.expand else 1):
+                    yield frame
+        except Error:
+            raise
+        except Exception as e:
+            raise DecodeError(f"接收BV流失败: {str(e)}")
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        return self.frames()
+
+    def close(self) -> None:
+        """接收器不持有资源，底层的套接字或文件对象由调用方关闭"""
+
+    def __enter__(self) -> "BVStreamReceiver":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
@@ -17,6 +17,22 @@ import gc
 
 from BFile_Micro.color import Color
 
+# BV文件头大小: 宽度, 高度, 帧率(低16位)与标志位(高16位), 帧数
+BV_HEADER_SIZE = 12
+
+# 标志位: 文件末尾附带帧索引，顺序播放时不需要
+BV_FLAG_INDEX = 0x0001
+# 标志位: 每条帧记录在帧大小之后附带1字节帧类型
+BV_FLAG_FRAME_TYPE = 0x0002
+# 标志位: 每条帧记录在帧类型之后附带2字节持续时长（以1/帧率为单位）
+BV_FLAG_VFR = 0x0004
+BV_SUPPORTED_FLAGS = BV_FLAG_INDEX | BV_FLAG_FRAME_TYPE | BV_FLAG_VFR
+
+# 帧类型: 关键帧独立编码，差分帧存储与前一帧的异或结果，引用帧存储内容相同的更早帧的序号
+BV_FRAME_KEY = 0
+BV_FRAME_DELTA = 1
+BV_FRAME_REF = 2
+
 class BV:
     """BFile视频显示类，用于在OLED显示屏上显示BFile.bv格式的视频"""
     
@@ -35,6 +51,9 @@ class BV:
         self.frame_cache = {}  # 帧缓存
         self.max_cache_size = 10  # 最大缓存帧数
         self.auto_update = True  # 自动更新显示
+        self.video_flags = 0  # 文件头中的标志位
+        self.prev_frame = None  # 上一帧，用于还原差分帧
+        self.frame_duration = 1  # 最近加载的帧的持续时长（以1/帧率为单位）
         
         # 如果OLED对象有set_auto_update方法，则设置自动更新
         if hasattr(self.oled, 'set_auto_update'):
@@ -175,10 +194,6 @@ class BV:
         返回:
             (width, height, binary_data): 帧宽度、高度和二值化数据
         """
-        # 检查缓存中是否已有该帧
-        if frame_index in self.frame_cache:
-            return self.video_width, self.video_height, self.frame_cache[frame_index]
-            
         try:
             # 读取帧大小
             frame_size_bytes = bv_file.read(4)
@@ -188,20 +203,54 @@ class BV:
                 
             frame_size = struct.unpack(">I", frame_size_bytes)[0]
             
+            # 读取帧记录的附加字段
+            frame_type = BV_FRAME_KEY
+            self.frame_duration = 1
+            if self.video_flags & BV_FLAG_FRAME_TYPE:
+                frame_type = bv_file.read(1)[0]
+            if self.video_flags & BV_FLAG_VFR:
+                self.frame_duration = struct.unpack(">H", bv_file.read(2))[0]
+            
+            # 检查缓存中是否已有该帧，有则跳过帧数据
+            if frame_index in self.frame_cache:
+                bv_file.seek(frame_size, 1)
+                binary = self.frame_cache[frame_index]
+                self.prev_frame = binary
+                return self.video_width, self.video_height, binary
+            
             # 读取压缩的帧数据
             compressed_frame = bv_file.read(frame_size)
             if len(compressed_frame) < frame_size:
                 print(f"Error: Incomplete frame data: {len(compressed_frame)}/{frame_size} bytes")
                 return None, None, None
                 
-            # 解压数据
-            encoded = self.decompress_data(compressed_frame)
-            
-            # 计算总位数
-            total_bits = self.video_width * self.video_height
-            
-            # 解码游程长度
-            binary = self.decode_run_length(encoded, total_bits)
+            if frame_type == BV_FRAME_REF:
+                # 引用帧与更早的一帧内容相同
+                ref_index = struct.unpack(">I", compressed_frame)[0]
+                binary = self.load_ref_frame(bv_file, ref_index)
+                if binary is None:
+                    return None, None, None
+            elif frame_type == BV_FRAME_KEY or frame_type == BV_FRAME_DELTA:
+                # 解压数据
+                encoded = self.decompress_data(compressed_frame)
+                
+                # 计算总位数
+                total_bits = self.video_width * self.video_height
+                
+                # 解码游程长度
+                binary = self.decode_run_length(encoded, total_bits)
+                
+                if frame_type == BV_FRAME_DELTA:
+                    # 差分帧与上一帧异或还原
+                    if self.prev_frame is None:
+                        print(f"Error: Delta frame {frame_index} has no previous frame")
+                        return None, None, None
+                    prev = self.prev_frame
+                    for k in range(total_bits):
+                        binary[k] ^= prev[k]
+            else:
+                print(f"Error: Unknown frame type: {frame_type}")
+                return None, None, None
             
             # 缓存帧数据
             if len(self.frame_cache) >= self.max_cache_size:
@@ -210,6 +259,7 @@ class BV:
                 del self.frame_cache[oldest_frame]
                 
             self.frame_cache[frame_index] = binary
+            self.prev_frame = binary
             
             return self.video_width, self.video_height, binary
             
@@ -217,6 +267,40 @@ class BV:
             print(f"Error: Failed to load BV frame: {str(e)}")
             return None, None, None
             
+    def load_ref_frame(self, bv_file, ref_index):
+        """
+        加载引用帧指向的更早的帧
+        
+        不在缓存中时从头顺序解码到该帧，之后恢复文件位置和上一帧
+        
+        参数:
+            bv_file: 已打开的BV文件对象
+            ref_index: 被引用帧的序号
+            
+        返回:
+            被引用帧的二值化数据，失败时返回None
+        """
+        if ref_index in self.frame_cache:
+            return self.frame_cache[ref_index]
+            
+        position = bv_file.tell()
+        prev_frame = self.prev_frame
+        frame_duration = self.frame_duration
+        try:
+            bv_file.seek(BV_HEADER_SIZE)
+            self.prev_frame = None
+            binary = None
+            for k in range(ref_index + 1):
+                binary = self.load_bv_frame(bv_file, k)[2]
+                if binary is None:
+                    print(f"Error: Failed to load referenced frame {ref_index}")
+                    return None
+            return binary
+        finally:
+            bv_file.seek(position)
+            self.prev_frame = prev_frame
+            self.frame_duration = frame_duration
+            
     def load_bv_video(self, bv_path):
         """
         加载BFile.bv格式的视频
@@ -235,12 +319,19 @@ class BV:
             try:
                 with open(bv_path, "rb") as f:
                     # 读取视频信息头
-                    header = f.read(12)
-                    if len(header) < 12:
+                    header = f.read(BV_HEADER_SIZE)
+                    if len(header) < BV_HEADER_SIZE:
                         print(f"Error: Incomplete file header: {len(header)} bytes")
                         return False
                         
                     self.video_width, self.video_height, self.fps, self.total_frames = struct.unpack(">HHII", header)
+                    # 帧率字段的高16位为标志位
+                    self.video_flags = self.fps >> 16
+                    self.fps &= 0xFFFF
+                    if self.video_flags & ~BV_SUPPORTED_FLAGS:
+                        print(f"Error: Unsupported BV flags: 0x{self.video_flags:04X}")
+                        return False
+                    self.prev_frame = None
                     
                     # 保存文件路径和帧数信息
                     self.bv_path = bv_path
@@ -371,7 +462,8 @@ class BV:
                 # 打开视频文件
                 with open(bv_path, "rb") as f:
                     # 跳过文件头
-                    f.read(12)
+                    f.read(BV_HEADER_SIZE)
+                    self.prev_frame = None
                     
                     # 播放每一帧
                     for i in range(self.total_frames):
@@ -390,8 +482,8 @@ class BV:
                         # 手动更新显示
                         self.oled.show()
                         
-                        # 延迟
-                        time.sleep(frame_delay)
+                        # 延迟，可变帧率时按帧的持续时长
+                        time.sleep(frame_delay * self.frame_duration)
                         
                         # 定期进行垃圾回收，防止内存泄漏
                         if i % 10 == 0:
@@ -443,7 +535,8 @@ class BV:
             # 打开视频文件
             with open(bv_path, "rb") as f:
                 # 跳过文件头
-                f.read(12)
+                f.read(BV_HEADER_SIZE)
+                self.prev_frame = None
                 
                 # 播放每一帧
                 for i in range(self.total_frames):
@@ -470,8 +563,8 @@ class BV:
                     # 手动更新显示
                     self.oled.show()
                         
-                    # 延迟
-                    time.sleep(frame_delay)
+                    # 延迟，可变帧率时按帧的持续时长
+                    time.sleep(frame_delay * self.frame_duration)
                     
                     # 定期进行垃圾回收，防止内存泄漏
                     if i % 10 == 0:
@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+BFile (Binary File) 性能基准
+使用确定性的合成数据测量编解码速度、峰值内存和压缩率，结果以JSON保存以便跨提交比较
+
+运行:
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.compare baseline.json results.json
+"""
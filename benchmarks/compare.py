@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+BFile (Binary File) 基准结果比较
+比较两次benchmarks.run的JSON结果，列出耗时、峰值内存和压缩率的变化，
+有用例退化超过阈值时以非零状态退出，可用于CI
+"""
+
+import sys
+import json
+import argparse
+from typing import Dict, Tuple, List, Optional
+
+
+def load(path: str) -> Dict[Tuple[str, str, str], dict]:
+    """读取结果文件，以(分组, 函数名, 数据集)为键"""
+    with open(path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    return {(entry["group"], entry["name"], entry["corpus"]): entry for entry in report["results"]}
+
+
+def _change(old: Optional[float], new: Optional[float]) -> Optional[float]:
+    """相对变化，新值大于旧值时为正"""
+    if not old or new is None:
+        return None
+    return (new - old) / old
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="比较两次BFile基准测试结果")
+    parser.add_argument("baseline", help="基准结果JSON")
+    parser.add_argument("current", help="当前结果JSON")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="判定为退化的相对变化，默认为0.10即10%%")
+    parser.add_argument("--min-seconds", type=float, default=0.001,
+                        help="耗时低于该值（秒）的用例不参与耗时退化判定，避免计时噪声")
+    args = parser.parse_args(argv)
+
+    baseline = load(args.baseline)
+    current = load(args.current)
+    regressions = []
+
+    print(f"{'group':9s} {'name':22s} {'corpus':14s} {'time':>9s} {'memory':>9s} {'ratio':>9s}")
+    for key in sorted(set(baseline) & set(current)):
+        old, new = baseline[key], current[key]
+        time_change = _change(old["seconds"], new["seconds"])
+        memory_change = _change(old["peak_bytes"], new["peak_bytes"])
+        # 压缩率下降为退化，取反使正值表示变差
+        ratio_change = _change(new.get("ratio"), old.get("ratio"))
+
+        cells = []
+        for change in (time_change, memory_change, ratio_change):
+            cells.append(f"{change:+9.1%}" if change is not None else f"{'-':>9s}")
+        print(f"{key[0]:9s} {key[1]:22s} {key[2]:14s} {' '.join(cells)}")
+
+        if time_change is not None and max(old["seconds"], new["seconds"]) >= args.min_seconds \
+                and time_change > args.threshold:
+            regressions.append((key, "time", time_change))
+        if memory_change is not None and memory_change > args.threshold:
+            regressions.append((key, "memory", memory_change))
+        if ratio_change is not None and ratio_change > 0:
+            # 压缩结果是确定的，任何下降都视为退化
+            regressions.append((key, "ratio", ratio_change))
+
+    for key in sorted(set(baseline) ^ set(current)):
+        print(f"{key[0]:9s} {key[1]:22s} {key[2]:14s} 仅存在于{'基准' if key in baseline else '当前'}结果中")
+
+    if regressions:
+        print(f"\n{len(regressions)}项退化:")
+        for (group, name, corpus), metric, change in regressions:
+            print(f"  {group}/{name}/{corpus} {metric} {change:+.1%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+BFile (Binary File) 基准数据集
+生成确定性的合成二值图像和视频，相同参数每次生成的数据完全一致
+"""
+
+import cv2
+import numpy as np
+from typing import Dict, List, Callable
+
+
+# 4x4 Bayer有序抖动矩阵
+_BAYER = np.array([
+    [0, 8, 2, 10],
+    [12, 4, 14, 6],
+    [3, 11, 1, 9],
+    [15, 7, 13, 5],
+], dtype=np.float64) / 16
+
+
+def blank(width: int, height: int) -> np.ndarray:
+    """纯色图像，游程编码的最好情况"""
+    return np.zeros((height, width), dtype=np.uint8)
+
+
+def shapes(width: int, height: int, seed: int = 1) -> np.ndarray:
+    """随机矩形和圆，近似图标和遮罩"""
+    rng = np.random.default_rng(seed)
+    canvas = np.zeros((height, width), dtype=np.uint8)
+    for _ in range(12):
+        x, y = rng.integers(0, width), rng.integers(0, height)
+        size = int(rng.integers(2, max(3, min(width, height) // 4)))
+        if rng.random() < 0.5:
+            cv2.rectangle(canvas, (int(x), int(y)), (int(x) + size, int(y) + size), 1, -1)
+        else:
+            cv2.circle(canvas, (int(x), int(y)), size // 2 + 1, 1, -1)
+    return canvas
+
+
+def text(width: int, height: int) -> np.ndarray:
+    """多行文字，游程短且重复多"""
+    canvas = np.zeros((height, width), dtype=np.uint8)
+    line_height = max(8, height // 8)
+    scale = line_height / 30
+    for row, y in enumerate(range(line_height, height, line_height)):
+        cv2.putText(canvas, f"BFile {row} 0123456789 ABCDEFGHIJKLMNOPQRSTUVWXYZ", (2, y),
+                    cv2.FONT_HERSHEY_SIMPLEX, scale, 1, 1, cv2.LINE_8)
+    return canvas
+
+
+def noise(width: int, height: int, seed: int = 2) -> np.ndarray:
+    """均匀随机噪声，游程编码的最坏情况"""
+    return np.random.default_rng(seed).integers(0, 2, (height, width), dtype=np.uint8)
+
+
+def dithered(width: int, height: int) -> np.ndarray:
+    """对径向渐变做有序抖动，近似二值化后的照片"""
+    y, x = np.mgrid[0:height, 0:width]
+    gradient = np.hypot(x - width / 2, y - height / 2) / np.hypot(width / 2, height / 2)
+    threshold = np.tile(_BAYER, (height // 4 + 1, width // 4 + 1))[:height, :width]
+    return (gradient > threshold).astype(np.uint8)
+
+
+def moving_shapes(width: int, height: int, frames: int) -> List[np.ndarray]:
+    """移动的圆和闪烁的方块组成的视频，帧间差异小"""
+    result = []
+    radius = max(2, min(width, height) // 8)
+    for i in range(frames):
+        canvas = np.zeros((height, width), dtype=np.uint8)
+        cx = radius + (i * 3) % max(1, width - 2 * radius)
+        cv2.circle(canvas, (cx, height // 2), radius, 1, -1)
+        if (i // 4) % 2 == 0:
+            cv2.rectangle(canvas, (width // 8, height // 8), (width // 4, height // 4), 1, -1)
+        result.append(canvas)
+    return result
+
+
+# 名称 -> 生成函数(width, height)
+IMAGES: Dict[str, Callable[[int, int], np.ndarray]] = {
+    "blank": blank,
+    "shapes": shapes,
+    "text": text,
+    "noise": noise,
+    "dithered": dithered,
+}
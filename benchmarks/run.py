@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+BFile (Binary File) 基准测试
+对每个数据集测量BFile.core各函数以及Image/Video各入口的耗时、吞吐量、峰值内存和压缩率，
+并与标准库zlib/lzma压缩按位打包的数据对比
+
+吞吐量统一按按位打包后的原始大小（每像素1位）计算，单位为MB/s（10^6字节）。
+峰值内存由tracemalloc统计，包括numpy数组，不包括OpenCV内部的分配。
+"""
+
+import os
+import sys
+import json
+import lzma
+import zlib
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+import cv2
+import numpy as np
+from PIL import Image as PILImage
+from typing import Callable, Optional, List, Any, Tuple
+
+import BFile
+from BFile import Image, Video, BVWriter
+from BFile.core import (encode_run_length, decode_run_length, compress_data, decompress_data,
+                        lz77_compress, lz77_decompress, file_to_base64, base64_to_file)
+
+from . import corpora
+
+
+# 单个用例累计耗时超过该值（秒）后不再重复，避免纯Python的LZ77在大数据上耗时过长
+TIME_BUDGET = 1.0
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> Tuple[float, int, Any]:
+    """
+    测量函数的耗时和峰值内存
+
+    参数:
+        fn: 无参数的被测函数
+        repeat: 最多重复次数，取最短耗时
+
+    返回:
+        (最短耗时（秒）, 峰值内存（字节）, fn的返回值)
+    """
+    best = None
+    spent = 0.0
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        spent += elapsed
+        if spent > TIME_BUDGET:
+            break
+
+    # 内存单独测量一次，tracemalloc会拖慢执行，不影响上面的计时
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak, result
+
+
+class Runner:
+    """执行用例并收集结果"""
+
+    def __init__(self, repeat: int, verbose: bool = True):
+        self.repeat = repeat
+        self.verbose = verbose
+        self.results = []
+
+    def run(self, group: str, name: str, corpus: str, raw_bytes: int, fn: Callable[[], Any],
+            output_size: Optional[Callable[[Any], int]] = None) -> Any:
+        """
+        执行一个用例
+
+        参数:
+            group: 分组，core、baseline、image或video
+            name: 被测函数名
+            corpus: 数据集名
+            raw_bytes: 按位打包后的原始大小，用于计算吞吐量和压缩率
+            fn: 无参数的被测函数
+            output_size: 从fn的返回值得到压缩后大小，仅编码类用例提供
+
+        返回:
+            fn的返回值
+        """
+        seconds, peak, result = measure(fn, self.repeat)
+        entry = {
+            "group": group,
+            "name": name,
+            "corpus": corpus,
+            "raw_bytes": raw_bytes,
+            "seconds": seconds,
+            "mb_per_s": raw_bytes / seconds / 1e6 if seconds > 0 else None,
+            "peak_bytes": peak,
+        }
+        if output_size is not None:
+            size = output_size(result)
+            entry["output_bytes"] = size
+            entry["ratio"] = raw_bytes / size if size else None
+        self.results.append(entry)
+        if self.verbose:
+            ratio = f"{entry['ratio']:8.2f}x" if entry.get("ratio") else " " * 9
+            print(f"{group:9s} {name:22s} {corpus:14s} {seconds * 1000:10.2f} ms "
+                  f"{entry['mb_per_s'] or 0:9.3f} MB/s {peak / 1024:9.1f} KiB {ratio}", file=sys.stderr)
+        return result
+
+
+def bench_core(runner: Runner, name: str, image: np.ndarray, workdir: str) -> None:
+    """BFile.core各函数与zlib/lzma对比"""
+    bits = image.ravel()
+    packed = np.packbits(bits).tobytes()
+    raw = len(packed)
+
+    encoded = runner.run("core", "encode_run_length", name, raw, lambda: encode_run_length(bits))
+    runner.run("core", "decode_run_length", name, raw, lambda: decode_run_length(encoded, bits.size))
+    compressed = runner.run("core", "compress_data", name, raw, lambda: compress_data(encoded), len)
+    runner.run("core", "decompress_data", name, raw, lambda: decompress_data(compressed))
+    lz77_data = runner.run("core", "lz77_compress", name, raw, lambda: lz77_compress(bytes(encoded)), len)
+    runner.run("core", "lz77_decompress", name, raw, lambda: lz77_decompress(lz77_data))
+
+    data_path = os.path.join(workdir, f"{name}.lz77")
+    with open(data_path, "wb") as f:
+        f.write(compressed)
+    text = runner.run("core", "file_to_base64", name, raw, lambda: file_to_base64(data_path))
+    runner.run("core", "base64_to_file", name, raw, lambda: base64_to_file(text, data_path + ".out"))
+
+    zlib_data = runner.run("baseline", "zlib.compress", name, raw, lambda: zlib.compress(packed, 9), len)
+    runner.run("baseline", "zlib.decompress", name, raw, lambda: zlib.decompress(zlib_data))
+    lzma_data = runner.run("baseline", "lzma.compress", name, raw, lambda: lzma.compress(packed), len)
+    runner.run("baseline", "lzma.decompress", name, raw, lambda: lzma.decompress(lzma_data))
+
+
+def bench_image(runner: Runner, name: str, image: np.ndarray, workdir: str) -> None:
+    """Image各入口"""
+    raw = len(np.packbits(image))
+    png_path = os.path.join(workdir, f"{name}.png")
+    bi_path = os.path.join(workdir, f"{name}.bi")
+    PILImage.fromarray(image * 255).save(png_path)
+
+    runner.run("image", "png_to_binary", name, raw, lambda: Image.png_to_binary(png_path, bi_path),
+               lambda _: os.path.getsize(bi_path))
+    runner.run("image", "binary_to_png", name, raw,
+               lambda: Image.binary_to_png(bi_path, os.path.join(workdir, f"{name}_back.png")))
+    text = runner.run("image", "bi_to_base64", name, raw, lambda: Image.bi_to_base64(bi_path))
+    runner.run("image", "base64_to_bi", name, raw,
+               lambda: Image.base64_to_bi(text, os.path.join(workdir, f"{name}_back.bi")))
+
+
+def bench_video(runner: Runner, name: str, frames: List[np.ndarray], fps: int, workdir: str) -> None:
+    """Video各入口"""
+    height, width = frames[0].shape
+    raw = len(frames) * len(np.packbits(frames[0]))
+    mp4_path = os.path.join(workdir, f"{name}.mp4")
+    bv_path = os.path.join(workdir, f"{name}.bv")
+    indexed_path = os.path.join(workdir, f"{name}_index.bv")
+    image_dir = os.path.join(workdir, f"{name}_frames")
+
+    writer = cv2.VideoWriter(mp4_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height), False)
+    for frame in frames:
+        writer.write(frame * 255)
+    writer.release()
+    with BVWriter(indexed_path, fps=fps, index=True) as bv:
+        for frame in frames:
+            bv.write(frame.astype(bool))
+
+    runner.run("video", "mp4_to_bv", name, raw,
+               lambda: Video.mp4_to_bv(mp4_path, bv_path, target_fps=fps),
+               lambda _: os.path.getsize(bv_path))
+    runner.run("video", "mp4_to_bv(keyframe=8)", name, raw,
+               lambda: Video.mp4_to_bv(mp4_path, bv_path + ".kf", target_fps=fps, keyframe_interval=8),
+               lambda _: os.path.getsize(bv_path + ".kf"))
+    runner.run("video", "capture_to_bv", name, raw,
+               lambda: Video.capture_to_bv(mp4_path, bv_path + ".cap", target_fps=fps, live=False),
+               lambda _: os.path.getsize(bv_path + ".cap"))
+    runner.run("video", "bv_to_mp4", name, raw,
+               lambda: Video.bv_to_mp4(bv_path, os.path.join(workdir, f"{name}_back.mp4")))
+    runner.run("video", "to_array", name, raw, lambda: Video.to_array(bv_path))
+    runner.run("video", "iter_frames", name, raw, lambda: sum(1 for _ in Video.iter_frames(bv_path)))
+    runner.run("video", "read_frame", name, raw // len(frames),
+               lambda: Video.read_frame(indexed_path, len(frames) // 2))
+    # 每隔3帧随机读取，Video.open经内存映射读取，不重复打开文件
+    order = list(range(len(frames) - 1, -1, -3))
+    runner.run("video", "read_frames", name, raw // len(frames) * len(order),
+               lambda: Video.read_frames(indexed_path, order))
+
+    def open_and_read():
+        with Video.open(indexed_path) as bv:
+            return bv.read_frames(order)
+
+    runner.run("video", "open+read_frames", name, raw // len(frames) * len(order), open_and_read)
+    runner.run("video", "to_images", name, raw,
+               lambda: Video.to_images(bv_path, os.path.join(image_dir, "f{:05d}.png")))
+    runner.run("video", "from_images", name, raw,
+               lambda: Video.from_images(os.path.join(image_dir, "*.png"), bv_path + ".img", fps=fps),
+               lambda _: os.path.getsize(bv_path + ".img"))
+
+
+def _git_commit() -> Optional[str]:
+    """当前提交的哈希，不在git仓库中时返回None"""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="BFile基准测试")
+    parser.add_argument("--output", "-o", help="结果JSON文件路径，默认只打印")
+    parser.add_argument("--size", type=int, default=128, help="图像边长，默认为128")
+    parser.add_argument("--frames", type=int, default=24, help="视频帧数，默认为24")
+    parser.add_argument("--fps", type=int, default=10, help="视频帧率，默认为10")
+    parser.add_argument("--repeat", type=int, default=3, help="每个用例最多重复次数，取最短耗时")
+    parser.add_argument("--only", choices=["core", "image", "video"], action="append",
+                        help="只运行指定的分组，可重复指定")
+    parser.add_argument("--corpus", action="append", choices=list(corpora.IMAGES),
+                        help="只运行指定的图像数据集，可重复指定")
+    parser.add_argument("--quiet", "-q", action="store_true", help="不打印逐项结果")
+    args = parser.parse_args(argv)
+
+    groups = set(args.only or ["core", "image", "video"])
+    runner = Runner(args.repeat, verbose=not args.quiet)
+    workdir = tempfile.mkdtemp(prefix="bfile-bench-")
+    try:
+        for name in args.corpus or list(corpora.IMAGES):
+            image = corpora.IMAGES[name](args.size, args.size)
+            if "core" in groups:
+                bench_core(runner, name, image, workdir)
+            if "image" in groups:
+                bench_image(runner, name, image, workdir)
+        if "video" in groups:
+            bench_video(runner, "moving_shapes", corpora.moving_shapes(args.size, args.size, args.frames),
+                        args.fps, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "bfile": BFile.__version__,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "platform": platform.platform(),
+            "size": args.size,
+            "frames": args.frames,
+            "fps": args.fps,
+            "repeat": args.repeat,
+        },
+        "results": runner.results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
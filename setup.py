@@ -15,11 +15,21 @@ setup(
         'BFile_Micro': ['*.py'],
     },
     include_package_data=True,
+    # 图像功能只需要numpy和Pillow；视频编解码需要OpenCV，使用pip install b-file[video]安装
     install_requires=[
         "numpy>=1.19.0",
         "Pillow>=8.0.0",
-        "opencv-python>=4.5.0",
     ],
+    extras_require={
+        "video": [
+            "opencv-python>=4.5.0",
+        ],
+    },
+    entry_points={
+        "console_scripts": [
+            "bfile=BFile.cli:main",
+        ],
+    },
     python_requires=">=3.7",
     classifiers=[
         "Development Status :: 3 - Alpha",
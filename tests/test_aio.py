@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""BFile.aio 异步转换的测试"""
+
+import asyncio
+import time
+import types
+
+import numpy as np
+import pytest
+
+import BFile.bv
+from BFile import AsyncConverter, BVWriter, Video
+
+
+def _write_mp4(path, count=60):
+    """30fps的合成MP4视频"""
+    cv2 = pytest.importorskip("cv2")
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), 30, (32, 24))
+    if not writer.isOpened():
+        pytest.skip("OpenCV没有可用的mp4v编码器")
+    for i in range(count):
+        frame = np.zeros((24, 32, 3), np.uint8)
+        frame[4:20, i % 28:i % 28 + 4] = 255
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def _slow_capture(monkeypatch, seconds=0.01):
+    """让源视频的每次读取变慢，保证取消发生在转换中途"""
+    class Slow:
+        def __init__(self, cap):
+            self.cap = cap
+
+        def __getattr__(self, name):
+            return getattr(self.cap, name)
+
+        def grab(self):
+            time.sleep(seconds)
+            return self.cap.grab()
+
+        def read(self):
+            time.sleep(seconds)
+            return self.cap.read()
+
+    open_capture = BFile.bv._open_capture
+    monkeypatch.setattr(BFile.bv, "_open_capture", lambda path: Slow(open_capture(path)))
+
+
+def _write(path, count=20):
+    """移动竖条的BV文件"""
+    with BVWriter(str(path), fps=10) as writer:
+        for i in range(count):
+            frame = np.zeros((12, 16), np.uint8)
+            frame[2:10, i % 12:i % 12 + 4] = 255
+            writer.write(frame)
+    return path
+
+
+def _run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def _slow_imwrite(monkeypatch, seconds=0.01):
+    """让每张图像的保存变慢，保证取消发生在转换中途"""
+    cv2 = pytest.importorskip("cv2")
+
+    def imwrite(path, image):
+        time.sleep(seconds)
+        return cv2.imwrite(path, image)
+    monkeypatch.setattr(BFile.bv, "cv2", types.SimpleNamespace(imwrite=imwrite))
+
+
+def test_mp4_to_bv_cancel_removes_outputs(tmp_path, monkeypatch):
+    mp4_path = _write_mp4(tmp_path / "input.mp4")
+    _slow_capture(monkeypatch)
+    outputs = [str(tmp_path / "full.bv"), {"path": str(tmp_path / "small.bv"), "target_size": (16, None)}]
+    seen = []
+
+    def progress(stats):
+        seen.append(stats.frames)
+        task.cancel()
+
+    async def main():
+        nonlocal task
+        async with AsyncConverter(max_workers=1, max_concurrency=1) as converter:
+            task = asyncio.ensure_future(converter.mp4_to_bv(str(mp4_path), outputs, progress=progress))
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            # 工作线程停下后才释放并发名额，之后的转换正常进行
+            return await converter.mp4_to_bv(str(mp4_path), str(tmp_path / "after.bv"))
+    task = None
+    stats = _run(main())
+    # 默认目标帧率10fps，60帧的源视频输出20帧
+    assert 0 < len(seen) and max(seen) < 20
+    assert not (tmp_path / "full.bv").exists()
+    assert not (tmp_path / "small.bv").exists()
+    assert stats.frames == 20
+    assert Video.to_array(str(tmp_path / "after.bv")).shape == (20, 24, 32)
+
+
+def test_to_images_progress(tmp_path):
+    path = _write(tmp_path / "out.bv")
+    seen = []
+
+    async def main():
+        async with AsyncConverter(max_workers=2) as converter:
+            return await converter.to_images(str(path), str(tmp_path / "f_{:02d}.png"),
+                                             progress=lambda stats: seen.append(stats.frames))
+    paths = _run(main())
+    assert len(paths) == 20
+    # 每帧调用一次，统计信息是同一个对象，在事件循环线程中读到的帧数可能已经前进
+    assert len(seen) == 20
+    assert seen == sorted(seen) and seen[-1] == 20
+
+
+def test_to_images_cancel_removes_images(tmp_path, monkeypatch):
+    _slow_imwrite(monkeypatch)
+    path = _write(tmp_path / "out.bv", 100)
+    out = tmp_path / "images"
+    out.mkdir()
+
+    async def main():
+        async with AsyncConverter(max_workers=1) as converter:
+            task = asyncio.ensure_future(converter.to_images(str(path), str(out / "f_{:03d}.png"),
+                                                             progress=lambda stats: task.cancel()))
+            with pytest.raises(asyncio.CancelledError):
+                await task
+    _run(main())
+    assert list(out.iterdir()) == []
+
+
+def test_to_array_progress(tmp_path):
+    path = _write(tmp_path / "out.bv")
+    seen = []
+
+    async def main():
+        async with AsyncConverter() as converter:
+            return await converter.to_array(str(path), progress=lambda stats: seen.append(stats.frames))
+    result = _run(main())
+    assert np.array_equal(result, Video.to_array(str(path)))
+    assert seen[-1] == 20
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""BI图像转换的测试"""
+
+import os
+import struct
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image as PILImage
+
+from BFile import Image, EncodeError
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+# 在没有OpenCV的环境中导入BFile：图像转换和读取BV文件可用，需要OpenCV的功能抛出带安装提示的ImportError
+WITHOUT_CV2 = """
+import sys
+sys.modules["cv2"] = None
+import numpy as np
+import BFile
+src, bi, png, bv = sys.argv[1:]
+BFile.Image.png_to_binary(src, bi)
+BFile.Image.binary_to_png(bi, png)
+with BFile.BVWriter(bv, width=16, height=12) as writer:
+    writer.write(np.ones((12, 16), bool))
+assert BFile.Video.to_array(bv).shape == (1, 12, 16)
+try:
+    BFile.Video.mp4_to_bv(src, bv)
+except ImportError as e:
+    print(e)
+"""
+
+
+def _noise_png(path, width=64, height=48):
+    """随机噪声图像，几乎无法压缩"""
+    pixels = np.random.RandomState(0).randint(0, 256, (height, width)).astype(np.uint8)
+    PILImage.fromarray(pixels).save(str(path))
+    return path
+
+
+def _header(path):
+    with open(str(path), "rb") as f:
+        return struct.unpack(">II", f.read(8))
+
+
+def test_png_round_trip(tmp_path):
+    source = _noise_png(tmp_path / "in.png")
+    stats = Image.png_to_binary(str(source), str(tmp_path / "out.bi"))
+    assert stats.frames == 1
+    assert _header(tmp_path / "out.bi") == (64, 48)
+    Image.binary_to_png(str(tmp_path / "out.bi"), str(tmp_path / "back.png"))
+    back = np.array(PILImage.open(str(tmp_path / "back.png")).convert("L")) > 0
+    assert np.array_equal(back, np.array(PILImage.open(str(source))) > 128)
+
+
+@pytest.mark.parametrize("ratio", [0.5, 0.2])
+def test_png_max_bytes(tmp_path, ratio):
+    source = _noise_png(tmp_path / "in.png")
+    plain = Image.png_to_binary(str(source), str(tmp_path / "plain.bi"))
+    budget = int(plain.bytes_out * ratio)
+    stats = Image.png_to_binary(str(source), str(tmp_path / "out.bi"), max_bytes=budget)
+    assert (tmp_path / "out.bi").stat().st_size <= budget
+    assert stats.bytes_out <= budget
+    # 缩小分辨率时保持宽高比
+    width, height = _header(tmp_path / "out.bi")
+    assert width < 64 and abs(width / height - 4 / 3) < 0.1
+    # 预算足够时不缩小
+    Image.png_to_binary(str(source), str(tmp_path / "same.bi"), max_bytes=plain.bytes_out * 2)
+    assert (tmp_path / "same.bi").read_bytes() == (tmp_path / "plain.bi").read_bytes()
+
+
+def test_png_max_bytes_unreachable(tmp_path):
+    source = _noise_png(tmp_path / "in.png")
+    with pytest.raises(EncodeError):
+        Image.png_to_binary(str(source), str(tmp_path / "out.bi"), max_bytes=4)
+
+
+def test_works_without_cv2(tmp_path):
+    source = _noise_png(tmp_path / "in.png")
+    paths = [str(source)] + [str(tmp_path / name) for name in ("out.bi", "back.png", "out.bv")]
+    done = subprocess.run([sys.executable, "-c", WITHOUT_CV2] + paths, cwd=ROOT, capture_output=True, text=True)
+    assert done.returncode == 0, done.stderr
+    assert "pip install" in done.stdout
+    back = np.array(PILImage.open(paths[2]).convert("L")) > 0
+    assert np.array_equal(back, np.array(PILImage.open(str(source))) > 128)
@@ -0,0 +1,900 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""BV编解码的测试"""
+
+import os
+import struct
+
+import numpy as np
+import pytest
+
+from BFile import Video, BVWriter, DecodeError
+from BFile.core import encode_run_length, compress_data
+from BFile.bv import BV_FLAG_INDEX, BV_INDEX_MAGIC, BV_INDEX_TRAILER_FORMAT, BV_INDEX_TRAILER_SIZE
+
+
+ASSETS = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "assets")
+
+
+def _frames(count=24, width=32, height=24):
+    """移动的竖条，每个位置停留两帧，不少于8帧时最后4帧回到开头的画面"""
+    frames = []
+    for i in range(count):
+        frame = np.zeros((height, width), np.uint8)
+        x = (i // 2) % (width - 4)
+        frame[4:height - 4, x:x + 4] = 255
+        if count >= 8 and i >= count - 4:
+            frame = frames[i - (count - 4)].copy()
+        frames.append(frame)
+    return frames
+
+
+def _binary(frames):
+    """按默认阈值128二值化后的(T, H, W)数组"""
+    return np.stack([(frame >= 128).astype(np.uint8) for frame in frames])
+
+
+def _write(path, frames, **options):
+    with BVWriter(str(path), fps=10, **options) as writer:
+        for frame in frames:
+            writer.write(frame)
+    return path
+
+
+def _write_mp4(path, count, fps=30):
+    """写入合成的MP4视频"""
+    cv2 = pytest.importorskip("cv2")
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (32, 24))
+    if not writer.isOpened():
+        pytest.skip("OpenCV没有可用的mp4v编码器")
+    for frame in _frames(count):
+        writer.write(cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR))
+    writer.release()
+    return path
+
+
+@pytest.fixture
+def mp4_path(tmp_path):
+    """30fps、60帧的合成MP4视频"""
+    return _write_mp4(tmp_path / "input.mp4", 60)
+
+
+# 帧索引
+
+def test_index_trailer(tmp_path):
+    frames = _frames()
+    data = _write(tmp_path / "indexed.bv", frames, index=True).read_bytes()
+    assert struct.unpack(">I", data[4:8])[0] >> 16 & BV_FLAG_INDEX
+    index_offset, magic = struct.unpack(BV_INDEX_TRAILER_FORMAT, data[-BV_INDEX_TRAILER_SIZE:])
+    assert magic == BV_INDEX_MAGIC
+    # 每帧一项(帧数据偏移量, 帧数据大小)，偏移量之前是该帧的大小字段
+    for n in range(len(frames)):
+        offset, size = struct.unpack(">QI", data[index_offset + n * 12:index_offset + (n + 1) * 12])
+        assert struct.unpack(">I", data[offset - 4:offset])[0] == size
+
+
+def test_index_read_frame(tmp_path):
+    frames = _frames()
+    expected = _binary(frames)
+    plain = _write(tmp_path / "plain.bv", frames)
+    indexed = _write(tmp_path / "indexed.bv", frames, index=True)
+    order = [23, 0, 11, 5, 5, 17]
+    for path in (plain, indexed):
+        assert np.array_equal(Video.read_frame(str(path), 17), expected[17])
+        assert all(np.array_equal(a, expected[n]) for n, a in zip(order, Video.read_frames(str(path), order)))
+    assert np.array_equal(Video.to_array(str(indexed)), expected)
+
+
+def test_index_does_not_walk_frame_chain(tmp_path):
+    frames = _frames()
+    path = _write(tmp_path / "indexed.bv", frames, index=True)
+    # 破坏第0帧的大小字段后，沿帧链读取会出错，按索引定位的帧不受影响
+    data = bytearray(path.read_bytes())
+    data[12:16] = struct.pack(">I", 0xFFFFFFF0)
+    path.write_bytes(bytes(data))
+    assert np.array_equal(Video.read_frame(str(path), 20), _binary(frames)[20])
+
+
+def test_read_frame_out_of_range(tmp_path):
+    path = _write(tmp_path / "indexed.bv", _frames(), index=True)
+    with pytest.raises(DecodeError):
+        Video.read_frame(str(path), 24)
+
+
+def _reference_bv(input_path, threshold=128, target_fps=10):
+    """改动前的mp4_to_bv: 每隔int(源帧率/目标帧率)帧取一帧，文件头之后是(帧大小, 帧数据)序列"""
+    import cv2
+
+    cap = cv2.VideoCapture(str(input_path))
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frame_interval = max(1, int(fps / target_fps))
+
+    data = bytearray(struct.pack(">HHII", width, height, target_fps, total_frames // frame_interval))
+    frame_count = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if frame_count % frame_interval == 0:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            binary = (gray >= threshold).astype(np.uint8)
+            compressed_frame = compress_data(encode_run_length(binary.flatten()))
+            data += struct.pack(">I", len(compressed_frame)) + compressed_frame
+        frame_count += 1
+    cap.release()
+    return bytes(data)
+
+
+# 不带新选项时输出必须与改动前逐字节一致。源帧率是目标帧率的整数倍、帧数能被取帧间隔整除时
+# 改动前的输出是正确的；其他情况下改动前的文件头帧数只是估算值
+@pytest.mark.parametrize("target_fps", [10, 15, 30])
+def test_default_output_matches_reference(tmp_path, mp4_path, target_fps):
+    path = tmp_path / "out.bv"
+    Video.mp4_to_bv(str(mp4_path), str(path), target_fps=target_fps)
+    assert path.read_bytes() == _reference_bv(mp4_path, target_fps=target_fps)
+
+
+def test_index_only_appends(tmp_path, mp4_path):
+    plain = tmp_path / "plain.bv"
+    indexed = tmp_path / "indexed.bv"
+    Video.mp4_to_bv(str(mp4_path), str(plain))
+    Video.mp4_to_bv(str(mp4_path), str(indexed), index=True)
+    plain, indexed = plain.read_bytes(), indexed.read_bytes()
+    # 除标志位外文件头相同，帧记录之后追加索引
+    assert indexed[:4] == plain[:4] and indexed[6:].startswith(plain[6:])
+
+
+# 关键帧与帧间差分
+
+def _frame_types(path):
+    from BFile import inspect
+    return inspect(str(path))["frame_types"]
+
+
+@pytest.mark.parametrize("interval", [1, 4, 7])
+def test_keyframe_round_trip(tmp_path, interval):
+    frames = _frames()
+    expected = _binary(frames)
+    path = _write(tmp_path / "delta.bv", frames, keyframe_interval=interval)
+    assert np.array_equal(Video.to_array(str(path)), expected)
+    # 倒序随机读取时需要回溯到关键帧
+    order = list(range(len(frames) - 1, -1, -3))
+    assert all(np.array_equal(a, expected[n]) for n, a in zip(order, Video.read_frames(str(path), order)))
+
+
+def test_keyframe_interval_shrinks_output(tmp_path):
+    frames = _frames()
+    plain = _write(tmp_path / "plain.bv", frames).stat().st_size
+    delta = _write(tmp_path / "delta.bv", frames, keyframe_interval=8).stat().st_size
+    assert delta < plain
+
+
+def test_delta_falls_back_to_keyframe(tmp_path):
+    # 噪声帧之间的异或结果与帧本身一样难压缩，交替的纯色帧则异或后更复杂，都应存为关键帧
+    rng = np.random.RandomState(0)
+    frames = [np.full((24, 32), 255 * (i % 2), np.uint8) if i % 4 < 2 else
+              rng.randint(0, 2, (24, 32)).astype(np.uint8) * 255 for i in range(12)]
+    plain = _write(tmp_path / "plain.bv", frames).stat().st_size
+    path = _write(tmp_path / "delta.bv", frames, keyframe_interval=6)
+    assert path.stat().st_size <= plain + len(frames)
+    assert _frame_types(path)["key"] > 2
+    assert np.array_equal(Video.to_array(str(path)), _binary(frames))
+
+
+def test_keyframe_interval_on_sample_video(tmp_path):
+    pytest.importorskip("cv2")
+    plain = tmp_path / "plain.bv"
+    delta = tmp_path / "delta.bv"
+    Video.mp4_to_bv(os.path.join(ASSETS, "BFile.mp4"), str(plain), target_fps=30)
+    Video.mp4_to_bv(os.path.join(ASSETS, "BFile.mp4"), str(delta), target_fps=30, keyframe_interval=10)
+    assert delta.stat().st_size < plain.stat().st_size
+    assert np.array_equal(Video.to_array(str(delta)), Video.to_array(str(plain)))
+
+
+# 逐帧读取的生成器
+
+@pytest.mark.parametrize("prefetch", [False, True])
+@pytest.mark.parametrize("workers", [1, 2])
+def test_iter_frames(tmp_path, prefetch, workers):
+    frames = _frames()
+    expected = _binary(frames)
+    path = _write(tmp_path / "delta.bv", frames, keyframe_interval=4)
+    result = list(Video.iter_frames(str(path), prefetch=prefetch, workers=workers))
+    assert np.array_equal(np.stack(result), expected)
+    result = list(Video.iter_frames(str(path), start=3, stop=20, step=5, prefetch=prefetch, workers=workers))
+    assert np.array_equal(np.stack(result), expected[3:20:5])
+
+
+def test_iter_frames_validates_at_call(tmp_path):
+    from BFile import FileError
+    path = _write(tmp_path / "out.bv", _frames())
+    with pytest.raises(FileError):
+        Video.iter_frames(str(tmp_path / "missing.bv"))
+    with pytest.raises(DecodeError):
+        Video.iter_frames(str(path), step=0)
+    (tmp_path / "short.bv").write_bytes(b"\x00\x01")
+    with pytest.raises(DecodeError):
+        Video.iter_frames(str(tmp_path / "short.bv"))
+    with Video.open(str(path)) as bv:
+        with pytest.raises(DecodeError):
+            bv.iter_frames(step=0)
+
+
+def test_prefetch_stops_when_closed_early(tmp_path):
+    import threading
+    path = _write(tmp_path / "out.bv", _frames())
+    before = threading.active_count()
+    frames = Video.iter_frames(str(path), prefetch=True)
+    next(frames)
+    assert threading.active_count() == before + 1
+    frames.close()
+    assert threading.active_count() == before
+
+
+# 增量写入器
+
+def test_writer_patches_header(tmp_path):
+    frames = _frames(7)
+    path = tmp_path / "out.bv"
+    with BVWriter(str(path), fps=12) as writer:
+        # 每帧写入后立即落盘，文件头在关闭时回填
+        writer.write(frames[0])
+        size = path.stat().st_size
+        assert size > 12
+        for frame in frames[1:]:
+            writer.write(frame)
+        assert path.stat().st_size > size
+        assert struct.unpack(">I", path.read_bytes()[8:12])[0] == 0
+    width, height, fps, count = struct.unpack(">HHII", path.read_bytes()[:12])
+    assert (width, height, fps, count) == (32, 24, 12, 7)
+
+
+def test_writer_accepts_gray_bool_and_bgr(tmp_path):
+    frames = _frames(4)
+    expected = _binary(frames)
+    inputs = [frames[0], frames[1] >= 128]
+    try:
+        import cv2
+        inputs += [cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR) for frame in frames[2:]]
+    except ImportError:
+        inputs += frames[2:]
+    path = _write(tmp_path / "out.bv", inputs)
+    assert np.array_equal(Video.to_array(str(path)), expected)
+
+
+def test_writer_errors(tmp_path):
+    from BFile import EncodeError
+    writer = BVWriter(str(tmp_path / "out.bv"))
+    writer.write(_frames(1)[0])
+    with pytest.raises(EncodeError):
+        writer.write(np.zeros((10, 10), np.uint8))
+    writer.close()
+    writer.close()
+    with pytest.raises(EncodeError):
+        writer.write(_frames(1)[0])
+
+
+def test_header_counts_written_frames(tmp_path):
+    mp4_path = _write_mp4(tmp_path / "input.mp4", 45)
+    path = tmp_path / "out.bv"
+    Video.mp4_to_bv(str(mp4_path), str(path), target_fps=15)
+    # 改动前按CAP_PROP_FRAME_COUNT估算为45 // 2帧，实际写入了23帧
+    data = path.read_bytes()
+    assert struct.unpack(">I", data[8:12])[0] == 23
+    assert data[12:] == _reference_bv(mp4_path, target_fps=15)[12:]
+    assert len(Video.to_array(str(path))) == 23
+
+
+# 多进程流水线
+
+def test_mp4_workers_match_serial(tmp_path, mp4_path):
+    options = {"target_fps": 15, "keyframe_interval": 4, "index": True}
+    Video.mp4_to_bv(str(mp4_path), str(tmp_path / "serial.bv"), **options)
+    Video.mp4_to_bv(str(mp4_path), str(tmp_path / "parallel.bv"), workers=2, **options)
+    assert (tmp_path / "serial.bv").read_bytes() == (tmp_path / "parallel.bv").read_bytes()
+
+
+def test_mp4_workers_stop_reader_on_error(tmp_path, mp4_path):
+    import threading
+    from BFile import Error
+
+    class Stop(Error):
+        pass
+
+    def callback(stats):
+        if stats.frames >= 3:
+            raise Stop("stop")
+
+    before = set(threading.enumerate())
+    with pytest.raises(Stop) as info:
+        Video.mp4_to_bv(str(mp4_path), str(tmp_path / "out.bv"), target_fps=30, workers=2, callback=callback)
+    # 异常对象仍被引用时，读取线程也必须已经结束
+    assert info.value is not None
+    assert set(threading.enumerate()) <= before
+
+
+# 按时间戳重采样
+
+@pytest.mark.parametrize("target_fps,count", [(7, 14), (12, 24), (20, 40), (30, 60), (60, 120)])
+def test_resample_frame_count(tmp_path, mp4_path, target_fps, count):
+    path = tmp_path / "out.bv"
+    stats = Video.mp4_to_bv(str(mp4_path), str(path), target_fps=target_fps)
+    assert stats.frames == count
+    assert len(Video.to_array(str(path))) == count
+
+
+def test_resample_picks_nearest_source_frame(tmp_path, mp4_path):
+    source = tmp_path / "source.bv"
+    path = tmp_path / "out.bv"
+    Video.mp4_to_bv(str(mp4_path), str(source), target_fps=30)
+    Video.mp4_to_bv(str(mp4_path), str(path), target_fps=20)
+    source, result = Video.to_array(str(source)), Video.to_array(str(path))
+    for k, frame in enumerate(result):
+        # 第k个输出时刻为k/20秒，对应源帧1.5k，恰好在两帧正中时取其中之一
+        candidates = {int(np.floor(1.5 * k)), int(np.ceil(1.5 * k))}
+        assert any(np.array_equal(frame, source[j]) for j in candidates if j < len(source))
+
+
+# BV转MP4
+
+def test_bv_to_mp4_round_trip(tmp_path, monkeypatch):
+    pytest.importorskip("cv2")
+    # 使用OpenCV的编码器，不依赖系统中的ffmpeg
+    monkeypatch.setattr("BFile.bv._find_ffmpeg", lambda: None)
+    frames = _frames()
+    path = _write(tmp_path / "in.bv", frames)
+    stats = Video.bv_to_mp4(str(path), str(tmp_path / "out.mp4"))
+    assert stats.frames == len(frames)
+    Video.mp4_to_bv(str(tmp_path / "out.mp4"), str(tmp_path / "back.bv"))
+    back = Video.to_array(str(tmp_path / "back.bv"))
+    # 有损编码后二值化的结果应与原帧基本一致
+    assert back.shape == (len(frames), 24, 32)
+    assert (back == _binary(frames)).mean() > 0.95
+
+
+def _fake_ffmpeg(tmp_path, body):
+    """写入一个代替ffmpeg的Python脚本，最后一个参数为输出路径"""
+    import sys
+    script = tmp_path / "ffmpeg"
+    script.write_text(f"#!{sys.executable}\nimport sys\n{body}\n")
+    script.chmod(0o755)
+    return str(script)
+
+
+def test_bv_to_mp4_ffmpeg_verbose_stderr(tmp_path, monkeypatch):
+    import threading
+    # 先写出远超管道缓冲区的错误输出，再读取全部帧
+    ffmpeg = _fake_ffmpeg(tmp_path, "sys.stderr.write('x' * (1 << 20)); sys.stderr.flush()\n"
+                                    "data = sys.stdin.buffer.read()\n"
+                                    "open(sys.argv[-1], 'wb').write(data)")
+    monkeypatch.setattr("BFile.bv._find_ffmpeg", lambda: ffmpeg)
+    frames = _frames(200, width=64, height=48)
+    path = _write(tmp_path / "in.bv", frames)
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(
+        stats=Video.bv_to_mp4(str(path), str(tmp_path / "out.mp4"))), daemon=True)
+    thread.start()
+    thread.join(timeout=60)
+    assert not thread.is_alive(), "ffmpeg的错误输出阻塞了帧的写入"
+    assert result["stats"].frames == 200
+    assert (tmp_path / "out.mp4").stat().st_size == 200 * 64 * 48
+
+
+def test_bv_to_mp4_ffmpeg_exits_early(tmp_path, monkeypatch):
+    from BFile import EncodeError
+    ffmpeg = _fake_ffmpeg(tmp_path, "sys.stderr.write('unknown encoder libx264'); sys.exit(1)")
+    monkeypatch.setattr("BFile.bv._find_ffmpeg", lambda: ffmpeg)
+    path = _write(tmp_path / "in.bv", _frames(200, width=64, height=48))
+    with pytest.raises(EncodeError, match="unknown encoder libx264"):
+        Video.bv_to_mp4(str(path), str(tmp_path / "out.mp4"))
+
+
+# 内存映射读取
+
+@pytest.mark.parametrize("options", [{}, {"index": True}, {"keyframe_interval": 5}])
+def test_open_reads_frames(tmp_path, options):
+    frames = _frames()
+    expected = _binary(frames)
+    path = _write(tmp_path / "out.bv", frames, **options)
+    with Video.open(str(path)) as bv:
+        assert (len(bv), bv.width, bv.height, bv.fps) == (len(frames), 32, 24, 10)
+        assert np.array_equal(bv.read_frame(13), expected[13])
+        order = [20, 2, 2, 11, 0]
+        assert all(np.array_equal(a, expected[n]) for n, a in zip(order, bv.read_frames(order)))
+        assert np.array_equal(np.stack(list(bv.iter_frames())), expected)
+        with pytest.raises(DecodeError):
+            bv.read_frame(len(frames))
+
+
+def test_open_returns_zero_copy_slices(tmp_path):
+    path = _write(tmp_path / "out.bv", _frames(), index=True)
+    with Video.open(str(path)) as bv:
+        offset, frame_size, _, _ = bv._reader.locate(5)
+        payload = bv._reader.payload(offset, frame_size)
+        # 帧数据是映射上的切片，不是读出的副本
+        assert isinstance(payload, memoryview)
+        assert payload.obj is bv._mmap
+        assert payload.readonly
+        assert bytes(payload) == path.read_bytes()[offset:offset + frame_size]
+        del payload
+
+
+def test_open_errors_and_close(tmp_path):
+    from BFile import FileError
+    with pytest.raises(FileError):
+        Video.open(str(tmp_path / "missing.bv"))
+    (tmp_path / "short.bv").write_bytes(b"\x00\x01")
+    with pytest.raises(DecodeError):
+        Video.open(str(tmp_path / "short.bv"))
+
+    bv = Video.open(str(_write(tmp_path / "out.bv", _frames())))
+    bv.read_frame(0)
+    bv.close()
+    assert bv._mmap is None and bv._file is None
+    # 重复关闭不报错
+    bv.close()
+
+
+# 重复帧去重
+
+def _loop_frames(period=6, repeats=4):
+    """循环播放的噪声动画，重复的帧互不相邻"""
+    rng = np.random.RandomState(1)
+    cycle = [rng.randint(0, 2, (24, 32)).astype(np.uint8) * 255 for _ in range(period)]
+    return cycle * repeats
+
+
+@pytest.mark.parametrize("options", [{}, {"keyframe_interval": 4}, {"index": True}])
+def test_dedup_round_trip(tmp_path, options):
+    frames = _loop_frames()
+    expected = _binary(frames)
+    plain = _write(tmp_path / "plain.bv", frames, **options).stat().st_size
+    path = _write(tmp_path / "dedup.bv", frames, dedup=True, **options)
+    assert _frame_types(path)["ref"] == 18
+    assert path.stat().st_size < plain / 2
+    assert np.array_equal(Video.to_array(str(path)), expected)
+    # 随机读取引用帧时解码被引用的帧
+    order = [23, 7, 0, 14, 14, 5]
+    assert all(np.array_equal(a, expected[n]) for n, a in zip(order, Video.read_frames(str(path), order)))
+    with Video.open(str(path)) as bv:
+        assert np.array_equal(np.stack(list(bv.iter_frames(workers=2))), expected)
+
+
+def test_dedup_reuses_decoded_frame(tmp_path):
+    path = _write(tmp_path / "dedup.bv", _loop_frames(), dedup=True)
+    with Video.open(str(path)) as bv:
+        first = bv.read_frame(2)
+        assert bv.read_frame(8) is first
+        assert bv.read_frame(20) is first
+
+
+def test_dedup_mp4_workers_match_serial(tmp_path, mp4_path):
+    # 合成视频的最后4帧回到开头的画面
+    serial = tmp_path / "serial.bv"
+    parallel = tmp_path / "parallel.bv"
+    Video.mp4_to_bv(str(mp4_path), str(serial), dedup=True)
+    Video.mp4_to_bv(str(mp4_path), str(parallel), dedup=True, workers=2)
+    assert _frame_types(serial)["ref"] > 0
+    assert serial.read_bytes() == parallel.read_bytes()
+
+
+# 可变帧率
+
+def _held_frames():
+    """每个画面保持不同的帧数，返回(帧列表, 各画面的持续帧数)"""
+    durations = [3, 1, 5, 2, 1, 4]
+    frames = []
+    for i, duration in enumerate(durations):
+        frame = np.zeros((24, 32), np.uint8)
+        frame[4:20, i * 4:i * 4 + 4] = 255
+        frames += [frame] * duration
+    return frames, durations
+
+
+@pytest.mark.parametrize("options", [{}, {"index": True}, {"keyframe_interval": 3}])
+def test_vfr_merges_held_frames(tmp_path, options):
+    frames, durations = _held_frames()
+    expected = _binary(frames)
+    path = _write(tmp_path / "vfr.bv", frames, vfr=True, **options)
+    assert path.stat().st_size < _write(tmp_path / "cfr.bv", frames, **options).stat().st_size
+    with Video.open(str(path)) as bv:
+        assert (bv.frame_count, bv.tick_count) == (len(durations), len(frames))
+    # 默认展开为恒定帧率，expand=False时每条帧记录只输出一次
+    assert np.array_equal(Video.to_array(str(path)), expected)
+    stored = np.stack(list(Video.iter_frames(str(path), expand=False)))
+    assert np.array_equal(stored, expected[np.cumsum([0] + durations[:-1])])
+    assert np.array_equal(np.stack(list(Video.iter_frames(str(path), start=2, step=3))), expected[2::3])
+
+
+def test_vfr_read_frame_by_tick(tmp_path):
+    frames, durations = _held_frames()
+    expected = _binary(frames)
+    path = _write(tmp_path / "vfr.bv", frames, vfr=True)
+    # 默认按存储的帧记录计
+    assert np.array_equal(Video.read_frame(str(path), 2), expected[4])
+    ticks = [15, 0, 4, 9, 8, 3]
+    result = Video.read_frames(str(path), ticks, tick=True)
+    assert all(np.array_equal(a, expected[t]) for t, a in zip(ticks, result))
+    with Video.open(str(path)) as bv:
+        assert all(np.array_equal(bv.read_frame(t, tick=True), expected[t]) for t in range(len(frames)))
+        with pytest.raises(DecodeError):
+            bv.read_frame(len(frames), tick=True)
+        with pytest.raises(DecodeError):
+            bv.read_frame(len(durations))
+
+
+def test_tick_read_on_constant_rate_file(tmp_path):
+    frames = _frames()
+    path = _write(tmp_path / "cfr.bv", frames)
+    assert np.array_equal(Video.read_frame(str(path), 7, tick=True), _binary(frames)[7])
+
+
+# 解码为数组
+
+@pytest.mark.parametrize("packed", [False, True])
+@pytest.mark.parametrize("options", [{}, {"keyframe_interval": 5, "dedup": True}, {"vfr": True}])
+def test_to_array_workers_match_serial(tmp_path, packed, options):
+    frames = _frames(40) + _held_frames()[0]
+    path = _write(tmp_path / "out.bv", frames, **options)
+    expected = _binary(frames)
+    expected = np.packbits(expected, axis=-1) if packed else expected
+    for expand in (True, False):
+        serial = Video.to_array(str(path), packed=packed, expand=expand)
+        parallel = Video.to_array(str(path), workers=2, packed=packed, expand=expand)
+        assert serial.shape == parallel.shape
+        assert np.array_equal(serial, parallel)
+        if expand:
+            assert np.array_equal(parallel, expected)
+
+
+def test_to_array_workers_keeps_shared_buffer(tmp_path):
+    import gc
+    import subprocess
+    import sys
+    frames = _frames(40)
+    path = _write(tmp_path / "out.bv", frames)
+    result = Video.to_array(str(path), workers=2)
+    # 结果直接使用共享内存，切片在原数组释放后仍然有效
+    assert not result.flags.owndata
+    tail = result[-4:]
+    del result
+    gc.collect()
+    tail[0, 0, 0] ^= 1
+    tail[0, 0, 0] ^= 1
+    assert np.array_equal(tail, _binary(frames)[-4:])
+
+    # 进程退出时resource_tracker不应报告泄漏的共享内存
+    code = "import BFile, sys; BFile.Video.to_array(sys.argv[1], workers=2)"
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+    done = subprocess.run([sys.executable, "-c", code, str(path)], cwd=root, capture_output=True, text=True)
+    assert done.returncode == 0, done.stderr
+    assert "leaked" not in done.stderr
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_to_array_callback(tmp_path, workers):
+    path = _write(tmp_path / "vfr.bv", _held_frames()[0], vfr=True)
+    calls = []
+    result = Video.to_array(str(path), workers=workers, callback=lambda stats: calls.append(stats.frames))
+    # 单进程时每帧调用一次，多进程时每个帧范围调用一次，帧数单调递增到展开后的帧数
+    assert calls == sorted(calls) and calls[-1] == len(result) == 16
+    if workers == 1:
+        assert calls == list(range(1, 17))
+
+
+def test_writer_reuses_buffers_safely(tmp_path):
+    # 调用方复用同一个数组写入每一帧，写入器内部的缓冲区也在复用，前一帧和待合并的帧不能被覆盖
+    frames = _frames(40) + _held_frames()[0]
+    source = np.empty_like(frames[0])
+    for options in ({"keyframe_interval": 4}, {"vfr": True, "dedup": True}):
+        with BVWriter(str(tmp_path / "out.bv"), fps=10, **options) as writer:
+            for frame in frames:
+                source[:] = frame
+                writer.write(source)
+        assert np.array_equal(Video.to_array(str(tmp_path / "out.bv")), _binary(frames))
+
+
+# 缩放与裁剪
+
+@pytest.mark.parametrize("options, shape", [
+    ({"target_size": (16, None)}, (12, 16)),
+    ({"target_size": (None, 6)}, (6, 8)),
+    ({"target_size": (10, 10)}, (10, 10)),
+    ({"crop": (4, 2, 20, 16)}, (16, 20)),
+    ({"crop": (4, 2, 20, 16), "target_size": (10, None)}, (8, 10)),
+])
+def test_resize_and_crop_shape(tmp_path, mp4_path, options, shape):
+    output = tmp_path / "out.bv"
+    Video.mp4_to_bv(str(mp4_path), str(output), **options)
+    with Video.open(str(output)) as bv:
+        assert (bv.height, bv.width) == shape
+        assert len(bv) == 20
+
+
+def test_crop_keeps_source_pixels(tmp_path, mp4_path):
+    full = tmp_path / "full.bv"
+    cropped = tmp_path / "cropped.bv"
+    Video.mp4_to_bv(str(mp4_path), str(full))
+    Video.mp4_to_bv(str(mp4_path), str(cropped), crop=(4, 2, 20, 16))
+    assert np.array_equal(Video.to_array(str(cropped)), Video.to_array(str(full))[:, 2:18, 4:24])
+
+
+def test_auto_crop_to_content(tmp_path, mp4_path):
+    # 竖条只出现在第4到19行，水平方向移动到第0到30列
+    auto = tmp_path / "auto.bv"
+    manual = tmp_path / "manual.bv"
+    Video.mp4_to_bv(str(mp4_path), str(auto), auto_crop=True)
+    Video.mp4_to_bv(str(mp4_path), str(manual), crop=(0, 4, 31, 16))
+    assert Video.to_array(str(auto)).shape == (20, 16, 31)
+    assert auto.read_bytes() == manual.read_bytes()
+
+
+def test_crop_errors(tmp_path, mp4_path):
+    from BFile import EncodeError
+    with pytest.raises(EncodeError):
+        Video.mp4_to_bv(str(mp4_path), str(tmp_path / "out.bv"), crop=(20, 0, 20, 10))
+    with pytest.raises(EncodeError):
+        Video.mp4_to_bv(str(mp4_path), str(tmp_path / "out.bv"), crop=(0, 0, 8, 8), auto_crop=True)
+    with pytest.raises(EncodeError):
+        Video.mp4_to_bv(str(mp4_path), str(tmp_path / "out.bv"), target_size=(0, 8))
+
+
+# 截取片段
+
+@pytest.mark.parametrize("options, frames", [
+    ({"start": 0.5, "end": 1.5}, slice(5, 15)),
+    ({"start": 1.0}, slice(10, 20)),
+    ({"end": 0.8}, slice(0, 8)),
+    ({"start": 15, "end": 45, "by_frame": True}, slice(5, 15)),
+])
+def test_clip_frame_count(tmp_path, mp4_path, options, frames):
+    full = tmp_path / "full.bv"
+    clip = tmp_path / "clip.bv"
+    Video.mp4_to_bv(str(mp4_path), str(full))
+    stats = Video.mp4_to_bv(str(mp4_path), str(clip), **options)
+    expected = Video.to_array(str(full))[frames]
+    assert stats.frames == len(expected)
+    assert np.array_equal(Video.to_array(str(clip)), expected)
+
+
+def test_clip_range_errors(tmp_path, mp4_path):
+    from BFile import EncodeError
+    for options in ({"start": 1.0, "end": 1.0}, {"start": -1}, {"start": 30, "end": 20, "by_frame": True}):
+        with pytest.raises(EncodeError):
+            Video.mp4_to_bv(str(mp4_path), str(tmp_path / "out.bv"), **options)
+
+
+def test_clip_stops_reading_at_end(tmp_path, mp4_path, monkeypatch):
+    import BFile.bv
+    grabbed = []
+
+    class Counting:
+        def __init__(self, cap):
+            self.cap = cap
+
+        def __getattr__(self, name):
+            return getattr(self.cap, name)
+
+        def grab(self):
+            grabbed.append(1)
+            return self.cap.grab()
+
+    open_capture = BFile.bv._open_capture
+    monkeypatch.setattr(BFile.bv, "_open_capture", lambda path: Counting(open_capture(path)))
+    Video.mp4_to_bv(str(mp4_path), str(tmp_path / "clip.bv"), end=0.5)
+    # 源视频共60帧，片段只需要读到第15帧附近
+    assert 0 < len(grabbed) < 20
+
+
+# 多输出编码
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_renditions_match_separate_runs(tmp_path, mp4_path, workers):
+    outputs = [
+        {"path": str(tmp_path / "full.bv")},
+        {"path": str(tmp_path / "small.bv"), "target_size": (16, None), "threshold": 100},
+        {"path": str(tmp_path / "slow.bv"), "target_fps": 5, "threshold": 200},
+    ]
+    results = Video.mp4_to_bv(str(mp4_path), outputs, keyframe_interval=4, workers=workers)
+    assert [stats.frames for stats in results] == [20, 20, 10]
+    assert [stats.output_path for stats in results] == [output["path"] for output in outputs]
+    for output in outputs:
+        single = tmp_path / "single.bv"
+        options = {key: value for key, value in output.items() if key != "path"}
+        Video.mp4_to_bv(str(mp4_path), str(single), keyframe_interval=4, **options)
+        assert open(output["path"], "rb").read() == single.read_bytes()
+
+
+def test_renditions_decode_source_once(tmp_path, mp4_path, monkeypatch):
+    import BFile.bv
+    opened = []
+    open_capture = BFile.bv._open_capture
+    monkeypatch.setattr(BFile.bv, "_open_capture", lambda path: opened.append(path) or open_capture(path))
+    Video.mp4_to_bv(str(mp4_path), [str(tmp_path / "a.bv"), {"path": str(tmp_path / "b.bv"), "target_fps": 15}])
+    # 一次读取视频信息，一次解码帧
+    assert len(opened) == 2
+
+
+def test_rendition_spec_errors(tmp_path, mp4_path):
+    from BFile import EncodeError
+    for outputs in ([], [{"target_fps": 5}], [{"path": str(tmp_path / "a.bv"), "size": (8, 8)}]):
+        with pytest.raises(EncodeError):
+            Video.mp4_to_bv(str(mp4_path), outputs)
+
+
+# 文件大小上限
+
+@pytest.fixture
+def noise_mp4(tmp_path):
+    """64x48、30fps、60帧的噪声视频，压缩率很低"""
+    cv2 = pytest.importorskip("cv2")
+    path = tmp_path / "noise.mp4"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), 30, (64, 48))
+    if not writer.isOpened():
+        pytest.skip("OpenCV没有可用的mp4v编码器")
+    rng = np.random.RandomState(0)
+    for _ in range(60):
+        # 4x4的噪声块，避免有损编码把噪声抹平
+        block = rng.randint(0, 2, (12, 16)).astype(np.uint8) * 255
+        writer.write(cv2.cvtColor(np.kron(block, np.ones((4, 4), np.uint8)), cv2.COLOR_GRAY2BGR))
+    writer.release()
+    return path
+
+
+@pytest.mark.parametrize("ratio", [0.5, 0.2])
+def test_max_bytes_within_budget(tmp_path, noise_mp4, ratio):
+    plain = Video.mp4_to_bv(str(noise_mp4), str(tmp_path / "plain.bv"))
+    budget = int(plain.bytes_out * ratio)
+    stats = Video.mp4_to_bv(str(noise_mp4), str(tmp_path / "out.bv"), max_bytes=budget)
+    assert (tmp_path / "out.bv").stat().st_size <= budget
+    assert stats.frames > 0
+    with Video.open(str(tmp_path / "out.bv")) as bv:
+        # 先降低分辨率，最低到1/4
+        assert bv.width < 64 and bv.width >= 16
+
+
+def test_max_bytes_per_rendition(tmp_path, noise_mp4):
+    plain = Video.mp4_to_bv(str(noise_mp4), str(tmp_path / "plain.bv"))
+    budget = plain.bytes_out // 3
+    Video.mp4_to_bv(str(noise_mp4), [str(tmp_path / "full.bv"), {"path": str(tmp_path / "small.bv"), "max_bytes": budget}])
+    assert (tmp_path / "full.bv").read_bytes() == (tmp_path / "plain.bv").read_bytes()
+    assert (tmp_path / "small.bv").stat().st_size <= budget
+
+
+def test_max_bytes_unreachable(tmp_path, noise_mp4):
+    from BFile import EncodeError
+    with pytest.raises(EncodeError):
+        Video.mp4_to_bv(str(noise_mp4), str(tmp_path / "out.bv"), max_bytes=100)
+
+
+# 实时采集
+
+def test_capture_finite_generator(tmp_path):
+    frames = _frames(30)
+    stats = Video.capture_to_bv(iter(frames), str(tmp_path / "out.bv"), target_fps=1000)
+    # 可迭代对象默认按有限的来源处理，每一项编码为一帧，不丢帧
+    assert not stats.live
+    assert (stats.frames, stats.captured, stats.dropped, stats.skipped) == (30, 30, 0, 0)
+    assert np.array_equal(Video.to_array(str(tmp_path / "out.bv")), _binary(frames))
+
+
+def test_capture_finite_file(tmp_path, mp4_path):
+    stats = Video.capture_to_bv(str(mp4_path), str(tmp_path / "capture.bv"))
+    Video.mp4_to_bv(str(mp4_path), str(tmp_path / "convert.bv"))
+    assert not stats.live
+    assert (stats.frames, stats.dropped, stats.skipped) == (20, 0, 0)
+    assert np.array_equal(Video.to_array(str(tmp_path / "capture.bv")), Video.to_array(str(tmp_path / "convert.bv")))
+
+
+def test_capture_finite_limits(tmp_path):
+    import threading
+    stats = Video.capture_to_bv(iter(_frames(30)), str(tmp_path / "out.bv"), max_frames=12)
+    assert stats.frames == 12
+    stop = threading.Event()
+    stop.set()
+    assert Video.capture_to_bv(iter(_frames(30)), str(tmp_path / "out.bv"), stop_event=stop).frames == 0
+
+
+def _timed_frames(count, interval):
+    """按固定间隔产生帧的实时来源"""
+    import time
+    for frame in _frames(count):
+        time.sleep(interval)
+        yield frame
+
+
+def test_capture_live_drops_stale_frames(tmp_path):
+    # 来源约200fps，只按20fps取最新一帧
+    stats = Video.capture_to_bv(_timed_frames(100, 0.005), str(tmp_path / "out.bv"), target_fps=20, live=True)
+    assert stats.live
+    assert stats.captured == 100
+    assert stats.dropped > 50
+    assert stats.frames + stats.dropped == stats.captured
+    assert 10 <= stats.fps <= 30
+    with Video.open(str(tmp_path / "out.bv")) as bv:
+        assert len(bv) == stats.frames
+
+
+def test_capture_live_skips_ticks_when_behind(tmp_path):
+    import time
+    # 每帧编码后等待0.15秒，远超20fps的帧间隔和延迟预算
+    stats = Video.capture_to_bv(_timed_frames(400, 0.002), str(tmp_path / "out.bv"), target_fps=20,
+                                max_latency=0.05, max_frames=4, vfr=True, live=True,
+                                callback=lambda stats: time.sleep(0.15))
+    assert stats.frames == 4
+    assert stats.skipped > 0
+    # 可变帧率时跳过的帧时刻延长上一帧，时间轴与实际时间一致
+    with Video.open(str(tmp_path / "out.bv")) as bv:
+        assert bv.tick_count == stats.frames + stats.skipped
+
+
+# 图像序列
+
+def _save_pngs(directory, frames):
+    """以不补零的序号保存，按字符串排序时顺序会错乱"""
+    from PIL import Image as PILImage
+    directory.mkdir()
+    for i, frame in enumerate(frames):
+        PILImage.fromarray(frame).save(str(directory / f"frame_{i}.png"))
+    return directory
+
+
+@pytest.mark.parametrize("options", [{}, {"keyframe_interval": 4, "dedup": True}])
+def test_from_images(tmp_path, options):
+    frames = _frames(24)
+    directory = _save_pngs(tmp_path / "frames", frames)
+    serial = tmp_path / "serial.bv"
+    parallel = tmp_path / "parallel.bv"
+    stats = Video.from_images(str(directory / "*.png"), str(serial), **options)
+    Video.from_images(str(directory / "*.png"), str(parallel), workers=2, **options)
+    assert stats.frames == 24
+    assert np.array_equal(Video.to_array(str(serial)), _binary(frames))
+    assert serial.read_bytes() == parallel.read_bytes()
+    assert serial.read_bytes() == _write(tmp_path / "writer.bv", frames, **options).read_bytes()
+
+
+def test_from_images_keeps_list_order(tmp_path):
+    frames = _frames(10)
+    directory = _save_pngs(tmp_path / "frames", frames)
+    order = [9, 3, 0, 5]
+    Video.from_images([str(directory / f"frame_{i}.png") for i in order], str(tmp_path / "out.bv"), workers=2)
+    assert np.array_equal(Video.to_array(str(tmp_path / "out.bv")), _binary(frames)[order])
+
+
+def test_from_images_missing(tmp_path):
+    from BFile import FileError
+    with pytest.raises(FileError):
+        Video.from_images(str(tmp_path / "*.png"), str(tmp_path / "out.bv"))
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_to_images(tmp_path, workers):
+    from PIL import Image as PILImage
+    frames, _ = _held_frames()
+    path = _write(tmp_path / "vfr.bv", frames, vfr=True)
+    paths = Video.to_images(str(path), str(tmp_path / "out" / "f_{:03d}.png"), workers=workers)
+    assert paths == [str(tmp_path / "out" / f"f_{i:03d}.png") for i in range(len(frames))]
+    saved = np.stack([np.array(PILImage.open(p).convert("L")) for p in paths])
+    assert np.array_equal(saved // 255, _binary(frames))
+    # 不展开时每条帧记录保存一张
+    stored = Video.to_images(str(path), str(tmp_path / "stored" / "f_{:03d}.png"), workers=workers, expand=False)
+    assert len(stored) == 6
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_to_images_stats(tmp_path, workers):
+    path = _write(tmp_path / "out.bv", _frames(24))
+    calls = []
+    paths = Video.to_images(str(path), str(tmp_path / "f_{:03d}.png"), workers=workers,
+                            callback=lambda stats: calls.append((stats.frames, stats.bytes_out, stats.times["write"])))
+    frames, bytes_out, write_time = calls[-1]
+    assert frames == 24
+    assert bytes_out == sum(os.path.getsize(p) for p in paths)
+    assert write_time > 0
+    assert [call[0] for call in calls] == sorted(call[0] for call in calls)
+    if workers == 1:
+        assert len(calls) == 24
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""bfile命令行工具的测试"""
+
+import json
+
+import numpy as np
+
+from BFile import BVWriter
+from BFile.cli import main
+
+
+def _write(path, count=12, **options):
+    """移动竖条的BV文件，每个位置停留两帧"""
+    with BVWriter(str(path), fps=10, **options) as writer:
+        for i in range(count):
+            frame = np.zeros((12, 16), np.uint8)
+            frame[2:10, i // 2:i // 2 + 4] = 255
+            writer.write(frame)
+    return path
+
+
+def _json_lines(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_inspect_json(tmp_path, capsys):
+    _write(tmp_path / "a.bv", keyframe_interval=4)
+    _write(tmp_path / "b.bv", vfr=True)
+    (tmp_path / "c.bv").write_bytes(b"BV")
+    (tmp_path / "notes.txt").write_text("不是BV文件")
+
+    # 目录按名称顺序展开，出错的文件输出一行错误并以1退出
+    assert main(["inspect", "--json", str(tmp_path)]) == 1
+    a, b, c = _json_lines(capsys)
+    assert a["path"] == str(tmp_path / "a.bv")
+    assert (a["format"], a["width"], a["height"], a["frame_count"]) == ("BV", 16, 12, 12)
+    assert a["frame_types"]["key"] >= 3 and sum(a["frame_types"].values()) == 12
+    assert "frame_sizes" not in a
+    assert b["frame_count"] == 6 and b["tick_count"] == 12
+    assert "vfr" in b["flags"] and "frame_durations" not in b
+    assert c == {"path": str(tmp_path / "c.bv"), "error": c["error"]}
+
+    assert main(["inspect", "--json", "--frames", "--deep", str(tmp_path / "b.bv")]) == 0
+    (b,) = _json_lines(capsys)
+    assert b["frame_durations"] == [2] * 6
+    assert len(b["frame_sizes"]) == 6 and sum(b["frame_sizes"]) == b["payload_bytes"]
+    assert sum(b["run_histogram"].values()) > 0 and b["decode_seconds"] >= 0
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""BFile.core 游程编码与LZ77压缩的测试"""
+
+import hashlib
+import logging
+
+import numpy as np
+import pytest
+
+from BFile.core import (
+    logger,
+    set_verbosity,
+    encode_run_length,
+    decode_run_length,
+    compress_data,
+    decompress_data
+)
+
+
+def _patterns():
+    """确定性的48x64二值图像"""
+    yy, xx = np.mgrid[0:48, 0:64]
+    return {
+        "blank": np.zeros((48, 64), np.uint8),
+        "full": np.ones((48, 64), np.uint8),
+        "checker": ((yy // 4 + xx // 4) % 2).astype(np.uint8),
+        "diagonal": ((xx + 2 * yy) % 23 < 9).astype(np.uint8),
+        "noise": np.random.RandomState(0).randint(0, 2, (48, 64)).astype(np.uint8),
+    }
+
+
+# 改动前的编码器对_patterns()各图像输出的(大小, SHA-256)，编码结果必须保持逐字节一致
+GOLDEN = {
+    "blank": (26, "7d45d475eaff9b25376ce9ff263e2041417b41b9074deacf75403ca750f99399"),
+    "full": (26, "a924c065eb5cafef95777b6493cdc9123434f77fa9dbeafb424f1401dc10ceff"),
+    "checker": (36, "603b94b26fa07173bf5a3ba6017a47862131e88cb555724d2a65e43d01dcf87f"),
+    "diagonal": (84, "774d1dfd7da643cc81cb09b914f924293151ec3f15e0541db72379c2cacf29f1"),
+    "noise": (1040, "b57fe609b09d018629cae3eac5e9f086f5880e7b2f8e12aa457c6d1da06265dc"),
+}
+
+
+@pytest.mark.parametrize("name", sorted(GOLDEN))
+def test_encoding_matches_golden(name):
+    data = compress_data(encode_run_length(_patterns()[name].ravel()))
+    assert (len(data), hashlib.sha256(data).hexdigest()) == GOLDEN[name]
+
+
+@pytest.mark.parametrize("name", sorted(GOLDEN))
+def test_round_trip(name):
+    image = _patterns()[name]
+    encoded = decompress_data(compress_data(encode_run_length(image.ravel())))
+    decoded = decode_run_length(encoded, image.size)
+    assert np.array_equal(decoded.reshape(image.shape), image)
+
+
+@pytest.mark.parametrize("data", [b"", b"a", b"abcabcabcabcabcabc", bytes(range(256)) * 40])
+def test_lz77_round_trip(data):
+    assert decompress_data(compress_data(data)) == data
+
+
+def test_decode_run_length_fixes_length():
+    # 0x31: 3个1, 0x20: 2个0
+    data = bytes([1, 0x31, 0x20])
+    assert decode_run_length(data, 5).tolist() == [1, 1, 1, 0, 0]
+    assert decode_run_length(data, 4).tolist() == [1, 1, 1, 0]
+    # 长度不够时用最后一个位填充
+    assert decode_run_length(data, 7).tolist() == [1, 1, 1, 0, 0, 0, 0]
+    assert decode_run_length(bytes([1]), 3).tolist() == [1, 1, 1]
+    assert decode_run_length(data, 5).dtype == np.uint8
+
+
+def test_set_verbosity(capsys):
+    level, handlers = logger.level, list(logger.handlers)
+    try:
+        logger.info("隐藏")
+        assert capsys.readouterr().err == ""
+        set_verbosity("INFO")
+        set_verbosity(logging.DEBUG)
+        # 多次调用只添加一个处理器
+        assert len(logger.handlers) == len(handlers) + 1
+        assert logger.level == logging.DEBUG
+        logger.info("可见")
+        assert capsys.readouterr().err == "BFile: 可见\n"
+        set_verbosity(logging.WARNING)
+        logger.info("隐藏")
+        assert capsys.readouterr().err == ""
+    finally:
+        logger.setLevel(level)
+        logger.handlers[:] = handlers
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""BFile_Micro播放器的测试，在CPython上以替身模块代替MicroPython的machine和framebuf"""
+
+import sys
+import types
+
+import numpy as np
+import pytest
+
+for _name in ("machine", "framebuf"):
+    if _name not in sys.modules:
+        _module = types.ModuleType(_name)
+        _module.Pin = _module.SPI = object
+        sys.modules[_name] = _module
+
+from BFile import BVWriter
+from BFile_Micro.bv import BV
+
+
+class _Display:
+    """记录每次show时点亮的像素"""
+
+    width = 128
+    height = 128
+
+    def __init__(self):
+        self.pixels = set()
+        self.shown = []
+
+    def fill(self, color):
+        self.pixels = set()
+
+    def pixel(self, x, y, color):
+        self.pixels.add((x, y))
+
+    def fill_rect(self, x, y, w, h, color):
+        self.pixels.add((x, y))
+
+    def show(self):
+        self.shown.append(frozenset(self.pixels))
+
+
+def _frames(count=24):
+    frames = []
+    for i in range(count):
+        frame = np.zeros((16, 20), np.uint8)
+        frame[2:14, (i // 2) % 16:(i // 2) % 16 + 4] = 255
+        frames.append(frame)
+    return frames
+
+
+def _decode_all(path, cache_size=10):
+    """用Micro播放器顺序解码全部帧记录，返回(帧列表, 持续时长列表)"""
+    player = BV(_Display())
+    player.max_cache_size = cache_size
+    assert player.load_bv_video(str(path))
+    frames, durations = [], []
+    with open(str(path), "rb") as f:
+        f.read(12)
+        for n in range(player.total_frames):
+            width, height, binary = player.load_bv_frame(f, n)
+            assert binary is not None
+            frames.append(np.frombuffer(bytes(binary), np.uint8).reshape(height, width))
+            durations.append(player.frame_duration)
+    return frames, durations
+
+
+def _write(path, frames, **options):
+    with BVWriter(str(path), fps=10, **options) as writer:
+        for frame in frames:
+            writer.write(frame)
+    return path
+
+
+def _binary(frames):
+    return [(frame >= 128).astype(np.uint8) for frame in frames]
+
+
+def test_plays_indexed_file(tmp_path):
+    frames = _frames()
+    decoded, _ = _decode_all(_write(tmp_path / "indexed.bv", frames, index=True))
+    assert all(np.array_equal(a, b) for a, b in zip(decoded, _binary(frames)))
+
+
+def test_rejects_unknown_flags(tmp_path):
+    path = _write(tmp_path / "out.bv", _frames())
+    data = bytearray(path.read_bytes())
+    data[4] |= 0x80
+    path.write_bytes(bytes(data))
+    assert not BV(_Display()).load_bv_video(str(path))
+
+
+def test_plays_delta_frames(tmp_path):
+    frames = _frames()
+    decoded, _ = _decode_all(_write(tmp_path / "delta.bv", frames, keyframe_interval=5))
+    assert all(np.array_equal(a, b) for a, b in zip(decoded, _binary(frames)))
+
+
+def test_loop_playback_repeats_delta_frames(tmp_path, monkeypatch):
+    monkeypatch.setattr("time.sleep", lambda seconds: None)
+    path = _write(tmp_path / "delta.bv", _frames(), keyframe_interval=5)
+    display = _Display()
+    player = BV(display)
+    player.max_cache_size = 3
+    assert player.play_bv_video(str(path), loop=2)
+    half = len(display.shown) // 2
+    assert display.shown[:half] == display.shown[half:]
+
+
+@pytest.mark.parametrize("cache_size", [2, 10])
+def test_plays_ref_frames(tmp_path, cache_size):
+    # 周期为6的循环，缓存较小时被引用的帧已被淘汰，需要从头重新解码
+    frames = _frames(6) * 4
+    path = _write(tmp_path / "dedup.bv", frames, dedup=True, keyframe_interval=4)
+    decoded, _ = _decode_all(path, cache_size)
+    assert len(decoded) == len(frames)
+    assert all(np.array_equal(a, b) for a, b in zip(decoded, _binary(frames)))
+
+
+def test_plays_vfr_durations(tmp_path):
+    frames = _frames(20)
+    decoded, durations = _decode_all(_write(tmp_path / "vfr.bv", frames, vfr=True, keyframe_interval=3))
+    # _frames中每个画面保持两帧
+    assert durations == [2] * 10
+    assert all(np.array_equal(a, b) for a, b in zip(decoded, _binary(frames)[::2]))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""共享内存帧传递的测试"""
+
+import os
+import subprocess
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from BFile import Video, BVWriter, SharedFrameProducer, SharedFrameConsumer, DecodeError
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+# 独立启动的消费者进程：读完全部帧后输出每帧点亮的像素数
+CONSUMER = """
+import sys
+from BFile import SharedFrameConsumer
+with SharedFrameConsumer(sys.argv[1], consumer_id=0, timeout=30) as consumer:
+    print(" ".join(str(int(frame.sum())) for frame in consumer.frames(timeout=30)), flush=True)
+"""
+
+
+def _frames(count=20):
+    frames = []
+    for i in range(count):
+        frame = np.zeros((12, 16), np.uint8)
+        frame[2:10, i % 12:i % 12 + 4] = 255
+        frame[0, :i % 16] = 255
+        frames.append(frame)
+    return frames
+
+
+def _write(path, frames, **options):
+    with BVWriter(str(path), fps=10, **options) as writer:
+        for frame in frames:
+            writer.write(frame)
+    return path
+
+
+def test_consumer_in_same_process(tmp_path):
+    path = _write(tmp_path / "out.bv", _frames(), keyframe_interval=4)
+    with SharedFrameProducer(16, 12, slots=32) as producer:
+        assert producer.publish_file(str(path)) == 20
+        producer.finish()
+        with SharedFrameConsumer(producer.name) as consumer:
+            frames = [frame.copy() for frame in consumer.frames()]
+    assert np.array_equal(np.stack(frames), Video.to_array(str(path)))
+
+
+def test_consumer_process_hand_off(tmp_path):
+    frames = _frames()
+    path = _write(tmp_path / "out.bv", frames)
+    with SharedFrameProducer(16, 12, slots=4, consumers=1) as producer:
+        consumer = subprocess.Popen([sys.executable, "-c", CONSUMER, producer.name], cwd=ROOT,
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        try:
+            # 槽位少于帧数，生产者必须等消费者读完才能继续
+            producer.publish_file(str(path), timeout=30)
+            producer.finish(timeout=30)
+            stdout, stderr = consumer.communicate(timeout=30)
+        finally:
+            consumer.kill()
+        assert consumer.returncode == 0, stderr
+        assert [int(n) for n in stdout.split()] == [int((frame >= 128).sum()) for frame in frames]
+        assert "leaked" not in stderr
+
+        # 消费者进程的resource_tracker退出后共享内存仍然存在
+        time.sleep(0.2)
+        shm = shared_memory.SharedMemory(name=producer.name)
+        shm.close()
+
+
+def test_consumer_rejects_bad_id(tmp_path):
+    with SharedFrameProducer(16, 12, consumers=1) as producer:
+        with pytest.raises(DecodeError):
+            SharedFrameConsumer(producer.name, consumer_id=1)
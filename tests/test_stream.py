@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""BV流传输的测试"""
+
+import io
+import socket
+import struct
+import threading
+
+import numpy as np
+import pytest
+
+from BFile import BVStreamSender, BVStreamReceiver, DecodeError
+from BFile.bv import BV_FRAME_KEY, BV_FRAME_DELTA
+from BFile.stream import BVS_PACKET_FORMAT, BVS_PACKET_SIZE, BVS_PACKET_END
+
+
+def _frames(count=30):
+    """静止的噪声背景上移动的竖条，每个位置停留三帧，差分帧远小于关键帧"""
+    background = np.random.RandomState(0).randint(0, 2, (24, 32)).astype(np.uint8) * 255
+    frames = []
+    for i in range(count):
+        frame = background.copy()
+        frame[4:20, (i // 3) * 3:(i // 3) * 3 + 2] = 255
+        frames.append(frame)
+    return frames
+
+
+def _binary(frames):
+    return np.stack([(frame >= 128).astype(np.uint8) for frame in frames])
+
+
+def _send(target, frames, **options):
+    with BVStreamSender(target, fps=10, **options) as sender:
+        for frame in frames:
+            sender.write(frame)
+
+
+def _packets(data):
+    """拆分数据包，返回[(偏移量, 包类型, 持续时长)]"""
+    packets = []
+    offset = 0
+    while offset < len(data):
+        fields = struct.unpack(BVS_PACKET_FORMAT, data[offset:offset + BVS_PACKET_SIZE])
+        packets.append((offset, fields[4], fields[6]))
+        offset += BVS_PACKET_SIZE + fields[-1]
+    return packets
+
+
+@pytest.mark.parametrize("options", [{}, {"keyframe_interval": 4}, {"keyframe_interval": 4, "vfr": True}])
+def test_socket_round_trip(options):
+    frames = _frames()
+    sender_sock, receiver_sock = socket.socketpair()
+    # 缩小缓冲区，发送方需要等接收方读取
+    sender_sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+    with sender_sock, receiver_sock:
+        thread = threading.Thread(target=_send, args=(sender_sock, frames), kwargs=options)
+        thread.start()
+        with BVStreamReceiver(receiver_sock) as receiver:
+            received = [frame.copy() for frame in receiver]
+        thread.join()
+    assert receiver.ended
+    assert (receiver.width, receiver.height, receiver.fps) == (32, 24, 10)
+    assert np.array_equal(np.stack(received), _binary(frames))
+    # 可变帧率时每三帧合并为一个数据包
+    assert receiver.frame_count == (10 if options.get("vfr") else 30)
+
+
+def test_vfr_without_expand():
+    buffer = io.BytesIO()
+    _send(buffer, _frames(), vfr=True)
+    received = list(BVStreamReceiver(io.BytesIO(buffer.getvalue()), expand=False))
+    assert np.array_equal(np.stack(received), _binary(_frames())[::3])
+
+
+def test_mid_stream_join_waits_for_keyframe():
+    frames = _frames()
+    buffer = io.BytesIO()
+    _send(buffer, frames, keyframe_interval=10)
+    data = buffer.getvalue()
+    packets = _packets(data)
+    assert [packet_type for _, packet_type, _ in packets[:-1]] == [BV_FRAME_KEY if i % 10 == 0 else BV_FRAME_DELTA
+                                                                    for i in range(30)]
+    # 从第13帧开始接收，差分帧跳过，直到第20帧的关键帧
+    receiver = BVStreamReceiver(io.BytesIO(data[packets[13][0]:]))
+    received = list(receiver)
+    assert receiver.frame_count == 10
+    assert np.array_equal(np.stack(received), _binary(frames)[20:])
+
+
+def test_end_packet():
+    buffer = io.BytesIO()
+    _send(buffer, _frames(5))
+    data = buffer.getvalue()
+    assert _packets(data)[-1][1] == BVS_PACKET_END
+
+    # 结束包之后的数据不再读取
+    stream = io.BytesIO(data + b"trailing")
+    receiver = BVStreamReceiver(stream)
+    assert len(list(receiver)) == 5
+    assert receiver.ended
+    assert stream.read() == b"trailing"
+
+    # 发送方未发送结束包就断开时正常结束，ended为False
+    receiver = BVStreamReceiver(io.BytesIO(data[:_packets(data)[-1][0]]))
+    assert len(list(receiver)) == 5
+    assert not receiver.ended
+
+
+def test_truncated_stream():
+    buffer = io.BytesIO()
+    _send(buffer, _frames(5))
+    data = buffer.getvalue()
+    with pytest.raises(DecodeError):
+        list(BVStreamReceiver(io.BytesIO(data[:BVS_PACKET_SIZE + 2])))
+    with pytest.raises(DecodeError):
+        list(BVStreamReceiver(io.BytesIO(b"XXXX" + data[4:])))
+
+
+def test_pipe():
+    import os
+    frames = _frames()
+    read_fd, write_fd = os.pipe()
+
+    def send():
+        with os.fdopen(write_fd, "wb") as pipe:
+            _send(pipe, frames, keyframe_interval=3)
+
+    thread = threading.Thread(target=send)
+    thread.start()
+    with os.fdopen(read_fd, "rb") as pipe:
+        received = [frame.copy() for frame in BVStreamReceiver(pipe)]
+    thread.join()
+    assert np.array_equal(np.stack(received), _binary(frames))